@@ -1,25 +1,66 @@
 from pathlib import Path
 
+from flask import current_app
+
 from flask_alchemydumps.cli import alchemydumps
+from flask_alchemydumps.job import BackupJob
 
 
 class AlchemyDumpsConfig:
-    def __init__(self, db=None, basedir=""):
+    def __init__(self, db=None, basedir="", metrics=None):
         self.db = db
         self.basedir = Path(basedir).absolute()
+        self.metrics = metrics
+        self.jobs = dict()
 
 
 class AlchemyDumps:
-    def __init__(self, app=None, db=None, basedir=""):
+    def __init__(self, app=None, db=None, basedir="", metrics=None):
+        """
+        :param metrics: callable receiving the name of each mapped class and
+        a dict with its metrics once it is dumped or restored (see `Metrics`)
+        """
         if app is not None and db is not None:
-            self.init_app(app, db, basedir)
+            self.init_app(app, db, basedir, metrics)
 
     @staticmethod
-    def init_app(app, db, basedir=""):
+    def init_app(app, db, basedir="", metrics=None):
         if not hasattr(app, "extensions"):
             app.extensions = {}
 
-        app.extensions["alchemydumps"] = AlchemyDumpsConfig(db, basedir)
+        app.extensions["alchemydumps"] = AlchemyDumpsConfig(db, basedir, metrics)
 
         if app is not None:
             app.cli.add_command(alchemydumps)
+
+    @staticmethod
+    def start_backup(jobs=1, incremental=False, callback=None):
+        """
+        Starts creating a backup in a background thread (see `BackupJob`),
+        one at a time; must be called within the app context
+        :param jobs: (int) Number of tables dumped concurrently
+        :param incremental: (bool) Dump only rows changed since the latest
+        backup
+        :param callback: callable receiving the `Progress` after each update
+        :return: `BackupJob` (its `id` is the timestamp of the backup)
+        """
+        app = current_app._get_current_object()
+        config = app.extensions["alchemydumps"]
+        job = BackupJob(app, jobs, incremental, callback)
+        running = any(other.is_alive() for other in config.jobs.values())
+        if running or job.id in config.jobs:
+            raise RuntimeError("There is a backup being created already")
+
+        config.jobs[job.id] = job
+        job.start()
+        return job
+
+    @staticmethod
+    def get_job(job_id):
+        """
+        Gets a backup job started by `start_backup`; must be called within the
+        app context
+        :param job_id: (str) Timestamp of the backup
+        :return: `BackupJob` or None
+        """
+        return current_app.extensions["alchemydumps"].jobs.get(job_id)
@@ -1,16 +1,101 @@
 from calendar import isleap, monthrange
-from datetime import date, datetime, timedelta
-from itertools import chain
+from datetime import date, timedelta
+
+import decouple
+
+
+class RetentionPolicy:
+    """
+    Grandfather-father-son retention: the number of hours, days, weeks,
+    months and years whose most recent backup is kept, and optionally a cap
+    on the total size of the backups kept (the oldest ones are deleted first)
+    """
+
+    PERIODS = ("hourly", "daily", "weekly", "monthly", "yearly")
+    UNITS = {"": 1, "K": 2 ** 10, "M": 2 ** 20, "G": 2 ** 30, "T": 2 ** 40}
+
+    def __init__(
+        self,
+        hourly=None,
+        daily=None,
+        weekly=None,
+        monthly=None,
+        yearly=None,
+        max_size=None,
+    ):
+        self.counts = {
+            "hourly": hourly,
+            "daily": daily,
+            "weekly": weekly,
+            "monthly": monthly,
+            "yearly": yearly,
+        }
+        self.max_size = max_size
+
+    @classmethod
+    def from_config(cls):
+        """
+        Loads the policy from env vars, e.g.:
+        * `ALCHEMYDUMPS_RETENTION=hourly=24,daily=14,weekly=8,monthly=12`
+        * `ALCHEMYDUMPS_RETENTION_MAX_SIZE=10G`
+        :return: RetentionPolicy instance or None if none is set
+        """
+        rules = decouple.config("ALCHEMYDUMPS_RETENTION", default="")
+        max_size = decouple.config("ALCHEMYDUMPS_RETENTION_MAX_SIZE", default="")
+        if not rules and not max_size:
+            return None
+
+        counts = dict()
+        for rule in filter(None, (r.strip() for r in rules.split(","))):
+            period, _, count = rule.partition("=")
+            if period not in cls.PERIODS:
+                available = ", ".join(cls.PERIODS)
+                raise ValueError(f"Unknown retention period {period} ({available})")
+            counts[period] = int(count)
+
+        return cls(max_size=cls.parse_size(max_size) if max_size else None, **counts)
+
+    @classmethod
+    def parse_size(cls, size):
+        """
+        :param size: (str) Number of bytes, optionally followed by a unit
+        (K, M, G or T, as powers of 1024), e.g. `512M`
+        :return: (int) Number of bytes
+        """
+        size = size.strip().upper().rstrip("B")
+        unit = size[-1:] if size[-1:] in cls.UNITS else ""
+        number = size[: len(size) - len(unit)]
+        return int(float(number) * cls.UNITS[unit])
+
+    @staticmethod
+    def get_key(period, timestamp, day):
+        """
+        :param period: (str) One of `PERIODS`
+        :param timestamp: date id (in string format)
+        :param day: date object of the date id
+        :return: the period the date id belongs to (e.g. its month)
+        """
+        if period == "weekly":
+            return day.isocalendar()[:2]
+        length = {"hourly": 10, "daily": 8, "monthly": 6, "yearly": 4}[period]
+        return timestamp[:length]
 
 
 class BackupAutoClean:
-    def __init__(self, dates=None, today=None):
+    def __init__(self, dates=None, today=None, policy=None, sizes=None):
         """
         :param dates: list of date ids (in string format)
         :param today: datetime object
+        :param policy: RetentionPolicy instance (defaults to keeping all the
+        backups from the last week, then weekly, monthly and yearly backups)
+        :param sizes: (dict) Size (in bytes) of each date id, required for
+        policies with a `max_size`
         """
         self.dates = sorted(dates, reverse=True) if dates else []
         self.today = today or date.today()
+        self.policy = policy
+        self.sizes = sizes or dict()
+        self.days = dict()
         self.white_list = tuple()
         self.black_list = tuple()
         self.run()  # feed self.white_list & self.black_list
@@ -31,64 +116,125 @@ class BackupAutoClean:
         last_day = first_day - timedelta(days=1)  # last year
         return 366 if isleap(last_day.year) else 365
 
+    @staticmethod
+    def get_key(day, period):
+        """
+        :param day: date object
+        :param period: a string for comparison (week, month or year)
+        :return: integer with the number of the week, the month or the year
+        """
+        if period == "week":
+            return day.isocalendar()[1]
+        if period == "month":
+            return day.month
+        return day.year
+
+    def parse(self, as_string):
+        """
+        :param as_string: date id (in string format)
+        :return: date object (cached, as there are many ids per day)
+        """
+        prefix = as_string[:8]
+        day = self.days.get(prefix)
+        if day is None:
+            day = date(int(prefix[:4]), int(prefix[4:6]), int(prefix[6:]))
+            self.days[prefix] = day
+        return day
+
     def filter_dates(self, dates, period):
         """
         :param dates: list of ordered date ids (in string format)
         :param period: a string for comparison (week, month or year)
         :return: list of dates containing the most recent dates of each period
         """
-        reference = datetime.strftime(self.today, "%Y%m%d%H%M%S")
-        method_mapping = {
-            "week": lambda obj: getattr(obj, "isocalendar")()[1],
-            "month": lambda obj: getattr(obj, "month"),
-            "year": lambda obj: getattr(obj, "year"),
-        }
+        reference = self.get_key(self.today, period)
         for as_string in dates:
-            as_date = datetime.strptime(as_string, "%Y%m%d%H%M%S")
-            comparison = method_mapping.get(period)(as_date)
-            reference_as_date = datetime.strptime(reference, "%Y%m%d%H%M%S")
-            if comparison != method_mapping.get(period)(reference_as_date):
-                reference = as_string
+            key = self.get_key(self.parse(as_string), period)
+            if key != reference:
+                reference = key
                 yield as_string
 
     def run(self):
         """
         Feeds `self.white_list` and `self.black_list` with the dates do be kept
-        and deleted (respectively)
+        and deleted (respectively), according to the retention policy
+        """
+        if self.policy:
+            white_list, black_list = self.run_policy()
+        else:
+            white_list, black_list = self.run_default()
+
+        # repeated dates are not deleted if one of them is kept
+        self.white_list = tuple(white_list)
+        kept = set(white_list)
+        deleted = (timestamp for timestamp in black_list if timestamp not in kept)
+        self.black_list = tuple(dict.fromkeys(deleted))
+
+    def run_policy(self):
+        """
+        Evaluates `self.policy` in a single pass over the (sorted) dates: for
+        each period with a count, the most recent date of each of the most
+        recent periods is kept; then, with a `max_size`, older dates are
+        dropped until the ones kept fit in it (the most recent one is always
+        kept)
+        :return: (tuple) Lists of dates to be kept and to be deleted
+        """
+        counts = {p: c for p, c in self.policy.counts.items() if c is not None}
+        latest, found = dict(), dict.fromkeys(counts, 0)
+        white_list, black_list, total = list(), list(), 0
+        for timestamp in dict.fromkeys(self.dates):
+            day = self.parse(timestamp)
+            keep = not counts  # a size cap only
+            for period, count in counts.items():
+                key = self.policy.get_key(period, timestamp, day)
+                if key != latest.get(period):
+                    latest[period] = key
+                    found[period] += 1
+                    keep = keep or found[period] <= count
+
+            if keep and self.policy.max_size is not None:
+                total += self.sizes.get(timestamp, 0)
+                keep = total <= self.policy.max_size or not white_list
+
+            (white_list if keep else black_list).append(timestamp)
+
+        return white_list, black_list
+
+    def run_default(self):
+        """
+        Evaluates the default policy in a single pass over the (sorted) dates:
+        dates from the last week are kept; from the last month, the most
+        recent of each week; from the last year, the most recent of each
+        month; and the most recent of each year for older dates
+        :return: (tuple) Lists of dates to be kept and to be deleted
         """
 
         # get last week, month and year dates
-        last_w = self.today - timedelta(days=7)
-        last_m = self.today - timedelta(days=self.get_last_month_length())
-        last_y = self.today - timedelta(days=self.get_last_year_length())
-
-        # create lists for each time period
-        backups_week = list()
-        backups_month = list()
-        backups_year = list()
-        backups_older = list()
+        limits = (
+            self.today - timedelta(days=7),
+            self.today - timedelta(days=self.get_last_month_length()),
+            self.today - timedelta(days=self.get_last_year_length()),
+        )
+        periods = (None, "week", "month", "year")
+
+        # periods start over for each range of dates (as in `filter_dates`)
+        white_list, black_list = list(), list()
+        current, reference = 0, None
         for timestamp in self.dates:
-            datetime_ = datetime.strptime(timestamp, "%Y%m%d%H%M%S")
-            date_ = date(datetime_.year, datetime_.month, datetime_.day)
-            if date_ >= last_w:
-                backups_week.append(timestamp)
-            elif date_ >= last_m:
-                backups_month.append(timestamp)
-            elif date_ >= last_y:
-                backups_year.append(timestamp)
+            day = self.parse(timestamp)
+            while current < len(limits) and day < limits[current]:
+                current += 1
+                reference = self.get_key(self.today, periods[current])
+
+            if not current:
+                white_list.append(timestamp)
+                continue
+
+            key = self.get_key(day, periods[current])
+            if key != reference:
+                reference = key
+                white_list.append(timestamp)
             else:
-                backups_older.append(timestamp)
-
-        # feed white list
-        self.white_list = tuple(
-            chain(
-                backups_week,
-                self.filter_dates(backups_month, "week"),
-                self.filter_dates(backups_year, "month"),
-                self.filter_dates(backups_older, "year"),
-            )
-        )
+                black_list.append(timestamp)
 
-        # feed black list
-        diff_as_tuple = tuple(set(self.dates) - set(self.white_list))
-        self.black_list = tuple(sorted(diff_as_tuple, reverse=True))
+        return white_list, black_list
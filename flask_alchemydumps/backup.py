@@ -1,29 +1,120 @@
 import ftplib
-import gzip
+import json
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from errno import ENOENT
+from functools import lru_cache
+from hashlib import sha256
+from itertools import chain
 from pathlib import Path
-from tempfile import NamedTemporaryFile
-from time import gmtime, strftime
+from queue import Queue
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+from threading import Lock
+from time import gmtime, perf_counter, strftime
 
 import click
 import decouple
 
+from flask_alchemydumps.autoclean import RetentionPolicy
+from flask_alchemydumps.catalog import Catalog
+from flask_alchemydumps.compression import get_codec, get_codec_by_extension
+from flask_alchemydumps.metrics import TimedWriter
+from flask_alchemydumps.pipeline import QueuedWriter
+
+
+class PartWriter(TimedWriter):
+    """
+    Binary file object counting the (compressed) bytes written to a part file
+    (see `CommonTools.create_parts`), which is kept open when the compressed
+    stream is closed as it is saved afterwards
+    """
+
+    def __init__(self, handler, timings):
+        super().__init__(handler, timings)
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return super().write(data)
+
+    def close(self):
+        pass
+
 
 class CommonTools(object):
 
     TIMESTAMP = strftime("%Y%m%d%H%M%S", gmtime())
+    TRASH = "trash"
+    WORKERS = 8
+    PATTERN = re.compile(
+        r"^(.*)(-)(?P<timestamp>[\d]{14})(-)(?P<name>.*)(\.)(?P<extension>\w+)$"
+    )
+    PART = re.compile(r"^(?P<name>.+)\.part(?P<part>\d{3,})$")
 
     @staticmethod
-    def get_timestamp(name):
+    @lru_cache(maxsize=2 ** 17)
+    def parse_name(name):
+        """
+        Parses a file name generated by AlchemyDumps (cached, as listings
+        parse the same names over and over)
+        :param name: (string) Path of a file generated by AlchemyDumps
+        :return: (tuple) The backup numeric id and the mapped class name (in
+        case of success) or False and False
+        """
+        match = CommonTools.PATTERN.match(name)
+        if not match:
+            return False, False
+        return match.group("timestamp"), match.group("name")
+
+    @classmethod
+    def get_timestamp(cls, name):
         """
         Gets the timestamp from a given file name (not a pathlib.Path)
         :param name: (string) Path of a file generated by AlchemyDumps
         :return: (string) The backup numeric id (in case of success) or False
         """
-        pattern = r"(.*)(-)(?P<timestamp>[\d]{14})(-)(.*)(.gz)"
-        match = re.search(pattern, name)
-        return match.group("timestamp") if match else False
+        return cls.parse_name(name)[0]
+
+    @classmethod
+    def get_class_name(cls, name):
+        """
+        Gets the name of the mapped class from a given file name
+        :param name: (string) Path of a file generated by AlchemyDumps
+        :return: (string) The mapped class name (in case of success) or False
+        """
+        return cls.parse_name(name)[1]
+
+    @classmethod
+    def get_part(cls, name):
+        """
+        Gets the mapped class name and the part number from the name of a
+        part file (e.g. `db-bkp-<timestamp>-User.part001.gz`)
+        :param name: (string) Path of a file generated by AlchemyDumps
+        :return: (tuple) The mapped class name and the part number (None if
+        the file is not a part)
+        """
+        class_name = cls.get_class_name(name)
+        match = cls.PART.match(class_name) if class_name else None
+        if not match:
+            return class_name, None
+        return match.group("name"), int(match.group("part"))
+
+    @staticmethod
+    def write_contents(handler, contents):
+        """
+        Writes contents to an open file handler, chunk by chunk in case it is
+        an iterable (e.g. a generator streaming a table dump)
+        :param handler: writable binary file object
+        :param contents: (bytes or iterable of bytes) Contents to be written
+        """
+        if isinstance(contents, bytes):
+            contents = (contents,)
+        for chunk in contents:
+            handler.write(chunk)
 
     @staticmethod
     def parse_timestamp(timestamp):
@@ -31,13 +122,131 @@ class CommonTools(object):
         date_parsed = datetime.strptime(timestamp, "%Y%m%d%H%M%S")
         return date_parsed.strftime("%b %d, %Y at %H:%M:%S")
 
+    def get_workers(self):
+        """Number of files deleted concurrently"""
+        return self.WORKERS
+
+    @contextmanager
+    def open_writer(self, handler, timings=None):
+        """
+        Opens a compressed stream writing to a binary file object. With a
+        `queue_size`, the compressed blocks are written from a thread of
+        their own, so compressing overlaps with writing (see `QueuedWriter`).
+        :param handler: writable binary file object
+        :param timings: (dict) Timings to add the time spent writing to, as
+        `write` (see `TimedWriter`)
+        :return: (context manager) writable binary file object
+        """
+        if timings is not None:
+            handler = TimedWriter(handler, timings)
+        if self.queue_size:
+            handler = QueuedWriter(handler, self.queue_size)
+        try:
+            with self.codec.open(handler, "wb") as compressed:
+                yield compressed
+        finally:
+            if self.queue_size:
+                handler.close()
+
+    def create_parts(self, get_name, contents, max_size, timings=None):
+        """
+        Creates compressed files from a stream of contents, rolling over to a
+        new file once the compressed output crosses `max_size` bytes. Files
+        are only cut between chunks of contents and the first chunk (e.g. the
+        header of a dump) is repeated at the start of each file, so each file
+        can be read on its own. Files are saved (see `open_part`) by a pool of
+        threads while the next ones are written.
+        :param get_name: callable receiving the number of a file (from 1) and
+        returning its name (without path)
+        :param contents: (bytes or iterable of bytes) Contents to be written
+        :param max_size: (int) Compressed size (in bytes) from which the next
+        file is started
+        :param timings: (dict) Timings to add the time spent writing and
+        saving the files (besides compressing) to, as `write`
+        :return: (list) Dicts with the `name` of each file, and the size
+        (`bytes`) and the `sha256` of its contents
+        """
+        chunks = iter((contents,) if isinstance(contents, bytes) else contents)
+        header = next(chunks, b"")
+        timings = dict() if timings is None else timings
+        parts, pending = list(), deque()
+
+        def save(function):
+            start = perf_counter()
+            function()
+            return perf_counter() - start
+
+        def saved(future):
+            timings["write"] += future.result()
+
+        with ThreadPoolExecutor(max_workers=self.get_workers()) as executor:
+            while chunks is not None:
+                name = get_name(len(parts) + 1)
+                checksum, size = sha256(header), len(header)
+                handler, function = self.open_part(name)
+                writer = PartWriter(handler, timings)
+                try:
+                    with self.codec.open(writer, "wb") as compressed:
+                        compressed.write(header)
+                        for chunk in chunks:
+                            compressed.write(chunk)
+                            checksum.update(chunk)
+                            size += len(chunk)
+                            if writer.size >= max_size:
+                                break
+                        else:
+                            chunks = None
+                except BaseException:
+                    handler.close()
+                    raise
+
+                if chunks is not None:  # avoids a last file with no contents
+                    following = next(chunks, None)
+                    if following is None:
+                        chunks = None
+                    else:
+                        chunks = chain((following,), chunks)
+
+                digest = checksum.hexdigest()
+                parts.append({"name": name, "bytes": size, "sha256": digest})
+                pending.append(executor.submit(save, function))
+                if len(pending) >= self.get_workers():
+                    saved(pending.popleft())
+
+            while pending:
+                saved(pending.popleft())
+        return parts
+
+    def delete_files(self, names, trash=False):
+        """
+        Deletes (or moves to the trash) files concurrently
+        :param names: (iterable) Names of the files (without path)
+        :param trash: (bool) Move files to the trash instead of deleting them
+        (see `trash_file`)
+        :return: (list) Tuples with the name and the error of each file that
+        could not be deleted
+        """
+        function = self.trash_file if trash else self.delete_file
+
+        def delete(name):
+            try:
+                function(name)
+            except (OSError, ftplib.Error) as error:
+                return name, error
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.get_workers()) as executor:
+            return [failure for failure in executor.map(delete, names) if failure]
+
 
 class LocalTools(CommonTools):
     """Manage backup directory and files in local file system"""
 
-    def __init__(self, backup_path):
+    def __init__(self, backup_path, codec=None, queue_size=0):
         self.path = Path(backup_path).absolute()
         self.path.mkdir(exist_ok=True)
+        self.codec = codec or get_codec()
+        self.queue_size = queue_size
 
     def get_files(self):
         """List all files in the backup directory"""
@@ -47,28 +256,58 @@ class LocalTools(CommonTools):
             if path.is_file() and self.get_timestamp(path.name)
         )
 
-    def create_file(self, name, contents):
+    def get_names(self):
+        """List the names of all files in the backup directory"""
+        yield from (path.name for path in self.path.glob("*") if path.is_file())
+
+    def get_path(self, name):
+        """Gets the full path of a file (given its name or path) as a string"""
+        return str(self.path / name)
+
+    def get_size(self, name):
+        """Gets the size of a file (in bytes)"""
+        return (self.path / name).stat().st_size
+
+    def create_file(self, name, contents, timings=None):
         """
-        Creates a gzip file
+        Creates a compressed file
         :param name: (str) Name of the file to be created (without path)
-        :param contents: (bytes) Contents to be written in the file
-        :return: (pathlib.Path) Path of the created file
+        :param contents: (bytes or iterable of bytes) Contents to be written
+        in the file
+        :param timings: (dict) Timings to add the time spent writing to the
+        file (besides compressing) to, as `write`
+        :return: (pathlib.Path) Path of the created file (see `open_writer`)
         """
         path = self.path / name
-        with gzip.open(path, "wb") as handler:
-            handler.write(contents)
+        if timings is None and not self.queue_size:
+            with self.codec.open(path, "wb") as handler:
+                self.write_contents(handler, contents)
+            return path
+
+        with path.open("wb") as raw:
+            with self.open_writer(raw, timings) as handler:
+                self.write_contents(handler, contents)
         return path
 
     def read_file(self, name):
         """
-        Reads the contents of a gzip file
+        Reads the contents of a compressed file
         :param name: (str) Name of the file to be read (without path)
         :return: (bytes) Content of the file
         """
         path = self.path / name
-        with gzip.open(path, "rb") as handler:
+        with get_codec_by_extension(name).open(path, "rb") as handler:
             return handler.read()
 
+    def open_part(self, name):
+        """
+        Opens a file to be written by `create_parts`
+        :param name: (str) Name of the file (without path)
+        :return: (tuple) Writable binary file object and a callable saving it
+        """
+        handler = (self.path / name).open("wb")
+        return handler, handler.close
+
     def delete_file(self, name):
         """
         Delete a file
@@ -77,14 +316,135 @@ class LocalTools(CommonTools):
         path = self.path / name
         path.unlink()
 
+    def rename_file(self, name, new_name):
+        """
+        Renames a file atomically, replacing any file with the new name
+        :param name: (str) Name of the file to be renamed (without path)
+        :param new_name: (str) New name of the file (without path)
+        """
+        (self.path / name).replace(self.path / new_name)
+
+    def trash_file(self, name):
+        """
+        Moves a file to the trash directory (inside the backup directory)
+        :param name: (str) Name of the file to be moved (without path)
+        """
+        trash = self.path / self.TRASH
+        trash.mkdir(exist_ok=True)
+        (self.path / name).replace(trash / name)
+
+    def get_trash(self):
+        """List the files in the trash (as paths relative to the backups)"""
+        trash = self.path / self.TRASH
+        if not trash.is_dir():
+            return list()
+        return [f"{self.TRASH}/{p.name}" for p in trash.glob("*") if p.is_file()]
+
+
+class FTPPool(object):
+    """
+    Pool of FTP connections (all of them in the backup path), opened on demand
+    up to `size` connections. Connections dropped by the server are discarded
+    and the operation is retried with a new connection.
+    """
+
+    DROPPED = (ftplib.error_temp, EOFError, OSError)
+    RETRIES = 3
+
+    def __init__(self, connect=None, size=1, connections=None):
+        """
+        :param connect: callable returning a new Python FTP class instance (or
+        False), if None no new connections are opened
+        :param size: (int) Maximum number of connections
+        :param connections: (iterable) Python FTP class instances already open
+        """
+        self.connect = connect
+        self.idle = Queue()
+        self.lock = Lock()
+        self.open = 0
+        for ftp in connections or tuple():
+            self.idle.put(ftp)
+            self.open += 1
+        self.size = max(size, self.open)
+
+    def acquire(self):
+        """Gets an idle connection, opening a new one if the pool isn't full"""
+        with self.lock:
+            create = self.connect and self.idle.empty() and self.open < self.size
+            if create:
+                self.open += 1
+
+        if not create:
+            return self.idle.get()
+
+        ftp = self.connect()
+        if not ftp:
+            with self.lock:
+                self.open -= 1
+            raise ConnectionError("Couldn't open a new FTP connection")
+        return ftp
+
+    def discard(self, ftp):
+        with self.lock:
+            self.open -= 1
+        try:
+            ftp.close()
+        except self.DROPPED:
+            pass
+
+    def run(self, function, retry=None):
+        """
+        Calls `function` with a connection from the pool
+        :param function: callable receiving a Python FTP class instance
+        :param retry: callable telling whether the operation can be retried
+        after a dropped connection (defaults to always)
+        :return: whatever `function` returns
+        """
+        attempts = 0
+        while True:
+            ftp = self.acquire()
+            try:
+                result = function(ftp)
+            except self.DROPPED:
+                self.discard(ftp)
+                attempts += 1
+                can_retry = retry() if retry else True
+                if not self.connect or attempts > self.RETRIES or not can_retry:
+                    raise
+                continue
+            except Exception:  # e.g. error_perm, the connection is still fine
+                self.idle.put(ftp)
+                raise
+
+            self.idle.put(ftp)
+            return result
+
+    def close(self):
+        while not self.idle.empty():
+            ftp = self.idle.get_nowait()
+            try:
+                ftp.quit()
+            except self.DROPPED:
+                ftp.close()
+
 
 class RemoteTools(CommonTools):
     """Manage backup files in a remote file system via FTP"""
 
-    def __init__(self, ftp):
-        """Receives a Python FTP class instance"""
+    BLOCK_SIZE = 8192
+    SPOOL_SIZE = 2 ** 24
+
+    def __init__(self, ftp, codec=None, pool=None, queue_size=0):
+        """
+        Receives a Python FTP class instance and, optionally, a pool of
+        connections to spread transfers (see `FTPPool`) and the number of
+        compressed blocks queued for upload (see `open_writer`)
+        """
         self.ftp = ftp
         self.path = self.normalize_path()
+        self.codec = codec or get_codec()
+        self.pool = pool or FTPPool(connections=(ftp,))
+        self.queue_size = queue_size
 
     def normalize_path(self):
         """Add missing slash to the end of the FTP url to be used in stdout"""
@@ -93,46 +453,390 @@ class RemoteTools(CommonTools):
 
     def get_files(self):
         """List all files in the backup directory"""
-        yield from (name for name in self.ftp.nlst() if self.get_timestamp(name))
+        yield from (name for name in self.get_names() if self.get_timestamp(name))
+
+    def get_names(self):
+        """List the names of all files in the backup directory"""
+        return self.pool.run(lambda ftp: ftp.nlst())
+
+    def get_path(self, name):
+        """Gets the URL of a file given its name"""
+        return f"{self.path}{name}"
 
-    def create_file(self, name, contents):
+    def get_size(self, name):
+        """Gets the size of a file (in bytes), if the server supports it"""
+
+        def size(ftp):
+            ftp.voidcmd("TYPE I")
+            return ftp.size(name)
+
+        try:
+            return self.pool.run(size)
+        except ftplib.error_perm:
+            return None
+
+    @contextmanager
+    def transfer(self, ftp, command, mode):
+        """
+        Opens a FTP data connection as a file object, so data is streamed
+        from/to the server without touching the local disk
+        :param ftp: Python FTP class instance
+        :param command: (str) FTP command (e.g. `STOR foobar.gz`)
+        :param mode: (str) `rb` or `wb`
+        :return: (context manager) binary file object
+        """
+        ftp.voidcmd("TYPE I")
+        connection = ftp.transfercmd(command)
+        try:
+            with connection:
+                with connection.makefile(mode, buffering=self.BLOCK_SIZE) as handler:
+                    yield handler
+                    while "r" in mode and handler.read(self.BLOCK_SIZE):
+                        pass  # drain the connection before waiting for the reply
+        except BaseException:
+            # the data connection is closed, so read the reply it left pending
+            # (e.g. 226 or 426) for the next command using this connection
+            try:
+                ftp.getresp()
+            except ftplib.all_errors:
+                pass
+            raise
+        ftp.voidresp()
+
+    def create_file(self, name, contents, timings=None):
         """
-        Creates a gzip file
+        Creates a compressed file, compressing straight into the FTP data
+        connection. A dropped connection is retried unless part of a stream
+        of contents (e.g. a generator) has already been consumed.
         :param name: (str) Name of the file to be created (without path)
-        :param contents: (bytes) Contents to be written in the file
+        :param contents: (bytes or iterable of bytes) Contents to be written
+        in the file
+        :param timings: (dict) Timings to add the time spent sending the file
+        (besides compressing) to, as `write`
         :return: (str) path of the created file
         """
-        with NamedTemporaryFile() as tmp:
-            with gzip.open(tmp.name, "wb") as handler:
-                handler.write(contents)
-            with open(tmp.name, "rb") as handler:
-                self.ftp.storbinary(f"STOR {name}", handler)
+        replayable = isinstance(contents, bytes)
+        consumed = list()
+
+        def chunks():
+            for chunk in (contents,) if replayable else contents:
+                consumed.append(True)
+                yield chunk
+
+        def store(ftp):
+            with self.transfer(ftp, f"STOR {name}", "wb") as connection:
+                with self.open_writer(connection, timings) as handler:
+                    self.write_contents(handler, chunks())
+
+        self.pool.run(store, retry=lambda: replayable or not consumed)
         return f"{self.path}{name}"
 
     def read_file(self, name):
         """
-        Reads the contents of a gzip file
+        Reads the contents of a compressed file, decompressing blocks as they
+        are received from the FTP data connection
         :param name: (str) Name of the file to be read (without path)
         :return: (bytes) Content of the file
         """
-        with NamedTemporaryFile() as tmp:
-            with open(tmp.name, "wb") as handler:
-                self.ftp.retrbinary(f"RETR {name}", handler.write)
-        with gzip.open(tmp.name, "rb") as handler:
-            return handler.read()
+
+        def retrieve(ftp):
+            with self.transfer(ftp, f"RETR {name}", "rb") as connection:
+                with get_codec_by_extension(name).open(connection, "rb") as handler:
+                    return handler.read()
+
+        try:
+            return self.pool.run(retrieve)
+        except ftplib.error_perm as error:  # e.g. 550, no such file
+            raise FileNotFoundError(ENOENT, str(error), name) from error
+
+    def open_part(self, name):
+        """
+        Opens a file to be written by `create_parts`: it is spooled (in memory
+        up to `SPOOL_SIZE` bytes, then in a temporary file) and uploaded when
+        saved, so uploads can be retried and run while the next file is written
+        :param name: (str) Name of the file (without path)
+        :return: (tuple) Writable binary file object and a callable saving it
+        """
+        handler = SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+
+        def store(ftp):
+            handler.seek(0)
+            with self.transfer(ftp, f"STOR {name}", "wb") as connection:
+                copyfileobj(handler, connection, self.BLOCK_SIZE)
+
+        def save():
+            try:
+                self.pool.run(store)
+            finally:
+                handler.close()
+
+        return handler, save
 
     def delete_file(self, name):
         """
         Delete a file
         :param name: (str) Name of the file to be deleted (without path)
         """
-        self.ftp.delete(name)
+        self.pool.run(lambda ftp: ftp.delete(name))
+
+    def rename_file(self, name, new_name):
+        """
+        Renames a file, replacing any file with the new name
+        :param name: (str) Name of the file to be renamed (without path)
+        :param new_name: (str) New name of the file (without path)
+        """
+
+        def rename(ftp):
+            try:
+                ftp.rename(name, new_name)
+            except ftplib.error_perm:  # server doesn't replace existing files
+                ftp.delete(new_name)
+                ftp.rename(name, new_name)
+
+        self.pool.run(rename)
+
+    def get_workers(self):
+        """Number of files deleted concurrently, one per FTP connection"""
+        return self.pool.size
+
+    def trash_file(self, name):
+        """
+        Moves a file to the trash directory (inside the backup directory)
+        :param name: (str) Name of the file to be moved (without path)
+        """
+
+        def move(ftp):
+            try:
+                ftp.rename(name, f"{self.TRASH}/{name}")
+            except ftplib.error_perm:  # trash directory might not exist yet
+                try:
+                    ftp.mkd(self.TRASH)
+                except ftplib.error_perm:
+                    pass  # it did exist, so it wasn't the problem
+                ftp.rename(name, f"{self.TRASH}/{name}")
+
+        self.pool.run(move)
+
+    def get_trash(self):
+        """List the files in the trash (as paths relative to the backups)"""
+        try:
+            names = self.pool.run(lambda ftp: ftp.nlst(self.TRASH))
+        except ftplib.error_perm:  # no trash directory
+            return list()
+        names = (name.rsplit("/", 1)[-1] for name in names)
+        return [f"{self.TRASH}/{name}" for name in names if name not in (".", "..")]
+
+    def close(self):
+        """Closes all FTP connections"""
+        self.pool.close()
+
+
+class ChunkedTools(CommonTools):
+    """
+    Manage backup files split in content-defined chunks, each chunk stored
+    only once (named after its hash) by another target (Local or Remote).
+    Backup files become manifests listing their chunks, so unchanged data is
+    not stored again by later backups.
+    """
+
+    MAGIC = b"ALCHEMYDUMPS-MANIFEST\n"
+    PREFIX = "chunk-"
+    MIN_SIZE = 2 ** 13
+    MAX_SIZE = 2 ** 17
+    MASK = (2 ** 15 - 1) << 48  # average of 32KiB after the minimum size
+    GEAR = tuple(
+        int.from_bytes(sha256(bytes((byte,))).digest()[:8], "big")
+        for byte in range(256)
+    )
+
+    def __init__(self, target):
+        self.target = target
+        self.path = target.path
+        self.codec = target.codec
+        self.pool = getattr(target, "pool", None)
+        self.chunks = None
+        self.lock = Lock()
+
+    def get_files(self):
+        """List all backup files (i.e. manifests) in the backup directory"""
+        return self.target.get_files()
+
+    def get_path(self, name):
+        """Gets the full path (or URL) of a file given its name"""
+        return self.target.get_path(name)
+
+    def get_size(self, name):
+        """
+        Gets the size of a manifest (in bytes): chunks are shared between
+        backups, so they don't count
+        """
+        return self.target.get_size(name)
+
+    def get_chunks(self):
+        """
+        Gets the chunks already stored (listed once, then kept up to date)
+        :return: (dict) Chunk hashes as keys, file names as values
+        """
+        with self.lock:
+            if self.chunks is None:
+                names = self.target.get_names()
+                prefix = len(self.PREFIX)
+                self.chunks = {
+                    name[prefix:].split(".")[0]: name
+                    for name in names
+                    if name.startswith(self.PREFIX)
+                }
+        return self.chunks
+
+    def find_cut(self, data, final=False):
+        """
+        Finds a chunk boundary with a gear rolling hash, so boundaries depend
+        on the content around them rather than on their offset
+        :param data: (bytearray) Data to be chunked
+        :param final: (bool) Whether there is no more data after `data`
+        :return: (int) Size of the next chunk or None if more data is needed
+        """
+        if len(data) <= self.MIN_SIZE:
+            return len(data) if final else None
+
+        gear, mask, limit = self.GEAR, self.MASK, 2 ** 64 - 1
+        end = min(len(data), self.MAX_SIZE)
+        start = self.MIN_SIZE - 64  # the hash depends only on the last 64 bytes
+        fingerprint = 0
+        for position in range(start, end):
+            fingerprint = ((fingerprint << 1) + gear[data[position]]) & limit
+            if position >= self.MIN_SIZE and not fingerprint & mask:
+                return position + 1
+
+        return end if final or end == self.MAX_SIZE else None
+
+    def split(self, contents):
+        """
+        Splits contents in content-defined chunks. Streams of contents are
+        cut between the pieces they are made of once a chunk reaches the
+        minimum size, as dumps stream pieces that end at content-defined rows
+        (see `AlchemyDumpsDatabase.is_boundary`); only bigger pieces are cut
+        using the rolling hash, which is a lot slower.
+        :param contents: (bytes or iterable of bytes) Contents to be split
+        :return: (generator) Chunks (bytes)
+        """
+        if isinstance(contents, bytes):
+            contents = (contents,)
+
+        buffer = bytearray()
+        for data in contents:
+            if len(buffer) >= self.MIN_SIZE:
+                yield bytes(buffer)
+                buffer = bytearray()
+
+            buffer.extend(data)
+            while len(buffer) >= self.MAX_SIZE:
+                cut = self.find_cut(buffer)
+                yield bytes(buffer[:cut])
+                del buffer[:cut]
+
+        while buffer:
+            cut = self.find_cut(buffer, final=True)
+            yield bytes(buffer[:cut])
+            del buffer[:cut]
+
+    def store(self, chunk, timings=None):
+        """
+        Stores a chunk unless it is already stored
+        :param timings: (dict) Timings to add the time spent writing to
+        :return: (str) Name of the chunk file
+        """
+        digest = sha256(chunk).hexdigest()
+        chunks = self.get_chunks()
+        if digest not in chunks:
+            name = f"{self.PREFIX}{digest}.{self.codec.EXTENSION}"
+            self.target.create_file(name, chunk, timings)
+            chunks[digest] = name
+        return chunks[digest]
+
+    def create_file(self, name, contents, timings=None):
+        """
+        Stores the chunks of the contents and a manifest listing them
+        :param name: (str) Name of the file to be created (without path)
+        :param contents: (bytes or iterable of bytes) Contents to be written
+        in the file
+        :param timings: (dict) Timings to add the time spent writing to
+        :return: Path of the created manifest
+        """
+        names = [self.store(chunk, timings) for chunk in self.split(contents)]
+        manifest = self.MAGIC + "\n".join(names).encode()
+        return self.target.create_file(name, manifest, timings)
+
+    def read_chunk_names(self, contents):
+        """Gets the names of the chunks listed in a manifest"""
+        start = len(self.MAGIC)
+        names = contents[start:].decode()
+        return names.split("\n") if names else list()
+
+    def read_file(self, name):
+        """
+        Reads the contents of a file joining its chunks (files stored without
+        chunks are read as they are)
+        :param name: (str) Name of the file to be read (without path)
+        :return: (bytes) Content of the file
+        """
+        contents = self.target.read_file(name)
+        if not contents.startswith(self.MAGIC):
+            return contents
+        names = self.read_chunk_names(contents)
+        return b"".join(self.target.read_file(chunk) for chunk in names)
+
+    def delete_file(self, name):
+        """
+        Deletes a manifest (see `collect` to delete chunks no longer used)
+        :param name: (str) Name of the file to be deleted (without path)
+        """
+        self.target.delete_file(name)
+
+    def get_workers(self):
+        """Number of files deleted concurrently (as in the target)"""
+        return self.target.get_workers()
+
+    def trash_file(self, name):
+        """Moves a manifest to the trash (its chunks are kept until purged)"""
+        self.target.trash_file(name)
+
+    def get_trash(self):
+        """List the manifests in the trash"""
+        return self.target.get_trash()
+
+    def collect(self):
+        """
+        Deletes the chunks not listed in any manifest (including the ones in
+        the trash)
+        :return: (list) Names of the deleted chunks
+        """
+        used = set()
+        names = (getattr(path, "name", path) for path in self.get_files())
+        for name in chain(names, self.get_trash()):
+            contents = self.target.read_file(name)
+            if contents.startswith(self.MAGIC):
+                used.update(self.read_chunk_names(contents))
+
+        chunks = self.get_chunks()
+        unused = [(d, name) for d, name in chunks.items() if name not in used]
+        for digest, name in unused:
+            self.target.delete_file(name)
+            del chunks[digest]
+        return [name for _, name in unused]
+
+    def close(self):
+        if hasattr(self.target, "close"):
+            self.target.close()
 
 
 class Backup(object):
 
     DIR = "alchemydumps-backup"
     PRE = "db-bkp"
+    MANIFEST = "manifest"
+    METRICS = "metrics"
+    CATALOG = "catalog"
 
     def __init__(self):
         """
@@ -142,8 +846,16 @@ class Backup(object):
         self.ftp = self.ftp_connect()
         self.dir = decouple.config("ALCHEMYDUMPS_DIR", default=self.DIR)
         self.prefix = decouple.config("ALCHEMYDUMPS_PREFIX", default=self.PRE)
+        self.codec = get_codec(decouple.config("ALCHEMYDUMPS_CODEC", default="gzip"))
+        self.ftp_connections = decouple.config(
+            "ALCHEMYDUMPS_FTP_CONNECTIONS", default=4, cast=int
+        )
+        self.store = decouple.config("ALCHEMYDUMPS_STORE", default="files")
         self.files = None
+        self.groups = None
+        self.max_file_size = None
         self.target = self.get_target()
+        self.catalog = self.get_catalog()
 
     def ftp_connect(self):
         """
@@ -158,9 +870,18 @@ class Backup(object):
         user = decouple.config("ALCHEMYDUMPS_FTP_USER", default=None)
         password = decouple.config("ALCHEMYDUMPS_FTP_PASSWORD", default=None)
         path = decouple.config("ALCHEMYDUMPS_FTP_PATH", default=None)
+        self.ftp_credentials = (server, user, password, path)
         if not server or not user:
             return False
 
+        return self.ftp_open()
+
+    def ftp_open(self):
+        """
+        Opens a new connection to the FTP server (see `ftp_connect`)
+        :return: Python FTP class instance or False
+        """
+        server, user, password, path = self.ftp_credentials
         try:
             ftp = ftplib.FTP(server, user, password)
         except ftplib.error_perm:
@@ -186,36 +907,233 @@ class Backup(object):
 
     def close_ftp(self):
         if self.ftp:
-            self.ftp.quit()
+            self.target.close()
 
     def get_target(self):
-        """Returns the object to manage backup files (Local or Remote)"""
-        return RemoteTools(self.ftp) if self.ftp else LocalTools(self.dir)
+        """
+        Returns the object to manage backup files (Local or Remote), storing
+        deduplicated chunks if `ALCHEMYDUMPS_STORE` is set to `chunks`
+        """
+        if self.ftp:
+            pool = FTPPool(self.ftp_open, self.ftp_connections, (self.ftp,))
+            target = RemoteTools(self.ftp, self.codec, pool)
+        else:
+            target = LocalTools(self.dir, self.codec)
+
+        if self.store == "chunks":
+            return ChunkedTools(target)
+        return target
+
+    def set_queue_size(self, size):
+        """
+        Sets the number of compressed blocks queued to be written (or
+        uploaded) from a thread of their own (see `CommonTools.open_writer`)
+        :param size: (int) Number of blocks (0 to write them as compressed)
+        """
+        target = self.target.target if self.chunked else self.target
+        target.queue_size = size
+
+    @property
+    def chunked(self):
+        """Whether backups are stored as deduplicated chunks"""
+        return isinstance(self.target, ChunkedTools)
+
+    def collect(self):
+        """
+        Deletes chunks no longer used by any backup, if backups are stored as
+        chunks (see `ChunkedTools`)
+        :return: (list) Names of the deleted chunks
+        """
+        return self.target.collect() if self.chunked else list()
+
+    def get_catalog(self):
+        """
+        Gets the catalog of backup files, stored next to them (not as chunks)
+        """
+        target = self.target.target if self.chunked else self.target
+        name = f"{self.prefix}-{self.CATALOG}.{self.codec.EXTENSION}"
+        return Catalog(target, name)
+
+    def get_backups(self):
+        """
+        Gets the backups in the catalog, loaded once and checked against the
+        files in the backup directory: files deleted or added since (e.g. by
+        hand, or left by an interrupted backup) are removed from or added to
+        the catalog, which is then saved
+        :return: (dict) Timestamps as keys, dict of files (with their names as
+        keys) as values
+        """
+        if self.catalog.backups is None:
+            self.catalog.load()
+            names = (getattr(path, "name", path) for path in self.target.get_files())
+            if self.catalog.sync((self.target.get_timestamp(n), n) for n in names):
+                self.catalog.save()
+        return self.catalog.backups
+
+    def create_file(self, name, contents, timings=None, **details):
+        """
+        Creates a backup file and adds it to the catalog with the size and the
+        SHA-256 of its contents (before compression)
+        :param name: (str) Name of the file to be created (without path)
+        :param contents: (bytes or iterable of bytes) Contents of the file
+        :param timings: (dict) Timings to add the time spent writing to
+        :param details: other details to be added to the catalog (besides the
+        `bytes` and `sha256` of the contents and the `size` of the file)
+        :return: Path of the created file
+        """
+        checksum, sizes = sha256(), list()
+
+        def measure(chunks):
+            for chunk in chunks:
+                checksum.update(chunk)
+                sizes.append(len(chunk))
+                yield chunk
+
+        if isinstance(contents, bytes):
+            tuple(measure((contents,)))
+        else:
+            contents = measure(contents)
+
+        path = self.target.create_file(name, contents, timings)
+        size = self.target.get_size(name)
+        details.update(bytes=sum(sizes), sha256=checksum.hexdigest(), size=size)
+        self.get_backups()
+        self.catalog.add(self.target.get_timestamp(name), name, **details)
+        return path
+
+    def get_max_file_size(self):
+        """
+        Gets the size from which backup files are split in parts, from
+        `ALCHEMYDUMPS_MAX_FILE_SIZE` (e.g. `2G`) unless already set
+        :return: (int) Number of (compressed) bytes or None for no limit
+        """
+        if self.max_file_size is None:
+            size = decouple.config("ALCHEMYDUMPS_MAX_FILE_SIZE", default="")
+            self.max_file_size = RetentionPolicy.parse_size(size) if size else 0
+        return self.max_file_size or None
+
+    def create_parts(self, class_name, contents, max_size, timings=None):
+        """
+        Creates the backup files of a SQLAlchemy mapped class, rolling over to
+        a new part file once the compressed output crosses `max_size` bytes
+        (see `CommonTools.create_parts`), and adds them to the catalog. A
+        single part is renamed to the name of a regular backup file.
+        :param contents: (iterable of bytes) Contents, starting with a header
+        repeated at the start of each part
+        :param timings: (dict) Timings to add the time spent writing to
+        :return: (list) Names of the created files
+        """
+
+        def get_name(number):
+            return self.get_part_name(class_name, number)
+
+        parts = self.target.create_parts(get_name, contents, max_size, timings)
+        if len(parts) == 1:
+            name = self.get_name(class_name)
+            self.target.rename_file(parts[0]["name"], name)
+            parts[0]["name"] = name
+
+        self.get_backups()
+        names = list()
+        for details in parts:
+            name = details.pop("name")
+            details["size"] = self.target.get_size(name)
+            self.catalog.add(self.target.get_timestamp(name), name, **details)
+            names.append(name)
+        return names
+
+    def get_sizes(self, timestamps=None):
+        """
+        Gets the size of backups (of all their files), from the catalog or, if
+        missing in the catalog, from the target (the catalog is then updated)
+        :param timestamps: (iterable) Timestamps (defaults to all of them)
+        :return: (dict) Timestamps as keys, sizes in bytes as values
+        """
+        backups = self.get_backups()
+        sizes = dict()
+        for timestamp in tuple(backups) if timestamps is None else timestamps:
+            sizes[timestamp] = 0
+            for name, details in tuple(backups.get(timestamp, dict()).items()):
+                if "size" not in details:
+                    size = self.target.get_size(name)
+                    self.catalog.add(timestamp, name, size=size)
+                sizes[timestamp] += details["size"] or 0
+        return sizes
+
+    def delete_file(self, name):
+        """Deletes a backup file and removes it from the catalog"""
+        name = getattr(name, "name", name)
+        self.target.delete_file(name)
+        self.get_backups()
+        self.catalog.remove(self.target.get_timestamp(name), name)
+
+    def delete_files(self, names, trash=False):
+        """
+        Deletes (or moves to the trash) backup files concurrently and removes
+        them from the catalog
+        :return: (list) Tuples with the name and the error of each file that
+        could not be deleted
+        """
+        names = [getattr(name, "name", name) for name in names]
+        failures = self.target.delete_files(names, trash)
+        failed = set(name for name, _ in failures)
+        self.get_backups()
+        for name in names:
+            if name not in failed:
+                self.catalog.remove(self.target.get_timestamp(name), name)
+        return failures
+
+    def purge(self):
+        """
+        Deletes the files in the trash
+        :return: (tuple) Number of files deleted and list of failures (see
+        `delete_files`)
+        """
+        names = self.target.get_trash()
+        failures = self.target.delete_files(names)
+        return len(names) - len(failures), failures
+
+    def save_catalog(self):
+        """Saves the changes to the catalog, if any"""
+        if self.catalog.backups is not None:
+            self.catalog.save()
+
+    def get_jobs(self, jobs):
+        """Limits concurrent jobs to the number of FTP connections, if any"""
+        return min(jobs, self.target.pool.size) if self.ftp else jobs
+
+    def get_groups(self):
+        """
+        Gets the backup files grouped by timestamp, in a single pass over
+        `self.files` if set (otherwise from the catalog, already grouped)
+        :return: (dict) Timestamps as keys, backup files as values
+        """
+        if not self.files:
+            return self.get_backups()
+
+        if self.groups is None or self.groups[0] is not self.files:
+            groups = dict()
+            for path in self.files:
+                timestamp = self.target.get_timestamp(getattr(path, "name", path))
+                if timestamp:
+                    groups.setdefault(timestamp, list()).append(path)
+            self.groups = (self.files, groups)
+        return self.groups[1]
 
     def get_timestamps(self):
         """
         Gets the different existing timestamp numeric IDs
         :return: (tuple) Existing timestamps in backup directory
         """
-        if not self.files:
-            self.files = tuple(self.target.get_files())
-
-        timestamps = set(self.target.get_timestamp(path.name) for path in self.files)
-        return tuple(timestamp for timestamp in timestamps if timestamp)
+        return tuple(self.get_groups())
 
     def by_timestamp(self, timestamp):
         """
         Gets the list of all backup files with a given timestamp
         :param timestamp: (str) Timestamp to be used as filter
-        :param files: (list) List of backup file names
         :return: (generator) Backup file names matching the timestamp
         """
-        if not self.files:
-            self.files = tuple(self.target.get_files())
-
-        for path in self.files:
-            if timestamp == self.target.get_timestamp(path.name):
-                yield path
+        yield from tuple(self.get_groups().get(timestamp, tuple()))
 
     def valid(self, timestamp):
         """Check backup files for the given timestamp"""
@@ -233,4 +1151,130 @@ class Backup(object):
         SQLAlchemy mapped class.
         """
         timestamp = timestamp or self.target.TIMESTAMP
-        return f"{self.prefix}-{timestamp}-{class_name}.gz"
+        return f"{self.prefix}-{timestamp}-{class_name}.{self.codec.EXTENSION}"
+
+    def get_part_name(self, class_name, part, timestamp=None):
+        """
+        Gets a part file name, for mapped classes dumped in several files
+        :param part: (int) Number of the part, or `*` as a wildcard
+        """
+        part = part if part == "*" else f"{part:03d}"
+        return self.get_name(f"{class_name}.part{part}", timestamp)
+
+    def find_parts(self, class_name, timestamp):
+        """
+        Gets the names of the part files of a SQLAlchemy mapped class with a
+        given timestamp (see `get_part_name`)
+        :return: (list) Names of the part files, in order
+        """
+        parts = list()
+        for path in self.by_timestamp(timestamp):
+            name = getattr(path, "name", path)
+            part_class_name, part = self.target.get_part(name)
+            if part is not None and part_class_name == class_name:
+                parts.append((part, name))
+        return [name for _, name in sorted(parts)]
+
+    def find_all(self, class_name, timestamp):
+        """
+        Gets the names of the backup file, or of the part files, of a
+        SQLAlchemy mapped class with a given timestamp
+        :return: (list) Names of the files (empty if there are none)
+        """
+        name = self.find(class_name, timestamp)
+        if name:
+            return [name]
+        parts = self.read_parts(class_name, timestamp)
+        return self.find_parts(class_name, timestamp) if parts is None else parts
+
+    def find(self, class_name, timestamp):
+        """
+        Gets the name of the backup file of a SQLAlchemy mapped class with a
+        given timestamp, whatever codec (thus extension) it was created with
+        :return: (str) Name of the backup file or None
+        """
+        for path in self.by_timestamp(timestamp):
+            name = getattr(path, "name", path)
+            if self.target.get_class_name(name) == class_name:
+                return name
+        return None
+
+    def get_parent(self):
+        """
+        Gets the latest backup before the current one, to be the parent of an
+        incremental backup
+        :return: (str) Timestamp of the latest backup or None
+        """
+        timestamps = self.get_timestamps()
+        previous = [t for t in timestamps if t < self.target.TIMESTAMP]
+        return max(previous) if previous else None
+
+    def write_manifest(self, manifest):
+        """
+        Saves the manifest of an incremental backup, with the timestamp of its
+        parent backup and, for each mapped class, whether the backup file has
+        all rows (`full`) or only the ones changed since the parent backup
+        :param manifest: (dict) Manifest contents
+        :return: Path of the created file
+        """
+        name = self.get_name(self.MANIFEST, manifest["id"])
+        return self.create_file(name, json.dumps(manifest).encode())
+
+    def write_metrics(self, metrics):
+        """
+        Saves the metrics of a backup as JSON (see `Metrics`)
+        :return: Path of the created file
+        """
+        return self.create_file(self.get_name(self.METRICS), metrics.to_json())
+
+    def write_parts(self, class_name, names, **details):
+        """
+        Saves the list of the part files of a SQLAlchemy mapped class, with
+        the details of each part in the catalog
+        :param names: (list) Names of the part files, in order
+        :param details: details about the whole table (e.g. `rows`)
+        :return: Path of the created file
+        """
+        timestamp = self.target.TIMESTAMP
+        parts = [dict(self.catalog.get(timestamp, n), name=n) for n in names]
+        contents = dict(details, parts=parts)
+        name = self.get_name(f"{class_name}.parts")
+        return self.create_file(name, json.dumps(contents).encode())
+
+    def read_parts(self, class_name, timestamp):
+        """
+        Reads the list of the part files of a SQLAlchemy mapped class
+        :return: (list) Names of the part files or None if there is no list
+        """
+        name = self.find(f"{class_name}.parts", timestamp)
+        if not name:
+            return None
+        contents = json.loads(self.target.read_file(name).decode())
+        return [part["name"] for part in contents["parts"]]
+
+    def read_manifest(self, timestamp):
+        """
+        Reads the manifest of a backup
+        :return: (dict) Manifest contents or None for full backups
+        """
+        name = self.find(self.MANIFEST, timestamp)
+        if not name:
+            return None
+        return json.loads(self.target.read_file(name).decode())
+
+    def get_chain(self, class_name, timestamp):
+        """
+        Gets the backups needed to restore a mapped class: the latest backup
+        with all of its rows followed by the incremental ones up to the given
+        timestamp
+        :return: (list) Timestamps, from the full backup to the given one
+        """
+        chain = list()
+        while timestamp:
+            chain.insert(0, timestamp)
+            manifest = self.read_manifest(timestamp)
+            table = (manifest or dict()).get("tables", dict()).get(class_name)
+            if not table or table["full"]:
+                break
+            timestamp = manifest["parent"]
+        return chain
@@ -0,0 +1,152 @@
+import json
+from ftplib import error_perm
+from threading import Lock
+from uuid import uuid4
+
+
+class Catalog:
+    """
+    Index of the backup files (with their rows, sizes and checksums) saved
+    next to them, so details about backups don't require reading (or
+    parsing the name of) every file. It is kept in sync with the files in
+    the backup directory (see `sync`) and only the changes are saved, on top
+    of the latest catalog file (see `save`).
+    """
+
+    VERSION = 1
+
+    def __init__(self, target, name):
+        """
+        :param target: object to manage files (Local or Remote)
+        :param name: (str) Name of the catalog file
+        """
+        self.target = target
+        self.name = name
+        self.backups = None
+        self.changes = dict()  # files added (with details) or removed (None)
+        self.lock = Lock()
+
+    def read(self):
+        """
+        Reads the catalog file
+        :return: (dict) Backups in the catalog or None if there is no catalog
+        (or if it can't be read, as it is rebuilt from the files anyway)
+        """
+        try:
+            contents = self.target.read_file(self.name)
+            return json.loads(contents.decode())["backups"]
+        except (OSError, EOFError, ValueError, KeyError, error_perm):
+            return None
+
+    def load(self):
+        """
+        Reads the catalog file, if there is one
+        :return: (bool) Whether the catalog was found
+        """
+        backups = self.read()
+        if backups is None:
+            return False
+
+        with self.lock:
+            self.backups = backups
+            self.changes = dict()
+        return True
+
+    def rebuild(self, files):
+        """
+        Creates the catalog from the backup files
+        :param files: (iterable) Tuples with timestamp and name of each file
+        """
+        self.backups = dict()
+        self.sync(files)
+
+    def sync(self, files):
+        """
+        Matches the catalog to the backup files actually there: files missing
+        in the catalog (e.g. copied from elsewhere or left by an interrupted
+        backup) are added and files no longer there are removed
+        :param files: (iterable) Tuples with timestamp and name of each file
+        :return: (bool) Whether the catalog changed
+        """
+        if self.backups is None:
+            self.backups = dict()
+
+        files = set(files)
+        with self.lock:
+            cataloged = set(
+                (timestamp, name)
+                for timestamp, names in self.backups.items()
+                for name in names
+            )
+        for timestamp, name in files - cataloged:
+            self.add(timestamp, name)
+        for timestamp, name in cataloged - files:
+            self.remove(timestamp, name)
+        return files != cataloged
+
+    def add(self, timestamp, name, **details):
+        """
+        Adds a backup file (or details about it, e.g. `rows`, `bytes` or
+        `sha256`) to the catalog
+        """
+        with self.lock:
+            files = self.backups.setdefault(timestamp, dict())
+            files.setdefault(name, dict()).update(details)
+            change = self.changes.get((timestamp, name)) or dict()
+            self.changes[(timestamp, name)] = dict(change, **details)
+
+    def get(self, timestamp, name):
+        """Gets the details of a backup file (empty if it's not cataloged)"""
+        with self.lock:
+            return dict(self.backups.get(timestamp, dict()).get(name, dict()))
+
+    def remove(self, timestamp, name):
+        """Removes a backup file from the catalog"""
+        with self.lock:
+            self.discard(self.backups, timestamp, name)
+            self.changes[(timestamp, name)] = None
+
+    @staticmethod
+    def discard(backups, timestamp, name):
+        files = backups.get(timestamp, dict())
+        files.pop(name, None)
+        if not files:
+            backups.pop(timestamp, None)
+
+    def merge(self, backups):
+        """
+        Applies the changes made since the catalog was loaded (or saved) to
+        backups read from the catalog file, so changes saved meanwhile (e.g.
+        by another backup being created) are kept
+        :param backups: (dict) Backups as read from the catalog file
+        """
+        with self.lock:
+            for (timestamp, name), details in self.changes.items():
+                if details is None:
+                    self.discard(backups, timestamp, name)
+                else:
+                    files = backups.setdefault(timestamp, dict())
+                    files.setdefault(name, dict()).update(details)
+            self.backups = backups
+            self.changes = dict()
+
+    def save(self):
+        """
+        Saves the catalog atomically: the changes are merged into the latest
+        catalog file, written to a temporary file which then replaces the
+        catalog file
+        """
+        backups = self.read()
+        if backups is not None:
+            self.merge(backups)
+
+        with self.lock:
+            contents = {"version": self.VERSION, "backups": self.backups}
+            contents = json.dumps(contents, sort_keys=True).encode()
+            self.changes = dict()
+
+        temporary = f"tmp-{uuid4().hex}-{self.name}"
+        self.target.create_file(temporary, contents)
+        self.target.rename_file(temporary, self.name)
+        if hasattr(self.target, "close"):
+            self.target.close()
@@ -1,19 +1,29 @@
-import os
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from itertools import chain
+from os.path import basename
+from time import perf_counter
 
 import click
 from flask.cli import with_appcontext
-from sqlalchemy.exc import IntegrityError, InvalidRequestError
 
-from flask_alchemydumps.autoclean import BackupAutoClean
+from flask_alchemydumps.autoclean import BackupAutoClean, RetentionPolicy
 from flask_alchemydumps.backup import Backup
 from flask_alchemydumps.confirm import Confirm
 from flask_alchemydumps.database import AlchemyDumpsDatabase
+from flask_alchemydumps.filters import RowFilter
+from flask_alchemydumps.metrics import Metrics, timed
+from flask_alchemydumps.pipeline import Prefetcher
+from flask_alchemydumps.progress import Progress
 
 
 success = partial(click.secho, fg="green")
 error = partial(click.secho, fg="red")
 
+PROGRESS_STEPS = 1000
+LOOK_AHEAD = 2
+
 
 @click.group()
 def alchemydumps():
@@ -21,23 +31,492 @@ def alchemydumps():
     pass
 
 
+def get_index(alchemy, backup, model, parent, session=None):
+    """Gets the row digests of a mapped class in a parent backup, if any"""
+    class_name = model.__name__
+    name = backup.find(f"{class_name}.index", parent)
+    if name:
+        return alchemy.read_index(backup.target.read_file(name))
+
+    manifest = backup.read_manifest(parent)
+    names = backup.find_all(class_name, parent)
+    if manifest or not names:  # no index of the whole table
+        return None
+
+    rows = chain.from_iterable(
+        alchemy.iter_data(backup.target.read_file(name), session) for name in names
+    )
+    return alchemy.get_index(model, rows)
+
+
+def dump(
+    alchemy,
+    backup,
+    model,
+    session=None,
+    parent=None,
+    progress=None,
+    metrics=None,
+    jobs=1,
+):
+    """
+    Dumps a mapped class in its own backup file (or in part files, for big
+    tables, see `dump_parts`, or from the maximum file size on, see
+    `Backup.create_parts`). With a parent backup, only rows changed since the
+    parent are dumped, alongside the digests of all rows and the primary keys
+    of deleted rows. With a `Progress`, the dump is tracked (and can be
+    cancelled) as it is written. Rows are queried and serialized in a
+    pipeline of threads (see `AlchemyDumpsDatabase.get_pipelined_chunks`),
+    unless the database is an in-memory SQLite database, which other
+    threads can't reach. With `Metrics`, the rows, bytes before
+    (`bytes`) and after (`size`) compression and the time spent querying,
+    serializing, compressing and writing are reported.
+    :param jobs: (int) Number of processes dumping parts of big tables
+    :return: (tuple) File name, path (None on failure) and whether all rows
+    were dumped
+    """
+    class_name = model.__name__
+    ranges = alchemy.get_ranges(model, session) if not parent else None
+    if ranges:
+        return dump_parts(
+            alchemy, backup, model, ranges, session, progress, metrics, jobs
+        )
+
+    name = backup.get_name(class_name)
+    index = get_index(alchemy, backup, model, parent, session) if parent else None
+    full = index is None
+    if parent and full:
+        index = dict()
+
+    if alchemy.queue_size and not alchemy.in_memory():
+        contents = alchemy.get_pipelined_chunks(model, index)
+    else:
+        contents = alchemy.get_chunks(model, session, index)
+    if progress:
+        contents = progress.track(class_name, contents, alchemy.rows)
+    timings, start = dict(), perf_counter()
+    max_size = None if backup.chunked else backup.get_max_file_size()
+    if max_size:
+        names = backup.create_parts(class_name, contents, max_size, timings)
+        if len(names) > 1:
+            name = backup.get_part_name(class_name, "*")
+            backup.write_parts(class_name, names, rows=alchemy.rows[class_name])
+        full_path = backup.target.get_path(name)
+    else:
+        names = [name]
+        full_path = backup.create_file(name, contents, timings)
+    if full_path and len(names) == 1:
+        rows = alchemy.rows[class_name]
+        backup.catalog.add(backup.target.TIMESTAMP, name, rows=rows)
+    if metrics and full_path:
+        timings.update(alchemy.timings[class_name])
+        elapsed = perf_counter() - start
+        compress = elapsed - sum(timings.values())  # everything else
+        details = [backup.catalog.get(backup.target.TIMESTAMP, n) for n in names]
+        metrics.report(
+            class_name,
+            rows=alchemy.rows[class_name],
+            bytes=sum(d["bytes"] for d in details),
+            size=sum(d["size"] or 0 for d in details),
+            compress=max(compress, 0.0),
+            **timings,
+        )
+
+    if parent and full_path:
+        index_name = backup.get_name(f"{class_name}.index")
+        backup.create_file(index_name, alchemy.get_index_chunks(model))
+        if alchemy.deleted.get(class_name):
+            deleted_name = backup.get_name(f"{class_name}.deleted")
+            deleted = alchemy.get_deleted_chunks(model)
+            backup.create_file(deleted_name, deleted)
+    return name, full_path, full
+
+
+def dump_parts(
+    alchemy, backup, model, ranges, session=None, progress=None, metrics=None, jobs=1
+):
+    """
+    Dumps a big mapped class in part files, one for each range of primary
+    keys (see `AlchemyDumpsDatabase.get_ranges`): ranges are serialized by
+    `jobs` processes and compressed and written by `jobs` threads as they
+    are ready, then the parts are listed (see `Backup.write_parts`). Parts
+    are not split again by the maximum file size. See `dump` for the other
+    arguments.
+    :return: (tuple) File names (with a wildcard), path (None on failure)
+    and whether all rows were dumped (always, as incremental backups are not
+    split)
+    """
+    class_name = model.__name__
+    name = backup.get_part_name(class_name, "*")
+    alchemy.rows[class_name] = 0
+    timings = {"query": 0.0, "serialize": 0.0, "write": 0.0}
+    totals = {"bytes": 0, "size": 0, "compress": 0.0}
+
+    def write(number, contents, rows):
+        part_name = backup.get_part_name(class_name, number)
+        part_timings, start = dict(), perf_counter()
+        path = backup.create_file(part_name, contents, part_timings, rows=rows)
+        return part_name, path, part_timings, perf_counter() - start
+
+    def written(future):
+        part_name, path, part_timings, elapsed = future.result()
+        if not path:
+            return False
+        details = backup.catalog.get(backup.target.TIMESTAMP, part_name)
+        totals["bytes"] += details["bytes"]
+        totals["size"] += details["size"]
+        totals["compress"] += max(elapsed - part_timings["write"], 0.0)
+        timings["write"] += part_timings["write"]
+        return True
+
+    pending = deque()
+    parts = alchemy.map_ranges(model, ranges, jobs, session)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for number, (contents, rows, part_timings) in enumerate(parts, 1):
+            alchemy.rows[class_name] += rows
+            timings["query"] += part_timings["query"]
+            timings["serialize"] += part_timings["serialize"]
+            if progress:
+                contents = progress.track(class_name, (contents,), alchemy.rows)
+            pending.append(executor.submit(write, number, contents, rows))
+            if len(pending) == jobs and not written(pending.popleft()):
+                return name, None, True
+        while pending:
+            if not written(pending.popleft()):
+                return name, None, True
+
+    alchemy.timings[class_name] = timings
+    names = [backup.get_part_name(class_name, n) for n in range(1, len(ranges) + 1)]
+    backup.write_parts(class_name, names, rows=alchemy.rows[class_name])
+    if metrics:
+        metrics.report(class_name, rows=alchemy.rows[class_name], **totals, **timings)
+    return name, backup.target.get_path(name), True
+
+
+def load_file(alchemy, backup, name, session=None, row_filter=None, read=None):
+    """
+    Restores the rows in a backup file (see `load`)
+    :return: (tuple) Rows that could not be restored and timings
+    """
+    read = read or backup.target.read_file
+    timings = {"bytes": 0, "read": 0.0, "restore": 0.0}
+    start = perf_counter()
+    contents = read(name)
+    timings["read"] += perf_counter() - start
+    timings["bytes"] += len(contents)
+
+    start = perf_counter()
+    rows = alchemy.iter_data(contents, session, row_filter)
+    rows = timed(rows, timings, "deserialize", count="rows")
+    fails = alchemy.restore_rows(rows, session)
+    timings["restore"] += perf_counter() - start
+    return fails, timings
+
+
+def load(
+    alchemy,
+    backup,
+    date_id,
+    model,
+    session=None,
+    metrics=None,
+    row_filter=None,
+    jobs=1,
+    read=None,
+):
+    """
+    Restores a mapped class from its backup file (or part files), if it
+    exists, and from the incremental backups it is the base of. With
+    `Metrics`, the rows, bytes (before compression) and the time spent
+    reading (or waiting for prefetched files), deserializing, restoring and
+    deleting rows are reported. With a `RowFilter`, only matching rows are
+    restored (and deleted, for predicates on primary keys).
+    :param jobs: (int) Number of part files restored concurrently
+    :param read: callable reading the contents of a file given its name
+    (defaults to the target's `read_file`, see `get_restore_files`)
+    """
+    class_name = model.__name__
+    read = read or backup.target.read_file
+    fails, name = None, None
+    timings = {"bytes": 0, "read": 0.0, "restore": 0.0, "delete": 0.0}
+    try:
+        for timestamp in backup.get_chain(class_name, date_id):
+            names = backup.find_all(class_name, timestamp)
+            if not names:
+                return backup.get_name(class_name, timestamp), None
+
+            name = names[0] if len(names) == 1 else None
+            name = name or backup.get_part_name(class_name, "*", timestamp)
+            function = partial(
+                load_file, alchemy, backup, row_filter=row_filter, read=read
+            )
+            if jobs > 1 and len(names) > 1:
+                with ThreadPoolExecutor(max_workers=jobs) as executor:
+                    results = list(executor.map(alchemy.in_worker(function), names))
+            else:
+                results = [function(name, session=session) for name in names]
+
+            fails = fails or list()
+            for file_fails, file_timings in results:
+                fails.extend(file_fails)
+                for key, value in file_timings.items():
+                    timings[key] = timings.get(key, 0) + value
+
+            start = perf_counter()
+            deleted = backup.find(f"{class_name}.deleted", timestamp)
+            if deleted:
+                keys = alchemy.read_keys(read(deleted))
+                if row_filter:
+                    table = model.__table__
+                    keys = [key for key in keys if row_filter.matches_key(table, key)]
+                alchemy.delete_rows(model, keys, session)
+            timings["delete"] += perf_counter() - start
+    except FileNotFoundError as exception:  # deleted since it was listed
+        return basename(exception.filename or name or class_name), None
+
+    if name is None:
+        return backup.get_name(class_name, date_id), None
+
+    if metrics:
+        timings["restore"] -= timings["deserialize"]
+        metrics.report(class_name, **timings)
+    return name, fails
+
+
+def get_restore_files(alchemy, backup, date_id):
+    """
+    Gets the files to be read to restore a backup, in the order they are
+    expected to be read (see `load`), so they can be prefetched
+    :return: (generator) Names of the files
+    """
+    for model in alchemy.get_sorted_classes():
+        class_name = model.__name__
+        for timestamp in backup.get_chain(class_name, date_id):
+            yield from backup.find_all(class_name, timestamp)
+            deleted = backup.find(f"{class_name}.deleted", timestamp)
+            if deleted:
+                yield deleted
+
+
+def format_size(size):
+    """Formats a number of bytes for humans (e.g. 1.5 MB)"""
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = "TB"
+    return f"{size:.0f} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+
+
+def report(failures):
+    """Lists the files that could not be deleted"""
+    if failures:
+        error(f"==> {len(failures)} files could not be deleted:")
+        for name, exception in failures:
+            error(f"    {name}: {exception}")
+
+
+def delete(backup, names, trash=False):
+    """
+    Deletes (or moves to the trash) backup files concurrently, reporting
+    failures at the end
+    """
+    failures = backup.delete_files(names, trash)
+    failed = set(name for name, _ in failures)
+    action = "moved to the trash" if trash else "deleted"
+    for name in names:
+        if name not in failed:
+            click.echo(f"    {name} {action}.")
+    report(failures)
+    backup.save_catalog()
+    if not trash:
+        collect(backup)
+
+
+def collect(backup):
+    """Deletes chunks no longer used by any backup, if backups are chunked"""
+    chunks = backup.collect()
+    if chunks:
+        click.echo(f"    {len(chunks)} unused chunks deleted.")
+
+
+def dump_all(alchemy, backup, jobs=1, parent=None, progress=None, metrics=None):
+    """
+    Dumps all mapped classes (see `dump`), adding their files to the catalog,
+    and saves the metrics, the catalog (and the manifest of incremental
+    backups) once all of them are dumped
+    :param jobs: (int) Number of tables dumped concurrently
+    :param parent: (str) Timestamp of the backup an incremental one is based on
+    :param progress: `Progress` to be started (with the row count of each
+    table) and updated as tables are dumped
+    :param metrics: `Metrics` (defaults to the ones set in `AlchemyDumps`)
+    :return: (generator) Tuples with the mapped class, file name, path (None
+    on failure) and whether all rows were dumped, as tables are dumped
+    """
+    metrics = metrics or Metrics.from_app()
+    models = alchemy.get_mapped_classes()
+    manifest = {"id": backup.target.TIMESTAMP, "parent": parent, "tables": dict()}
+    if progress:
+        totals = {model.__name__: alchemy.count_rows(model) for model in models}
+        progress.start(manifest["id"], totals)
+
+    jobs = alchemy.get_jobs(backup.get_jobs(jobs))
+    function = partial(
+        dump,
+        alchemy,
+        backup,
+        parent=parent,
+        progress=progress,
+        metrics=metrics,
+        jobs=jobs,
+    )
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        if jobs == 1:
+            results = map(function, models)
+        else:
+            results = executor.map(alchemy.in_worker(function), models)
+
+        for model, (name, full_path, full) in zip(models, results):
+            class_name = model.__name__
+            rows = alchemy.rows.get(class_name, 0)
+            deleted = len(alchemy.deleted.get(class_name, tuple()))
+            manifest["tables"][class_name] = {
+                "full": full,
+                "rows": rows,
+                "deleted": deleted,
+            }
+            if progress:
+                progress.update(class_name, rows=rows, status="done")
+            yield model, name, full_path, full
+
+    if metrics.tables:
+        backup.write_metrics(metrics)
+    if parent:
+        backup.write_manifest(manifest)
+    backup.save_catalog()
+
+
+def show_progress(progress):
+    """Formats a `Progress` for the progress bar of the `create` command"""
+    if progress is None:
+        return None
+
+    status = progress.get_status()
+    eta = "--:--:--"
+    if status["eta"] is not None:
+        minutes, seconds = divmod(int(status["eta"]), 60)
+        hours, minutes = divmod(minutes, 60)
+        eta = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    table = status["table"] or ""
+    size = format_size(status["bytes"])
+    return f"{table} {status['rows']} rows, {size}, ETA {eta}".strip()
+
+
 @alchemydumps.command()
+@click.option(
+    "-j",
+    "--jobs",
+    "jobs",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of tables (and of parts of big tables) dumped concurrently",
+)
+@click.option(
+    "-i",
+    "--incremental",
+    "incremental",
+    is_flag=True,
+    help="Dump only rows changed since the latest backup",
+)
+@click.option(
+    "-p",
+    "--part-size",
+    "part_size",
+    type=int,
+    default=AlchemyDumpsDatabase.PART_SIZE,
+    show_default=True,
+    help="Rows per part file for big tables (0 to never split tables)",
+)
+@click.option(
+    "-s",
+    "--max-file-size",
+    "max_file_size",
+    help="Compressed size from which files are split in parts, e.g. 2G (0 to "
+    "never split files)",
+)
+@click.option(
+    "-q",
+    "--queue-size",
+    "queue_size",
+    type=int,
+    default=AlchemyDumpsDatabase.QUEUE_SIZE,
+    show_default=True,
+    help="Chunks queued between querying, serializing, compressing and "
+    "writing, each in a thread of its own (0 to run them in sequence)",
+)
 @with_appcontext
-def create():
+def create(
+    jobs=1,
+    incremental=False,
+    part_size=AlchemyDumpsDatabase.PART_SIZE,
+    max_file_size=None,
+    queue_size=AlchemyDumpsDatabase.QUEUE_SIZE,
+):
     """Create a backup based on SQLAlchemy mapped classes"""
 
-    # create backup files
-    alchemy = AlchemyDumpsDatabase()
-    data = alchemy.get_data()
     backup = Backup()
-    for class_name in data.keys():
-        name = backup.get_name(class_name)
-        full_path = backup.target.create_file(name, data[class_name])
-        rows = len(alchemy.parse_data(data[class_name]))
-        if full_path:
-            success(f"==> {rows} rows from {class_name} saved as {full_path}")
-        else:
-            error(f"==> Error creating {name} at {backup.target.path}")
+    try:
+        if max_file_size:
+            backup.max_file_size = RetentionPolicy.parse_size(max_file_size)
+        backup.get_max_file_size()
+    except ValueError:
+        error("==> Invalid maximum file size, use a size such as 512M or 2G")
+        backup.close_ftp()
+        return
+    alchemy = AlchemyDumpsDatabase(
+        content_defined=backup.chunked, part_size=part_size, queue_size=queue_size
+    )
+    backup.set_queue_size(queue_size)
+
+    # find the backup an incremental one is based on
+    backup.get_backups()
+    parent = backup.get_parent() if incremental else None
+    if incremental and not parent:
+        click.echo("==> No previous backup found, creating a full backup.")
+
+    # create backup files streaming each table straight into its file
+    messages = list()
+    with click.progressbar(
+        length=PROGRESS_STEPS,
+        label=f"==> Creating backup {backup.target.TIMESTAMP}",
+        item_show_func=show_progress,
+    ) as bar:
+
+        def update(progress):
+            steps = int(progress.get_fraction() * PROGRESS_STEPS)
+            bar.update(steps - bar.pos, progress)
+
+        results = dump_all(alchemy, backup, jobs, parent, Progress(update))
+        for model, name, full_path, full in results:
+            class_name = model.__name__
+            rows = alchemy.rows.get(class_name, 0)
+            deleted = len(alchemy.deleted.get(class_name, tuple()))
+            if not full_path:
+                msg = f"==> Error creating {name} at {backup.target.path}"
+                messages.append((error, msg))
+            elif parent and not full:
+                msg = f"==> {rows} changed and {deleted} deleted rows from"
+                msg = f"{msg} {class_name} saved as {full_path}"
+                messages.append((success, msg))
+            else:
+                msg = f"==> {rows} rows from {class_name} saved as {full_path}"
+                messages.append((success, msg))
+
+    # print results once the progress bar is done
+    for echo, message in messages:
+        echo(message)
     backup.close_ftp()
 
 
@@ -47,22 +526,30 @@ def history():
     """List existing backups"""
 
     backup = Backup()
-    backup.files = tuple(backup.target.get_files())
+    groups = backup.get_groups()
 
     # if no files
-    if not backup.files:
+    if not groups:
         click.echo(f"==> No backups found at {backup.target.path}.")
         return None
 
-    # create output
-    timestamps = backup.get_timestamps()
-    groups = [{"id": i, "files": backup.by_timestamp(i)} for i in timestamps]
-    for output in groups:
-        if output["files"]:
-            date_formated = backup.target.parse_timestamp(output["id"])
-            click.echo(f"\n==> ID: {output['id']} (from {date_formated})")
-            for file_name in output["files"]:
-                click.echo(f"    {backup.target.path}{file_name}")
+    # create output (listing the parts of each table in a single line)
+    for date_id, files in groups.items():
+        if files:
+            date_formated = backup.target.parse_timestamp(date_id)
+            click.echo(f"\n==> ID: {date_id} (from {date_formated})")
+            parts = defaultdict(list)
+            for file_name in files:
+                name = getattr(file_name, "name", file_name)
+                class_name, part = backup.target.get_part(name)
+                if part is None:
+                    click.echo(f"    {backup.target.get_path(file_name)}")
+                else:
+                    parts[class_name].append(part)
+            for class_name, numbers in parts.items():
+                name = backup.get_part_name(class_name, "*", date_id)
+                path = backup.target.get_path(name)
+                click.echo(f"    {path} ({len(numbers)} parts)")
     click.echo("")
     backup.close_ftp()
 
@@ -74,47 +561,118 @@ def history():
     "date_id",
     help="The date part of a file from the AlchemyDumps folder",
 )
+@click.option(
+    "-b",
+    "--batch-size",
+    "batch_size",
+    type=int,
+    default=AlchemyDumpsDatabase.BATCH_SIZE,
+    show_default=True,
+    help="Number of rows restored in each transaction",
+)
+@click.option(
+    "-m",
+    "--mode",
+    "mode",
+    type=click.Choice(AlchemyDumpsDatabase.MODES),
+    default="merge",
+    show_default=True,
+    help="Merge rows with existing data or bulk insert them in empty tables",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    "jobs",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of tables (and of parts of big tables) restored concurrently",
+)
+@click.option(
+    "-t",
+    "--table",
+    "tables",
+    multiple=True,
+    help="Restore only this mapped class or table (can be repeated)",
+)
+@click.option(
+    "-w",
+    "--where",
+    "where",
+    multiple=True,
+    help="Restore only rows matching a predicate such as id>=1000 (can be repeated)",
+)
+@click.option(
+    "-l",
+    "--look-ahead",
+    "look_ahead",
+    type=int,
+    default=LOOK_AHEAD,
+    show_default=True,
+    help="Files read and decompressed ahead of the ones being restored "
+    "(0 to read each file when it is restored)",
+)
 @with_appcontext
-def restore(date_id):
+def restore(
+    date_id,
+    batch_size=AlchemyDumpsDatabase.BATCH_SIZE,
+    mode="merge",
+    jobs=1,
+    tables=tuple(),
+    where=tuple(),
+    look_ahead=LOOK_AHEAD,
+):
     """Restore a backup based on the date part of the backup files"""
 
-    alchemy = AlchemyDumpsDatabase()
-    backup = Backup()
+    alchemy = AlchemyDumpsDatabase(batch_size=batch_size, mode=mode)
+    try:
+        if tables:
+            alchemy.select_classes(tables)
+        models = alchemy.get_mapped_classes()
+        row_filter = RowFilter(where, (model.__table__ for model in models))
+    except ValueError as exception:
+        error(f"==> {exception}")
+        return
 
-    # loop through mapped classes
-    for mapped_class in alchemy.get_mapped_classes():
-        class_name = mapped_class.__name__
-        name = backup.get_name(class_name, date_id)
-        path = backup.target.path / name
-
-        if path.exists():
-
-            # read file contents
-            contents = backup.target.read_file(name)
-            fails = list()
-
-            # restore to the db
-            db = alchemy.db()
-            for row in alchemy.parse_data(contents):
-                try:
-                    db.session.merge(row)
-                    db.session.commit()
-                except (IntegrityError, InvalidRequestError):
-                    db.session.rollback()
-                    fails.append(row)
-
-            # print summary
-            status = "partially" if len(fails) else "totally"
-            success(f"==> {name} {status} restored.")
-            for f in fails:
-                error(f"    Restore of {f} failed.")
-        else:
-            os.system("ls alchemydumps-backups")
-            msg = (
-                f"==> No file found for {class_name} "
-                f"({backup.target.path}{name} does not exist)."
-            )
-            error(msg)
+    backup = Backup()
+    backup.get_backups()
+
+    # read (and decompress) the next files while the current ones are loaded
+    files = get_restore_files(alchemy, backup, date_id) if look_ahead else ()
+    prefetcher = Prefetcher(backup.target.read_file, files, look_ahead)
+
+    # restore mapped classes once the ones they depend on are restored
+    jobs = alchemy.get_jobs(backup.get_jobs(jobs), writes=True)
+    worker = partial(
+        load,
+        alchemy,
+        backup,
+        date_id,
+        metrics=Metrics.from_app(),
+        row_filter=row_filter or None,
+        jobs=jobs,
+        read=prefetcher.get,
+    )
+    try:
+        for mapped_class, (name, fails) in alchemy.run_by_dependency(worker, jobs):
+            class_name = mapped_class.__name__
+
+            if fails is not None:
+
+                # print summary
+                status = "partially" if len(fails) else "totally"
+                success(f"==> {name} {status} restored.")
+                for f in fails:
+                    error(f"    Restore of {f} failed.")
+            else:
+                msg = (
+                    f"==> No file found for {class_name} "
+                    f"({backup.target.get_path(name)} does not exist)."
+                )
+                error(msg)
+    finally:
+        prefetcher.close()
+        backup.close_ftp()
 
 
 @alchemydumps.command()
@@ -131,8 +689,15 @@ def restore(date_id):
     is_flag=True,
     help="Assume `yes` for all prompts",
 )
+@click.option(
+    "-t",
+    "--trash",
+    "trash",
+    is_flag=True,
+    help="Move the files to the trash (deleted later by `purge`)",
+)
 @with_appcontext
-def remove(date_id, assume_yes=False):
+def remove(date_id, assume_yes=False, trash=False):
     """Remove a series of backup files based on the date part of the files"""
 
     # check if date/id is valid
@@ -143,14 +708,12 @@ def remove(date_id, assume_yes=False):
         delete_list = tuple(backup.by_timestamp(date_id))
         click.echo("==> Do you want to delete the following files?")
         for name in delete_list:
-            click.echo(f"    {backup.target.path}{name}")
+            click.echo(f"    {backup.target.get_path(name)}")
 
         # delete
         confirm = Confirm(assume_yes)
         if confirm.ask():
-            for name in delete_list:
-                backup.target.delete_file(name)
-                click.echo(f"    {name} deleted.")
+            delete(backup, delete_list, trash)
     backup.close_ftp()
 
 
@@ -162,10 +725,26 @@ def remove(date_id, assume_yes=False):
     is_flag=True,
     help="Assume `yes` for all prompts",
 )
+@click.option(
+    "-n",
+    "--dry-run",
+    "dry_run",
+    is_flag=True,
+    help="Only list the backups to be deleted and the space to be reclaimed",
+)
+@click.option(
+    "-t",
+    "--trash",
+    "trash",
+    is_flag=True,
+    help="Move the files to the trash (deleted later by `purge`)",
+)
 @with_appcontext
-def autoclean(assume_yes=False):
+def autoclean(assume_yes=False, dry_run=False, trash=False):
     """
-    Remove a series of backup files based on the following rules:
+    Remove a series of backup files based on the retention policy set in
+    `ALCHEMYDUMPS_RETENTION` and `ALCHEMYDUMPS_RETENTION_MAX_SIZE` or, by
+    default, on the following rules:
     * Keeps all the backups from the last 7 days
     * Keeps the most recent backup from each week of the last month
     * Keeps the most recent backup from each month of the last year
@@ -174,13 +753,15 @@ def autoclean(assume_yes=False):
 
     # check if there are backups
     backup = Backup()
-    backup.files = tuple(backup.target.get_files())
-    if not backup.files:
+    timestamps = backup.get_timestamps()
+    if not timestamps:
         click.echo("==> No backups found.")
         return None
 
     # get black and white list
-    cleaning = BackupAutoClean(backup.get_timestamps())
+    policy = RetentionPolicy.from_config()
+    sizes = backup.get_sizes() if policy and policy.max_size is not None else None
+    cleaning = BackupAutoClean(timestamps, policy=policy, sizes=sizes)
     white_list = cleaning.white_list
     black_list = cleaning.black_list
     if not black_list:
@@ -193,7 +774,7 @@ def autoclean(assume_yes=False):
         date_formated = backup.target.parse_timestamp(date_id)
         click.echo(f"\n    ID: {date_id} (from {date_formated})")
         for f in backup.by_timestamp(date_id):
-            click.echo(f"    {backup.target.path}{f}")
+            click.echo(f"    {backup.target.get_path(f)}")
 
     # print the list of files to be deleted
     delete_list = list()
@@ -202,13 +783,46 @@ def autoclean(assume_yes=False):
         date_formated = backup.target.parse_timestamp(date_id)
         click.echo(f"\n    ID: {date_id} (from {date_formated})")
         for f in backup.by_timestamp(date_id):
-            click.echo(f"    {backup.target.path}{f}")
+            click.echo(f"    {backup.target.get_path(f)}")
             delete_list.append(f)
 
+    reclaimed = sum(backup.get_sizes(black_list).values())
+    click.echo(f"\n==> {format_size(reclaimed)} will be reclaimed.")
+    if dry_run:
+        backup.close_ftp()
+        return None
+
     # delete
     confirm = Confirm(assume_yes)
     if confirm.ask():
-        for name in delete_list:
-            backup.target.delete_file(name)
-            click.echo(f"    {name} deleted.")
+        delete(backup, delete_list, trash)
+    backup.close_ftp()
+
+
+@alchemydumps.command()
+@click.option(
+    "-y",
+    "--assume-yes",
+    "assume_yes",
+    is_flag=True,
+    help="Assume `yes` for all prompts",
+)
+@with_appcontext
+def purge(assume_yes=False):
+    """Delete the backup files moved to the trash by `remove` or `autoclean`"""
+
+    backup = Backup()
+    trash = backup.target.get_trash()
+    if not trash:
+        click.echo("==> The trash is empty.")
+        backup.close_ftp()
+        return None
+
+    click.echo(f"==> Do you want to delete the {len(trash)} files in the trash?")
+    confirm = Confirm(assume_yes)
+    if confirm.ask():
+        deleted, failures = backup.purge()
+        click.echo(f"==> {deleted} files deleted.")
+        report(failures)
+        collect(backup)
     backup.close_ftp()
@@ -0,0 +1,161 @@
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class GzipCodec:
+    """Single-threaded gzip"""
+
+    NAME = "gzip"
+    EXTENSION = "gz"
+    LEVEL = 9
+
+    def __init__(self, level=None):
+        self.level = self.LEVEL if level is None else level
+
+    def open(self, target, mode):
+        """
+        Opens a file for compressed reading or writing
+        :param target: (pathlib.Path) Path of the file or binary file object
+        :param mode: (str) `rb` or `wb`
+        :return: binary file object
+        """
+        if "r" in mode:
+            return gzip.open(target, mode)
+        return gzip.open(target, mode, compresslevel=self.level)
+
+
+class ParallelGzipWriter:
+    """
+    Writable file object that splits its input in blocks and compresses them
+    in a pool of threads, each block as a gzip member: the concatenation of
+    the members is still a valid gzip file
+    """
+
+    def __init__(self, target, level, block_size, workers):
+        self.handler = open(target, "wb") if not hasattr(target, "write") else target
+        self.close_handler = self.handler is not target
+        self.level = level
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = list()
+        self.max_pending = workers * 2
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data):
+        size = self.block_size
+        self.buffer.extend(data)
+        while len(self.buffer) >= size:
+            block = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            self.submit(block)
+        return len(data)
+
+    def submit(self, block):
+        future = self.executor.submit(gzip.compress, block, self.level)
+        self.pending.append(future)
+        while len(self.pending) > self.max_pending:  # back pressure
+            self.handler.write(self.pending.pop(0).result())
+
+    def close(self):
+        if self.buffer or not self.pending:
+            self.submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        for future in self.pending:
+            self.handler.write(future.result())
+        self.pending = list()
+        self.executor.shutdown()
+        if self.close_handler:
+            self.handler.close()
+
+
+class ParallelGzipCodec(GzipCodec):
+    """Block-based gzip compressed in a pool of threads"""
+
+    NAME = "pgzip"
+    LEVEL = 6
+    BLOCK_SIZE = 2 ** 20
+
+    def open(self, target, mode):
+        if "r" in mode:
+            return gzip.open(target, mode)
+        workers = cpu_count() or 1
+        return ParallelGzipWriter(target, self.level, self.BLOCK_SIZE, workers)
+
+
+class ZstdCodec:
+    """Zstandard (requires the `zstandard` package)"""
+
+    NAME = "zstd"
+    EXTENSION = "zst"
+    LEVEL = 3
+
+    def __init__(self, level=None):
+        self.level = self.LEVEL if level is None else level
+
+    def open(self, target, mode):
+        if "r" in mode:
+            return zstandard.open(target, mode)
+        compressor = zstandard.ZstdCompressor(level=self.level, threads=-1)
+        return zstandard.open(target, mode, cctx=compressor)
+
+
+class Lz4Codec:
+    """LZ4 frames (requires the `lz4` package)"""
+
+    NAME = "lz4"
+    EXTENSION = "lz4"
+    LEVEL = 0
+
+    def __init__(self, level=None):
+        self.level = self.LEVEL if level is None else level
+
+    def open(self, target, mode):
+        if "r" in mode:
+            return lz4.frame.open(target, mode)
+        return lz4.frame.open(target, mode, compression_level=self.level)
+
+
+CODECS = {GzipCodec.NAME: GzipCodec, ParallelGzipCodec.NAME: ParallelGzipCodec}
+if zstandard:
+    CODECS[ZstdCodec.NAME] = ZstdCodec
+if lz4:
+    CODECS[Lz4Codec.NAME] = Lz4Codec
+
+
+def get_codec(spec=None):
+    """
+    Gets a codec from a `name[:level]` string (e.g. `gzip:6` or `zstd`)
+    :param spec: (str) Name of the codec optionally followed by a level
+    :return: codec instance
+    """
+    name, _, level = (spec or GzipCodec.NAME).partition(":")
+    if name not in CODECS:
+        available = ", ".join(CODECS)
+        raise ValueError(f"Unknown or unavailable codec {name} ({available})")
+    return CODECS[name](int(level) if level else None)
+
+
+def get_codec_by_extension(name):
+    """Gets the codec to read a file based on its extension"""
+    extension = name.rsplit(".", 1)[-1]
+    for codec in CODECS.values():
+        if codec.EXTENSION == extension:
+            return codec()
+    raise ValueError(f"No codec available to read {name}")
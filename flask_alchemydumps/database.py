@@ -1,40 +1,782 @@
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import partial
+from hashlib import blake2b
+from io import BytesIO
+from struct import Struct
+from time import perf_counter
+
 from flask import current_app
-from sqlalchemy.ext.serializer import dumps, loads
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    MetaData,
+    Table,
+    and_,
+    bindparam,
+    create_engine,
+    func,
+    inspect,
+)
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
+from sqlalchemy.ext.serializer import loads
+from sqlalchemy.orm import Session, configure_mappers
+
+from flask_alchemydumps.metrics import timed
+from flask_alchemydumps.pipeline import Stage
+from flask_alchemydumps.serializer import (
+    ColumnarSerializer,
+    get_serializer,
+    get_serializer_by_magic,
+)
+
+
+class PlainTable:
+    """
+    Stands for a table that isn't the table of a single mapped class (e.g.
+    association tables, or tables of class hierarchies), dumped and restored
+    as plain values under the name of the table
+    """
+
+    def __init__(self, table):
+        self.__name__ = table.name
+        self.__table__ = table
+
+    def __repr__(self):
+        return f"<PlainTable {self.__name__}>"
+
+
+class TableRow(namedtuple("TableRow", ("table", "values"))):
+    """Values (by column key) of a row of a `PlainTable`"""
+
+    def __repr__(self):
+        return f"<{self.table.name} {self.values}>"
+
+
+def dump_range(url, model, serializer, chunk_size, key_range):
+    """
+    Dumps the rows of a mapped class within a range of primary keys (see
+    `AlchemyDumpsDatabase.dump_range`) in a process of its own, connecting
+    to the database with a new engine
+    :param url: SQLAlchemy URL of the database
+    :param serializer: (str) Name of the serializer
+    """
+    engine = create_engine(url)
+    session = Session(bind=engine)
+    try:
+        alchemy = AlchemyDumpsDatabase(chunk_size, serializer=serializer)
+        return alchemy.dump_range(model, key_range, session)
+    finally:
+        session.close()
+        engine.dispose()
 
 
 class AlchemyDumpsDatabase:
-    def __init__(self):
+
+    CHUNK_SIZE = 1000
+    BATCH_SIZE = 5000
+    PART_SIZE = 1_000_000
+    QUEUE_SIZE = 4
+    MODES = ("merge", "bulk")
+    LENGTH = Struct(">Q")
+
+    def __init__(
+        self,
+        chunk_size=None,
+        batch_size=None,
+        mode="merge",
+        serializer=None,
+        content_defined=False,
+        part_size=None,
+        queue_size=None,
+    ):
         self.do_not_backup = list()
         self.models = list()
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+        self.part_size = self.PART_SIZE if part_size is None else part_size
+        self.queue_size = self.QUEUE_SIZE if queue_size is None else queue_size
+        self.content_defined = content_defined
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.mode = mode
+        self.serializer = get_serializer(serializer)
+        self.rows = dict()
+        self.timings = dict()
+        self.indexes = dict()
+        self.deleted = dict()
 
     @staticmethod
     def db():
         return current_app.extensions["alchemydumps"].db
 
     def get_mapped_classes(self):
-        """Gets a list of SQLALchemy mapped classes"""
-        db = self.db()
-        self.add_subclasses(db.Model)
+        """
+        Gets a list of SQLAlchemy mapped classes, one for each table in the
+        metadata, in dependency order; tables without a mapped class of their
+        own are listed as `PlainTable`
+        """
+        if not self.models:
+            db = self.db()
+            mapped = defaultdict(list)
+            for model in self.get_subclasses(db.Model):
+                mapped[inspect(model).local_table].append(model)
+
+            for table in db.metadata.sorted_tables:
+                models = mapped.get(table, tuple())
+                if len(models) == 1 and self.is_standalone(models[0]):
+                    self.models.append(models[0])
+                else:
+                    self.models.append(PlainTable(table))
         return self.models
 
-    def add_subclasses(self, model):
-        """Feed self.models filtering `do_not_backup` and abstract models"""
-        if model.__subclasses__():
-            for submodel in model.__subclasses__():
-                self.add_subclasses(submodel)
-        else:
-            self.models.append(model)
+    def get_sorted_classes(self):
+        """Gets mapped classes ordered so parent tables come before children"""
+        tables = self.db().metadata.sorted_tables
+        order = {table: index for index, table in enumerate(tables)}
+        return sorted(
+            self.get_mapped_classes(),
+            key=lambda model: order.get(model.__table__, len(order)),
+        )
+
+    def select_classes(self, names):
+        """
+        Restricts the mapped classes to some of them
+        :param names: (iterable) Names of the mapped classes or their tables
+        :return: (list) Selected mapped classes (ValueError for unknown names)
+        """
+        names = set(names)
+        models = [
+            model
+            for model in self.get_mapped_classes()
+            if {model.__name__, model.__table__.name} & names
+        ]
+        known = {model.__name__ for model in models}
+        known.update(model.__table__.name for model in models)
+        unknown = ", ".join(sorted(names - known))
+        if unknown:
+            raise ValueError(f"Unknown mapped classes: {unknown}")
+        self.models = models
+        return models
+
+    def get_subclasses(self, model):
+        """Gets mapped subclasses (at any level), skipping abstract models"""
+        for submodel in model.__subclasses__():
+            if hasattr(submodel, "__mapper__"):
+                yield submodel
+            yield from self.get_subclasses(submodel)
+
+    @staticmethod
+    def is_standalone(model):
+        """
+        Checks if a mapped class is not part of a class hierarchy, so its
+        rows can be restored as instances of it
+        """
+        mapper = inspect(model)
+        return mapper.inherits is None and len(mapper.self_and_descendants) == 1
+
+    def get_jobs(self, jobs, writes=False):
+        """
+        Number of tables that can be handled concurrently: in-memory SQLite
+        databases only exist within a single connection, and SQLite files
+        can't be written by concurrent connections, so they fall back to one
+        worker
+        :param jobs: (int) Number of workers requested
+        :param writes: (bool) Whether workers write to the database
+        :return: (int) Number of workers to be used
+        """
+        url = self.db().engine.url
+        if url.get_backend_name() == "sqlite" and (self.in_memory() or writes):
+            return 1
+        return max(jobs, 1)
+
+    def in_memory(self):
+        """Whether the database is an in-memory SQLite database"""
+        url = self.db().engine.url
+        in_memory = url.database in (None, "", ":memory:")
+        return url.get_backend_name() == "sqlite" and in_memory
+
+    def get_dependencies(self):
+        """
+        Maps each mapped class to the mapped classes its foreign keys refer to
+        :return: (dict) Mapped classes as keys, sets of mapped classes as values
+        """
+        models = self.get_sorted_classes()
+        by_table = {model.__table__: model for model in models}
+        dependencies = dict()
+        for model in models:
+            parents = (
+                by_table.get(fk.column.table) for fk in model.__table__.foreign_keys
+            )
+            dependencies[model] = {p for p in parents if p and p is not model}
+        return dependencies
+
+    def new_session(self):
+        """Creates a session with its own connection (e.g. for a worker)"""
+        return Session(bind=self.db().engine)
+
+    def in_worker(self, function):
+        """
+        Wraps a function to be called from a worker thread: it runs within the
+        app context and receives its own session as the `session` argument
+        """
+        app = current_app._get_current_object()
+
+        def worker(*args):
+            with app.app_context():
+                session = self.new_session()
+                try:
+                    return function(*args, session=session)
+                finally:
+                    session.close()
+
+        return worker
+
+    def iter_in_worker(self, function):
+        """
+        Same as `in_worker`, for generator functions: items are produced
+        within the app context and with a session of their own
+        """
+        app = current_app._get_current_object()
+
+        def worker(*args, **kwargs):
+            with app.app_context():
+                session = self.new_session()
+                try:
+                    yield from function(*args, session=session, **kwargs)
+                finally:
+                    session.close()
+
+        return worker
+
+    def run_by_dependency(self, function, jobs=1):
+        """
+        Calls `function` for each mapped class in a pool of workers, only
+        starting a mapped class once all of the mapped classes it depends on
+        (see `get_dependencies`) are done
+        :param function: callable receiving a mapped class and a `session`
+        :param jobs: (int) Number of workers
+        :return: (generator) Tuples with the mapped class and the result of
+        `function`, as they are done
+        """
+        if jobs == 1:
+            for model in self.get_sorted_classes():
+                yield model, function(model)
+            return
+
+        pending = self.get_dependencies()
+        done, running = set(), dict()
+        worker = self.in_worker(function)
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while pending or running:
+                ready = [m for m, parents in pending.items() if parents <= done]
+                if not ready and not running:  # circular dependency
+                    ready = [next(iter(pending))]
+                for model in ready:
+                    del pending[model]
+                    running[executor.submit(worker, model)] = model
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    model = running.pop(future)
+                    done.add(model)
+                    yield model, future.result()
+
+    def get_model(self, table_name):
+        """Gets the mapped class of a table, if any"""
+        for model in self.get_mapped_classes():
+            if model.__table__.name == table_name:
+                return model
+        return None
+
+    @staticmethod
+    def to_instances(model, rows):
+        """
+        Creates mapped class instances (without calling their `__init__`)
+        :param model: SQLAlchemy mapped class
+        :param rows: iterable of dicts with column names as keys
+        :return: (generator) SQLAlchemy mapped class instances
+        """
+        configure_mappers()
+        mapper = inspect(model)
+        keys = {
+            column.key: mapper.get_property_by_column(column).key
+            for column in mapper.local_table.columns
+        }
+        for values in rows:
+            instance = mapper.class_manager.new_instance()
+            for key, value in values.items():
+                setattr(instance, keys[key], value)
+            yield instance
+
+    def count_rows(self, model, session=None):
+        """Counts the rows in the table of a mapped class"""
+        session = session or self.db().session
+        query = session.query(func.count()).select_from(model.__table__)
+        return query.scalar()
+
+    def get_serializer(self, model):
+        """Plain tables have no instances to pickle: they're dumped as columns"""
+        if isinstance(model, PlainTable):
+            return ColumnarSerializer()
+        return self.serializer
+
+    def get_ranges(self, model, session=None):
+        """
+        Splits the table of a mapped class in ranges of primary keys of about
+        `self.part_size` rows, sized from the lowest and the highest keys and
+        the number of rows. Tables with fewer rows, or without a single
+        integer primary key column, are not split.
+        :return: (list) Tuples with the lowest and highest key (both included)
+        of each range, or an empty list
+        """
+        columns = tuple(model.__table__.primary_key.columns)
+        if not self.part_size or len(columns) != 1:
+            return list()
+        try:
+            if columns[0].type.python_type is not int:
+                return list()
+        except NotImplementedError:
+            return list()
+
+        session = session or self.db().session
+        (column,) = columns
+        query = session.query(func.min(column), func.max(column), func.count())
+        low, high, count = query.one()
+        if count <= self.part_size:
+            return list()
+
+        parts = -(-count // self.part_size)
+        step = -(-(high - low + 1) // parts)
+        return [
+            (start, min(start + step - 1, high)) for start in range(low, high + 1, step)
+        ]
+
+    def dump_range(self, model, key_range, session=None):
+        """
+        Dumps the rows of a mapped class within a range of primary keys
+        :param key_range: (tuple) Lowest and highest keys (see `get_ranges`)
+        :return: (tuple) Dumped bytes, number of rows and timings (see
+        `get_chunks`)
+        """
+        chunks = self.get_chunks(model, session, key_range=key_range)
+        contents = b"".join(chunks)
+        return contents, self.rows[model.__name__], self.timings[model.__name__]
+
+    def map_ranges(self, model, ranges, jobs=1, session=None):
+        """
+        Dumps ranges of primary keys of a mapped class (see `dump_range`),
+        each in a process of its own so serialization runs in parallel, with
+        at most `jobs` ranges dumped (or waiting to be written) at once. With
+        a single job, or in-memory SQLite databases (other processes can't
+        reach), ranges are dumped one after the other in this process.
+        :return: (generator) Results of `dump_range`, in order
+        """
+        if jobs == 1 or self.in_memory():
+            for key_range in ranges:
+                yield self.dump_range(model, key_range, session)
+            return
+
+        url = self.db().engine.url
+        args = (url, model, self.serializer.NAME, self.chunk_size)
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for key_range in ranges:
+                pending.append(executor.submit(dump_range, *args, key_range))
+                if len(pending) == jobs:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def get_chunks(self, model, session=None, index=None, key_range=None):
+        """
+        Pages through a mapped class and dumps it as length-prefixed chunks,
+        so only `self.chunk_size` rows are held in memory at once (see
+        `get_batches`). The time spent serializing rows is added to
+        `self.timings`.
+        :param model: SQLAlchemy mapped class
+        :param session: SQLAlchemy session (defaults to the app's session)
+        :param index: (dict) Digest of each row (by primary key) in a previous
+        backup (see `get_batches`)
+        :param key_range: (tuple) Lowest and highest primary keys of the rows
+        to be dumped, if not all of them (see `get_ranges`)
+        :return: (generator) bytes to be written sequentially in a backup file
+        """
+        serializer = self.get_serializer(model)
+        yield serializer.MAGIC
+        for batch in self.get_batches(model, session, index, key_range):
+            timings = self.timings[model.__name__]
+            yield self.frame(model.__table__, batch, timings, serializer)
+
+    def get_pipelined_chunks(self, model, index=None, key_range=None):
+        """
+        Same as `get_chunks`, but querying rows (with a session of its own)
+        and serializing them in two threads, connected by queues of
+        `self.queue_size` items, so both overlap with compressing and writing
+        the chunks (see `Stage`)
+        :return: (generator) bytes to be written sequentially in a backup file
+        """
+        serializer = self.get_serializer(model)
+        worker = self.iter_in_worker(self.get_batches)
+        worker = partial(worker, model, index=index, key_range=key_range)
+        batches = Stage(worker, self.queue_size)
+
+        def frames():
+            for batch in batches:
+                timings = self.timings[model.__name__]
+                yield self.frame(model.__table__, batch, timings, serializer)
+
+        yield serializer.MAGIC
+        yield from Stage(frames, self.queue_size)
+
+    def get_batches(self, model, session=None, index=None, key_range=None):
+        """
+        Pages through a mapped class in lists of up to `self.chunk_size`
+        rows. The number of rows is saved in `self.rows` as they are paged,
+        and the time spent querying rows in `self.timings`.
+        :param model: SQLAlchemy mapped class
+        :param session: SQLAlchemy session (defaults to the app's session)
+        With `content_defined`, lists also end after rows whose primary key
+        digest is a multiple of a quarter of the chunk size, so a changed row
+        doesn't shift the rows of the following lists.
+        :param index: (dict) Digest of each row (by primary key) in a previous
+        backup; if given, only new and changed rows are paged, and the new
+        index and the deleted primary keys are saved in `self.indexes` and in
+        `self.deleted` (see `get_index`)
+        :param key_range: (tuple) Lowest and highest primary keys of the rows
+        to be paged, if not all of them (see `get_ranges`)
+        :return: (generator) lists of rows
+        """
+        session = session or self.db().session
+        serializer = self.get_serializer(model)
+        query = serializer.query(session, model, self.chunk_size, key_range)
+        self.rows[model.__name__] = 0
+        timings = self.timings[model.__name__] = {"query": 0.0, "serialize": 0.0}
+        current = dict()
+
+        chunk = list()
+        for row in timed(query, timings, "query"):
+            if index is not None:
+                key, digest = self.get_digest(model, row)
+                current[key] = digest
+                if index.get(key) == digest:
+                    continue
+
+            chunk.append(row)
+            if len(chunk) == self.chunk_size or self.is_boundary(model, row):
+                yield chunk
+                self.rows[model.__name__] += len(chunk)
+                chunk = list()
+
+        if chunk:
+            yield chunk
+            self.rows[model.__name__] += len(chunk)
+
+        if index is not None:
+            self.indexes[model.__name__] = current
+            self.deleted[model.__name__] = [k for k in index if k not in current]
+
+    def get_values(self, model, row):
+        """Gets the column values of a row (instance, `TableRow`, tuple or dict)"""
+        columns = model.__table__.columns
+        if isinstance(row, TableRow):
+            row = row.values
+        if isinstance(row, dict):
+            return tuple(row.get(column.key) for column in columns)
+        if hasattr(row, "_sa_instance_state"):
+            mapper = inspect(model)
+            return tuple(
+                getattr(row, mapper.get_property_by_column(c).key) for c in columns
+            )
+        return tuple(row)
+
+    @staticmethod
+    def hash(values):
+        """Gets a 64-bit signed integer digest of a tuple of values"""
+        digest = blake2b(repr(values).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big", signed=True)
+
+    def get_digest(self, model, row):
+        """
+        Gets a digest of the values of a row, to detect changed rows
+        :return: (tuple) Primary key values and an integer digest
+        """
+        values = self.get_values(model, row)
+        return self.get_key(model, values), self.hash(values)
+
+    @staticmethod
+    def get_key_columns(table):
+        """Gets the primary key columns, or all columns for tables without one"""
+        return tuple(table.primary_key.columns) or tuple(table.columns)
+
+    def get_key(self, model, values):
+        """Gets the primary key values out of the column values of a row"""
+        table = model.__table__
+        keys = {column.key for column in self.get_key_columns(table)}
+        return tuple(v for c, v in zip(table.columns, values) if c.key in keys)
+
+    def is_boundary(self, model, row):
+        """Checks if a content-defined chunk ends after a row"""
+        if not self.content_defined:
+            return False
+        key = self.get_key(model, self.get_values(model, row))
+        return self.hash(key) % max(self.chunk_size // 4, 1) == 0
+
+    def get_index(self, model, rows):
+        """
+        Gets the digest of each row (e.g. of a backup), by primary key
+        :param model: SQLAlchemy mapped class
+        :param rows: iterable of rows (as loaded by `iter_data`)
+        :return: (dict) Primary key values as keys, digests as values
+        """
+        return dict(self.get_digest(model, row) for row in rows)
+
+    def get_key_table(self, model, name, digest=False):
+        """Table with the primary key columns (and a digest) of a model"""
+        keys = self.get_key_columns(model.__table__)
+        columns = [Column(c.key, c.type) for c in keys]
+        if digest:
+            columns.append(Column("digest", BigInteger))
+        return Table(f"{model.__table__.name}.{name}", MetaData(), *columns)
+
+    def get_key_chunks(self, table, keys):
+        """Dumps primary keys (and digests) in columnar chunks"""
+        serializer = ColumnarSerializer()
+        keys = list(keys)
+        yield serializer.MAGIC
+        for start in range(0, len(keys), self.chunk_size):
+            end = start + self.chunk_size
+            payload = serializer.dumps(table, keys[start:end])
+            yield self.LENGTH.pack(len(payload)) + payload
+
+    def get_index_chunks(self, model):
+        """Dumps the index saved by `get_chunks` (see `get_index`)"""
+        table = self.get_key_table(model, "index", digest=True)
+        index = self.indexes.get(model.__name__, dict())
+        return self.get_key_chunks(table, (k + (d,) for k, d in index.items()))
+
+    def get_deleted_chunks(self, model):
+        """Dumps the primary keys of deleted rows saved by `get_chunks`"""
+        table = self.get_key_table(model, "deleted")
+        return self.get_key_chunks(table, self.deleted.get(model.__name__, list()))
+
+    def read_index(self, contents):
+        """Loads an index dumped by `get_index_chunks`"""
+        values = (tuple(row.values()) for row in self.iter_data(contents))
+        return {row[:-1]: row[-1] for row in values}
+
+    def read_keys(self, contents):
+        """Loads primary keys dumped by `get_deleted_chunks`"""
+        return [tuple(row.values()) for row in self.iter_data(contents)]
+
+    def delete_rows(self, model, keys, session=None):
+        """
+        Deletes rows by primary key
+        :param model: SQLAlchemy mapped class
+        :param keys: (list) Tuples with primary key values
+        :param session: SQLAlchemy session (defaults to the app's session)
+        """
+        if not keys:
+            return
+
+        session = session or self.db().session
+        table = model.__table__
+        columns = self.get_key_columns(table)
+        where = and_(*(c == bindparam(f"key_{c.key}") for c in columns))
+        params = [{f"key_{c.key}": v for c, v in zip(columns, key)} for key in keys]
+        session.execute(table.delete().where(where), params)
+        session.commit()
+
+    def frame(self, table, rows, timings=None, serializer=None):
+        """
+        Serializes a list of rows prefixing it with its length in bytes
+        :param timings: (dict) Timings to add the serialization time to
+        :param serializer: defaults to `self.serializer`
+        """
+        start = perf_counter()
+        payload = (serializer or self.serializer).dumps(table, rows)
+        if timings is not None:
+            timings["serialize"] += perf_counter() - start
+        return self.LENGTH.pack(len(payload)) + payload
 
     def get_data(self):
         """Go through every mapped class and dumps the data"""
+        return {
+            model.__name__: b"".join(self.get_chunks(model))
+            for model in self.get_mapped_classes()
+        }
+
+    def filter_rows(self, rows, row_filter, model=None):
+        """
+        Keeps only the rows matching a `RowFilter`
+        :param rows: iterable of instances (or dicts of values, of `model`)
+        :return: (generator) Rows matching every predicate
+        """
+        for row in rows:
+            current = model or type(row)
+            table = current.__table__
+            values = dict(zip(table.columns.keys(), self.get_values(current, row)))
+            if row_filter.matches(table, values):
+                yield row
+
+    def may_match(self, serializer, payload, row_filter):
+        """
+        Checks the range of primary keys in the header of a chunk, so chunks
+        with no matching rows are skipped without being deserialized
+        """
+        if not hasattr(serializer, "read_header"):
+            return True
+        header = serializer.read_header(payload)
+        model = self.get_model(header["table"])
+        return not model or row_filter.may_match(model.__table__, header.get("keys"))
+
+    def iter_data(self, contents, session=None, row_filter=None):
+        """
+        Loads a dump lazily, one chunk at a time. Rows of formats that store
+        only column values are converted to instances of their mapped class.
+        :param contents: (bytes) Contents of a backup file
+        :param session: SQLAlchemy session (defaults to the app's session)
+        :param row_filter: (RowFilter) Predicates rows have to match, if any
+        :return: (generator) Rows of the mapped class
+        """
         db = self.db()
-        data = dict()
-        for model in self.get_mapped_classes():
-            query = db.session.query(model)
-            data[model.__name__] = dumps(query.all())
-        return data
+        session = session or db.session
+        serializer = get_serializer_by_magic(contents)
+        if not serializer:  # legacy, single pickle dump
+            rows = loads(contents, db.metadata, session)
+            yield from self.filter_rows(rows, row_filter) if row_filter else rows
+            return
+
+        stream = BytesIO(contents)
+        stream.seek(len(serializer.MAGIC))
+        while True:
+            header = stream.read(self.LENGTH.size)
+            if not header:
+                break
+            (length,) = self.LENGTH.unpack(header)
+            payload = stream.read(length)
+            if row_filter and not self.may_match(serializer, payload, row_filter):
+                continue
+
+            table_name, rows = serializer.loads(payload, db.metadata, session)
+            model = self.get_model(table_name) if table_name else None
+            if row_filter and (model or not table_name):
+                rows = self.filter_rows(rows, row_filter, model)
+            if isinstance(model, PlainTable):
+                rows = (TableRow(model.__table__, values) for values in rows)
+            elif model:
+                rows = self.to_instances(model, rows)
+            yield from rows
 
     def parse_data(self, contents):
         """Loads a dump and convert it into rows"""
+        return list(self.iter_data(contents))
+
+    def restore_rows(self, rows, session=None):
+        """
+        Restores rows into the database committing once per batch, either
+        merging ORM objects (`merge` mode) or inserting plain values with a
+        single `executemany` per table (`bulk` mode, for empty tables)
+        :param rows: iterable of rows (as loaded by `iter_data`)
+        :param session: SQLAlchemy session (defaults to the app's session)
+        :return: (list) Rows that could not be restored
+        """
+        restore = self.insert_batch if self.mode == "bulk" else self.restore_batch
+        fails = list()
+        batch = list()
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                fails.extend(restore(batch, session))
+                batch = list()
+
+        if batch:
+            fails.extend(restore(batch, session))
+
+        return fails
+
+    @staticmethod
+    def get_mappings(row):
+        """
+        Converts a row into plain values
+        :param row: SQLAlchemy mapped class instance (or `TableRow`)
+        :return: (generator) Tuples with a table and a dict of its values
+        """
+        if isinstance(row, TableRow):
+            yield row.table, dict(row.values)
+            return
+
+        state = inspect(row)
+        for table in state.mapper.tables:
+            values = dict()
+            for prop in state.mapper.column_attrs:
+                if prop.key not in state.dict:
+                    continue
+                for column in prop.columns:
+                    if column.table is table:
+                        values[column.key] = state.dict[prop.key]
+            yield table, values
+
+    def insert_batch(self, batch, session=None):
+        """
+        Inserts a batch of rows with Core `executemany`, skipping the ORM; if
+        that fails, falls back to merging the batch (see `restore_batch`)
+        :param batch: (list) Rows to be restored
+        :param session: SQLAlchemy session (defaults to the app's session)
+        :return: (list) Rows that could not be restored
+        """
         db = self.db()
-        return loads(contents, db.metadata, db.session)
+        session = session or db.session
+        values = defaultdict(list)
+        for row in batch:
+            for table, mapping in self.get_mappings(row):
+                values[table].append(mapping)
+
+        try:
+            for table in db.metadata.sorted_tables:
+                if values[table]:
+                    session.execute(table.insert(), values[table])
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            return self.restore_batch(batch, session)
+        return list()
+
+    def restore_batch(self, batch, session=None):
+        """
+        Merges and commits a batch of rows; if that fails, bisects the batch
+        until the rows causing the failure are isolated
+        :param batch: (list) Rows to be restored
+        :param session: SQLAlchemy session (defaults to the app's session)
+        :return: (list) Rows that could not be restored
+        """
+        session = session or self.db().session
+        try:
+            for row in batch:
+                if isinstance(row, TableRow):
+                    self.merge_values(row, session)
+                else:
+                    session.merge(row)
+            session.commit()
+        except (IntegrityError, InvalidRequestError):
+            session.rollback()
+            if len(batch) == 1:
+                return batch
+            middle = len(batch) // 2
+            head, tail = batch[:middle], batch[middle:]
+            return self.restore_batch(head, session) + self.restore_batch(tail, session)
+        return list()
+
+    def merge_values(self, row, session):
+        """
+        Merges a `TableRow` replacing the row with the same primary key (or
+        the same values, for tables without primary key), if any
+        """
+        table = row.table
+        columns = self.get_key_columns(table)
+        where = and_(*(column == row.values.get(column.key) for column in columns))
+        session.execute(table.delete().where(where))
+        session.execute(table.insert(), row.values)
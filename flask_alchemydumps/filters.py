@@ -0,0 +1,139 @@
+import re
+from decimal import InvalidOperation
+from operator import eq, ge, gt, le, lt, ne
+
+
+class Predicate:
+    """Condition on the value of a column, e.g. `id>=1000`"""
+
+    OPERATORS = {"=": eq, "!=": ne, "<": lt, "<=": le, ">": gt, ">=": ge}
+    PATTERN = re.compile(r"^\s*(\w+)\s*(<=|>=|!=|=|<|>)\s*(.*?)\s*$")
+    TRUE = ("1", "t", "true", "y", "yes")
+
+    def __init__(self, column, operator, value):
+        """
+        :param column: (str) Column name (as the key of the column)
+        :param operator: (str) One of `OPERATORS`
+        :param value: (str) Value, cast to the type of the column later on
+        """
+        self.column = column
+        self.operator = operator
+        self.value = value
+
+    @classmethod
+    def parse(cls, expression):
+        """Creates a predicate from an expression such as `id>=1000`"""
+        match = cls.PATTERN.match(expression)
+        if not match:
+            raise ValueError(f"Invalid predicate {expression} (e.g. id>=1000)")
+        return cls(*match.groups())
+
+    def cast(self, table):
+        """
+        Casts the value to the type of the column in a table
+        :param table: SQLAlchemy table
+        :return: the value or ValueError if it doesn't suit the column
+        """
+        column = table.columns.get(self.column)
+        if column is None:
+            raise ValueError(f"There is no column {self.column} in {table.name}")
+
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            return self.value
+        if python_type is bool:
+            return self.value.lower() in self.TRUE
+        try:
+            return python_type(self.value)
+        except (InvalidOperation, TypeError, ValueError):
+            msg = f"Invalid value {self.value} for {table.name}.{self.column}"
+            raise ValueError(msg)
+
+    def matches(self, value, expected):
+        """Whether a value matches (rows with NULL values never do)"""
+        if value is None:
+            return False
+        return self.OPERATORS[self.operator](value, expected)
+
+    def may_match(self, low, high, expected):
+        """Whether any value between `low` and `high` may match"""
+        operator = self.operator
+        if operator == "=":
+            return low <= expected <= high
+        if operator == "!=":
+            return not low == high == expected
+        if operator in ("<", "<="):
+            return self.OPERATORS[operator](low, expected)
+        return self.OPERATORS[operator](high, expected)
+
+
+class RowFilter:
+    """
+    Predicates rows have to match (all of them) to be restored, with their
+    values cast to the type of the columns of each table
+    """
+
+    def __init__(self, expressions=tuple(), tables=tuple()):
+        """
+        :param expressions: (iterable) Predicates (see `Predicate.parse`)
+        :param tables: (iterable) SQLAlchemy tables rows are restored to
+        (raises ValueError if a predicate doesn't suit any of them)
+        """
+        self.predicates = [Predicate.parse(expression) for expression in expressions]
+        self.values = {
+            table.name: [predicate.cast(table) for predicate in self.predicates]
+            for table in tables
+        }
+
+    def __bool__(self):
+        return bool(self.predicates)
+
+    def get_predicates(self, table):
+        if table.name not in self.values:
+            self.values[table.name] = [p.cast(table) for p in self.predicates]
+        return zip(self.predicates, self.values[table.name])
+
+    def matches(self, table, values):
+        """
+        :param table: SQLAlchemy table
+        :param values: (dict) Values of a row, with column keys as keys
+        """
+        return all(
+            predicate.matches(values.get(predicate.column), value)
+            for predicate, value in self.get_predicates(table)
+        )
+
+    def matches_key(self, table, key):
+        """
+        Whether a primary key matches the predicates on primary key columns
+        (other predicates are ignored)
+        :param key: (tuple) Values of the primary key columns
+        """
+        columns = table.primary_key.columns
+        values = {column.key: value for column, value in zip(columns, key)}
+        return all(
+            predicate.matches(values[predicate.column], value)
+            for predicate, value in self.get_predicates(table)
+            if predicate.column in values
+        )
+
+    def may_match(self, table, keys):
+        """
+        Whether rows within a range of keys may match, so chunks of rows that
+        can't match are skipped without being deserialized
+        :param keys: (list) Column name followed by its lowest and highest
+        values (as saved by `ColumnarSerializer`) or None
+        """
+        if not keys:
+            return True
+
+        column, low, high = keys
+        try:
+            return all(
+                predicate.may_match(low, high, value)
+                for predicate, value in self.get_predicates(table)
+                if predicate.column == column
+            )
+        except TypeError:  # values of different types can't be compared
+            return True
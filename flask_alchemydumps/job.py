@@ -0,0 +1,73 @@
+from threading import Thread
+from time import gmtime, strftime
+
+from flask_alchemydumps.backup import Backup
+from flask_alchemydumps.cli import dump_all
+from flask_alchemydumps.database import AlchemyDumpsDatabase
+from flask_alchemydumps.progress import Cancelled, Progress
+
+
+class BackupJob(Thread):
+    """
+    Creates a backup in a background thread (within the app context), so it
+    can be started from a running app (e.g. an admin endpoint) and followed
+    with `get_status` or cancelled with `cancel`
+    """
+
+    def __init__(self, app, jobs=1, incremental=False, callback=None):
+        """
+        :param app: Flask app
+        :param jobs: (int) Number of tables dumped concurrently
+        :param incremental: (bool) Dump only rows changed since the latest
+        backup
+        :param callback: callable receiving the job's `Progress` after each
+        update (see `Progress`)
+        """
+        super().__init__(daemon=True)
+        self.app = app
+        self.jobs = jobs
+        self.incremental = incremental
+        self.id = strftime("%Y%m%d%H%M%S", gmtime())
+        self.progress = Progress(callback)
+
+    def run(self):
+        with self.app.app_context():
+            backup = Backup()
+            backup.target.TIMESTAMP = self.id
+            alchemy = AlchemyDumpsDatabase(content_defined=backup.chunked)
+            backup.set_queue_size(alchemy.queue_size)
+            try:
+                backup.get_backups()
+                parent = backup.get_parent() if self.incremental else None
+                for _ in dump_all(alchemy, backup, self.jobs, parent, self.progress):
+                    pass
+            except Cancelled as cancelled:
+                self.discard(backup)
+                self.progress.stop("cancelled", cancelled)
+            except Exception as exception:
+                self.progress.stop("failed", exception)
+            else:
+                self.progress.stop("done")
+            finally:
+                backup.close_ftp()
+
+    def discard(self, backup):
+        """Deletes the files already created for a cancelled backup"""
+        names = (getattr(path, "name", path) for path in backup.target.get_files())
+        names = [n for n in names if backup.target.get_timestamp(n) == self.id]
+        backup.delete_files(names)
+        backup.save_catalog()
+        backup.collect()
+
+    def cancel(self):
+        """
+        Cancels the backup: it stops before writing the next chunk of rows
+        and the files already created are deleted
+        """
+        self.progress.cancel()
+
+    def get_status(self):
+        """:return: (dict) Progress of the backup (see `Progress.get_status`)"""
+        status = self.progress.get_status()
+        status["id"] = self.id
+        return status
@@ -0,0 +1,86 @@
+import json
+from threading import Lock
+from time import perf_counter
+
+from flask import current_app
+
+
+def timed(iterable, timings, key, count=None):
+    """
+    Iterates over an iterable adding the time spent getting each item (e.g.
+    fetching rows from a query) to `timings[key]`
+    :param timings: (dict) Timings in seconds
+    :param key: (str) Key of the timing to be incremented
+    :param count: (str) Key to add the number of items to, if any
+    :return: (generator) the same items
+    """
+    iterator = iter(iterable)
+    timings[key] = timings.get(key, 0.0)
+    if count:
+        timings[count] = timings.get(count, 0)
+    while True:
+        start = perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[key] += perf_counter() - start
+            return
+        timings[key] += perf_counter() - start
+        if count:
+            timings[count] += 1
+        yield item
+
+
+class TimedWriter:
+    """
+    Binary file object adding the time spent writing to another file object
+    (e.g. a file or an FTP data connection) to `timings["write"]`
+    """
+
+    def __init__(self, handler, timings):
+        self.handler = handler
+        self.timings = timings
+        self.timings["write"] = self.timings.get("write", 0.0)
+
+    def write(self, data):
+        start = perf_counter()
+        written = self.handler.write(data)
+        self.timings["write"] += perf_counter() - start
+        return written
+
+    def __getattr__(self, name):
+        return getattr(self.handler, name)
+
+
+class Metrics:
+    """
+    Timings (in seconds), rows and bytes of each table dumped or restored,
+    passed to a callback as each table is done (e.g. to push them to StatsD
+    or Prometheus)
+    """
+
+    def __init__(self, callback=None):
+        """
+        :param callback: callable receiving the name of the mapped class and
+        a dict with its metrics
+        """
+        self.callback = callback
+        self.tables = dict()
+        self.lock = Lock()
+
+    @classmethod
+    def from_app(cls):
+        """Creates metrics passed to the callback set in `AlchemyDumps`"""
+        return cls(current_app.extensions["alchemydumps"].metrics)
+
+    def report(self, class_name, **values):
+        """Records the metrics of a mapped class and passes them on"""
+        with self.lock:
+            self.tables[class_name] = values
+        if self.callback:
+            self.callback(class_name, dict(values))
+
+    def to_json(self):
+        """:return: (bytes) Metrics of all mapped classes as JSON"""
+        with self.lock:
+            return json.dumps({"tables": self.tables}, sort_keys=True).encode()
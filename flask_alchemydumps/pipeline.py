@@ -0,0 +1,183 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Full, Queue
+from threading import Event, Lock, Thread
+
+END = object()
+
+
+class Stage(Thread):
+    """
+    Step of a pipeline running in a thread of its own: the items it produces
+    are handed to the next step through a queue of at most `size` items, so
+    producing them (e.g. querying rows) overlaps with consuming them (e.g.
+    compressing and writing them). The thread blocks while the queue is full
+    (backpressure) and is stopped if the items are no longer consumed.
+    """
+
+    TIMEOUT = 0.1
+
+    def __init__(self, function, size):
+        """
+        :param function: callable returning the iterable of items, called
+        (and iterated) in the thread
+        :param size: (int) Maximum number of items waiting to be consumed
+        """
+        super().__init__(daemon=True)
+        self.function = function
+        self.queue = Queue(maxsize=max(size, 1))
+        self.stopped = Event()
+        self.error = None
+
+    def put(self, item):
+        """
+        Waits for room in the queue for an item, unless the stage is stopped
+        :return: (bool) Whether the item was queued
+        """
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=self.TIMEOUT)
+                return True
+            except Full:
+                continue
+        return False
+
+    def run(self):
+        items = None
+        try:
+            items = iter(self.function())
+            for item in items:
+                if not self.put(item):
+                    break
+        except BaseException as error:  # raised again when consuming
+            self.error = error
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+            self.put(END)
+
+    def __iter__(self):
+        """
+        Starts the thread and yields its items as they are ready, raising the
+        exception it stopped with, if any
+        """
+        self.start()
+        try:
+            while True:
+                item = self.queue.get()
+                if item is END:
+                    break
+                yield item
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.stopped.set()
+            self.join()
+
+
+class QueuedWriter:
+    """
+    Binary file object writing to another file object (e.g. a file or an FTP
+    data connection) from a thread of its own, with at most `size` writes
+    waiting, so compressing the next blocks overlaps with writing (or
+    uploading) the previous ones. Errors are raised by the next call.
+    """
+
+    def __init__(self, handler, size):
+        self.handler = handler
+        self.queue = Queue(maxsize=max(size, 1))
+        self.error = None
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            data = self.queue.get()
+            try:
+                if data is END:
+                    return
+                if self.error is None:  # after an error, only drain the queue
+                    self.handler.write(data)
+            except BaseException as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def write(self, data):
+        self.check()
+        data = bytes(data)  # buffers might be reused by the caller
+        self.queue.put(data)
+        return len(data)
+
+    def flush(self):
+        """Waits for the queued writes, then flushes the file object"""
+        self.queue.join()
+        self.check()
+        if hasattr(self.handler, "flush"):
+            self.handler.flush()
+
+    def close(self):
+        """Waits for the queued writes and stops the thread (once)"""
+        if self.thread.is_alive():
+            self.queue.put(END)
+            self.thread.join()
+        self.check()
+
+    def __getattr__(self, name):
+        return getattr(self.handler, name)
+
+
+class Prefetcher:
+    """
+    Calls a function (e.g. reading and decompressing a file) for the keys
+    expected to be needed next, in a pool of threads, so the results are
+    ready by the time they are needed. At most `size` results are being
+    computed or waiting to be used at once (bounded buffer).
+    """
+
+    def __init__(self, function, keys, size):
+        """
+        :param function: callable receiving a key
+        :param keys: (iterable) Keys in the order they are expected to be used
+        :param size: (int) Maximum number of keys handled ahead
+        """
+        self.function = function
+        self.keys = deque(keys)
+        self.size = size
+        self.futures = dict()
+        self.lock = Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(size, 1))
+        self.fill()
+
+    def fill(self):
+        """Starts the next keys, while there is room in the buffer"""
+        with self.lock:
+            while self.keys and len(self.futures) < self.size:
+                key = self.keys.popleft()
+                if key not in self.futures:
+                    self.futures[key] = self.executor.submit(self.function, key)
+
+    def get(self, key):
+        """
+        Gets the result for a key, waiting for it if already started, or
+        calling the function right away otherwise
+        """
+        with self.lock:
+            future = self.futures.pop(key, None)
+            if future is None and key in self.keys:
+                self.keys.remove(key)
+        self.fill()
+        return self.function(key) if future is None else future.result()
+
+    def close(self):
+        """Cancels the keys not started yet and waits for the running ones"""
+        with self.lock:
+            self.keys.clear()
+            for future in self.futures.values():
+                future.cancel()
+            self.futures.clear()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,156 @@
+from threading import Event, RLock
+from time import monotonic
+
+
+class Cancelled(Exception):
+    """Raised while creating a backup once it is cancelled"""
+
+
+class Progress:
+    """
+    Progress of a backup being created, updated as each table is dumped (from
+    any thread) and read by whoever is following it, e.g. a progress bar or
+    an admin endpoint polling a background job (see `BackupJob`)
+    """
+
+    def __init__(self, callback=None):
+        """
+        :param callback: callable receiving this object after each update
+        (called from the thread creating the backup, one call at a time)
+        """
+        self.callback = callback
+        self.lock = RLock()
+        self.cancelled = Event()
+        self.id = None
+        self.status = "pending"
+        self.error = None
+        self.tables = dict()
+        self.started = None
+        self.finished = None
+
+    def start(self, timestamp, totals):
+        """
+        :param timestamp: (str) Timestamp of the backup being created
+        :param totals: (dict) Number of rows of each table, by class name
+        """
+        with self.lock:
+            self.id = timestamp
+            self.status = "running"
+            self.started = monotonic()
+            self.tables = {
+                name: {"rows": 0, "total": total, "bytes": 0, "status": "pending"}
+                for name, total in totals.items()
+            }
+            self.notify()
+
+    def track(self, class_name, chunks, rows):
+        """
+        Follows the chunks of a table as they are written, raising `Cancelled`
+        before writing any further chunk once the backup is cancelled
+        :param class_name: (str) Name of the mapped class
+        :param chunks: (iterable) bytes to be written in the backup file
+        :param rows: (dict) Rows dumped so far by class name (updated while
+        `chunks` are generated, see `AlchemyDumpsDatabase.get_chunks`)
+        :return: (generator) the same chunks
+        """
+        self.update(class_name, status="running")
+        for chunk in chunks:
+            if self.cancelled.is_set():
+                raise Cancelled(f"Backup {self.id} cancelled")
+
+            with self.lock:
+                table = self.tables[class_name]
+                table["rows"] = rows.get(class_name, 0)
+                table["bytes"] += len(chunk)
+                self.notify()
+            yield chunk
+
+    def update(self, class_name, **values):
+        """Updates the progress of a table (e.g. its `status` or `rows`)"""
+        with self.lock:
+            self.tables[class_name].update(values)
+            self.notify()
+
+    def stop(self, status, error=None):
+        """
+        :param status: (str) Final status: done, failed or cancelled
+        :param error: Exception that made the backup fail, if any
+        """
+        with self.lock:
+            self.status = status
+            self.error = error
+            self.finished = monotonic()
+            self.notify()
+
+    def cancel(self):
+        """Asks for the backup to be cancelled (see `track`)"""
+        self.cancelled.set()
+
+    def notify(self):
+        if self.callback:
+            self.callback(self)
+
+    def get_table(self):
+        """Gets the name of the table being dumped, if any"""
+        running = (n for n, t in self.tables.items() if t["status"] == "running")
+        return next(running, None)
+
+    def get_fraction(self):
+        """
+        Gets the fraction of rows already dumped (tables fully dumped count as
+        done, even if only changed rows were dumped in incremental backups)
+        :return: (float) Number from 0 to 1
+        """
+        total = sum(table["total"] for table in self.tables.values())
+        if not total:
+            return 1.0 if self.status == "done" else 0.0
+
+        done = 0
+        for table in self.tables.values():
+            if table["status"] == "done":
+                done += table["total"]
+            else:
+                done += min(table["rows"], table["total"])
+        return done / total
+
+    def get_elapsed(self):
+        """Gets the seconds elapsed since the backup started"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or monotonic()) - self.started
+
+    def get_eta(self):
+        """
+        Estimates the seconds until the backup is done, assuming rows keep
+        being dumped at the same pace
+        :return: (float) Seconds or None if there's no estimate yet
+        """
+        if self.status != "running":
+            return 0.0 if self.finished else None
+
+        fraction = self.get_fraction()
+        if not fraction:
+            return None
+        return self.get_elapsed() * (1 - fraction) / fraction
+
+    def get_status(self):
+        """
+        :return: (dict) Snapshot of the progress (JSON serializable): `id`,
+        `status`, current `table`, `rows` and `bytes` (before compression)
+        dumped, `fraction` done, `elapsed` and `eta` in seconds, `error`,
+        and the progress of each table in `tables`
+        """
+        with self.lock:
+            tables = {name: dict(table) for name, table in self.tables.items()}
+            return {
+                "id": self.id,
+                "status": self.status,
+                "table": self.get_table(),
+                "rows": sum(table["rows"] for table in tables.values()),
+                "bytes": sum(table["bytes"] for table in tables.values()),
+                "fraction": self.get_fraction(),
+                "elapsed": self.get_elapsed(),
+                "eta": self.get_eta(),
+                "error": str(self.error) if self.error else None,
+                "tables": tables,
+            }
@@ -0,0 +1,282 @@
+import json
+import pickle
+from array import array
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from struct import Struct
+from sys import byteorder
+
+import decouple
+from sqlalchemy import select
+from sqlalchemy.ext.serializer import dumps, loads
+
+
+def in_range(table, key_range):
+    """
+    Condition for rows within a range of primary keys
+    :param table: SQLAlchemy table with a single primary key column
+    :param key_range: (tuple) Lowest and highest keys (both included)
+    """
+    (column,) = table.primary_key.columns
+    return column.between(*key_range)
+
+
+class PickleSerializer:
+    """Pickles whole ORM instances with SQLAlchemy serializer extension"""
+
+    NAME = "pickle"
+    MAGIC = b"ALCHEMYDUMPS-CHUNKED\n"
+
+    @staticmethod
+    def query(session, model, chunk_size, key_range=None):
+        query = session.query(model)
+        if key_range:
+            query = query.filter(in_range(model.__table__, key_range))
+        return query.yield_per(chunk_size)
+
+    @staticmethod
+    def dumps(table, rows):
+        """
+        :param table: SQLAlchemy table the rows come from
+        :param rows: (list) SQLAlchemy mapped class instances
+        :return: (bytes) Serialized rows
+        """
+        return dumps(rows)
+
+    @staticmethod
+    def loads(payload, metadata, session):
+        """
+        :param payload: (bytes) Serialized rows
+        :return: (tuple) Table name (unknown, thus None) and list of instances
+        """
+        return None, loads(payload, metadata, session)
+
+
+class ColumnarSerializer:
+    """
+    Serializes only column values, column by column: a JSON header with the
+    table name, the number of rows, the name and encoding of each column and
+    the range of primary keys, followed by one block per column with a null
+    mask and the encoded values.
+    Columns whose values don't share a single supported type fall back to a
+    pickled list of plain values.
+    """
+
+    NAME = "columnar"
+    MAGIC = b"ALCHEMYDUMPS-COLUMNAR\n"
+    LENGTH = Struct(">Q")
+    EPOCH = datetime(1970, 1, 1)
+    MICROSECOND = timedelta(microseconds=1)
+    INT64 = (-(2 ** 63), 2 ** 63 - 1)
+
+    @staticmethod
+    def query(session, model, chunk_size, key_range=None):
+        """Streams rows as tuples with a Core `select`, skipping the ORM"""
+        table = model.__table__
+        statement = select(table).order_by(*table.primary_key.columns)
+        if key_range:
+            statement = statement.where(in_range(table, key_range))
+        options = {"stream_results": True, "max_row_buffer": chunk_size}
+        return session.execute(statement.execution_options(**options))
+
+    def dumps(self, table, rows):
+        """
+        :param table: SQLAlchemy table the rows come from
+        :param rows: (list) Tuples with values in the same order as the
+        table columns
+        :return: (bytes) Serialized rows
+        """
+        columns = [column.key for column in table.columns]
+        keys = [column.key for column in table.primary_key.columns]
+        header = {"table": table.name, "rows": len(rows), "columns": list()}
+        blocks = list()
+        for index, name in enumerate(columns):
+            values = [row[index] for row in rows]
+            encoding = self.get_encoding(values)
+            header["columns"].append((name, encoding))
+            blocks.append(self.encode(encoding, values))
+            if keys == [name] and encoding in ("int", "text"):
+                header["keys"] = self.get_bounds(name, values)
+
+        blocks.insert(0, json.dumps(header).encode())
+        return b"".join(self.LENGTH.pack(len(block)) + block for block in blocks)
+
+    def loads(self, payload, metadata=None, session=None):
+        """
+        :param payload: (bytes) Serialized rows
+        :return: (tuple) Table name and list of dicts (column name: value)
+        """
+        blocks = self.split(payload)
+        header = json.loads(next(blocks).decode())
+        total = header["rows"]
+        columns = list()
+        for (_, encoding), block in zip(header["columns"], blocks):
+            columns.append(self.decode(encoding, block, total))
+
+        names = [name for name, _ in header["columns"]]
+        rows = [dict(zip(names, values)) for values in zip(*columns)]
+        return header["table"], rows
+
+    def read_header(self, payload):
+        """
+        Reads only the header of serialized rows: the table name, the number
+        of rows, the columns and, for tables with a single integer or text
+        primary key, its lowest and highest values (as `keys`)
+        """
+        return json.loads(next(self.split(payload)).decode())
+
+    @staticmethod
+    def get_bounds(name, values):
+        """Name of the primary key column, its lowest and highest values"""
+        values = [value for value in values if value is not None]
+        return [name, min(values), max(values)]
+
+    def split(self, payload):
+        offset = 0
+        while offset < len(payload):
+            (length,) = self.LENGTH.unpack_from(payload, offset)
+            start = offset + self.LENGTH.size
+            offset = start + length
+            yield payload[start:offset]
+
+    def get_encoding(self, values):
+        """Chooses the encoding of a column based on the type of its values"""
+        types = {type(value) for value in values if value is not None}
+        if len(types) != 1:
+            return "null" if not types else "object"
+
+        (type_,) = types
+        encoding = {
+            bool: "bool",
+            int: "int",
+            float: "float",
+            str: "text",
+            bytes: "blob",
+            Decimal: "numeric",
+            datetime: "datetime",
+            date: "date",
+            time: "time",
+            timedelta: "interval",
+        }.get(type_, "object")
+
+        if encoding == "int":
+            low, high = self.INT64
+            if not all(low <= value <= high for value in values if value is not None):
+                return "object"
+        if encoding in ("datetime", "time"):
+            if any(value.tzinfo for value in values if value is not None):
+                return "object"
+        return encoding
+
+    def encode(self, encoding, values):
+        if encoding == "object":
+            return pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+
+        mask = bytes(value is None for value in values)
+        if encoding == "null":
+            return b""
+
+        present = [value for value in values if value is not None]
+        if encoding in ("text", "numeric", "blob"):
+            if encoding != "blob":
+                present = [str(value).encode() for value in present]
+            lengths = self.to_bytes("Q", (len(value) for value in present))
+            data = self.LENGTH.pack(len(lengths)) + lengths + b"".join(present)
+        elif encoding == "float":
+            data = self.to_bytes("d", present)
+        else:
+            data = self.to_bytes("q", (self.to_int(encoding, v) for v in present))
+
+        return mask + data
+
+    def decode(self, encoding, block, total):
+        if encoding == "null":
+            return [None] * total
+        if encoding == "object":
+            return pickle.loads(block)
+
+        mask, data = block[:total], block[total:]
+        if encoding in ("text", "numeric", "blob"):
+            (size,) = self.LENGTH.unpack_from(data)
+            start, offset = self.LENGTH.size, self.LENGTH.size + size
+            values = list()
+            for length in self.from_bytes("Q", data[start:offset]):
+                start, offset = offset, offset + length
+                values.append(data[start:offset])
+            if encoding == "text":
+                values = [value.decode() for value in values]
+            elif encoding == "numeric":
+                values = [Decimal(value.decode()) for value in values]
+        elif encoding == "float":
+            values = self.from_bytes("d", data)
+        else:
+            values = [self.from_int(encoding, v) for v in self.from_bytes("q", data)]
+
+        present = iter(values)
+        return [None if is_null else next(present) for is_null in mask]
+
+    @staticmethod
+    def to_bytes(typecode, values):
+        data = array(typecode, values)
+        if byteorder != "little":
+            data.byteswap()
+        return data.tobytes()
+
+    @staticmethod
+    def from_bytes(typecode, data):
+        values = array(typecode)
+        values.frombytes(data)
+        if byteorder != "little":
+            values.byteswap()
+        return values.tolist()
+
+    def to_int(self, encoding, value):
+        """Represents temporal values as a number of microseconds (or days)"""
+        if encoding == "datetime":
+            return (value - self.EPOCH) // self.MICROSECOND
+        if encoding == "date":
+            return value.toordinal()
+        if encoding == "time":
+            seconds = value.hour * 3600 + value.minute * 60 + value.second
+            return seconds * 10 ** 6 + value.microsecond
+        if encoding == "interval":
+            return value // self.MICROSECOND
+        return int(value)
+
+    def from_int(self, encoding, value):
+        if encoding == "datetime":
+            return self.EPOCH + timedelta(microseconds=value)
+        if encoding == "date":
+            return date.fromordinal(value)
+        if encoding == "time":
+            seconds, microsecond = divmod(value, 10 ** 6)
+            minutes, second = divmod(seconds, 60)
+            hour, minute = divmod(minutes, 60)
+            return time(hour, minute, second, microsecond)
+        if encoding == "interval":
+            return timedelta(microseconds=value)
+        if encoding == "bool":
+            return bool(value)
+        return value
+
+
+SERIALIZERS = {
+    serializer.NAME: serializer for serializer in (ColumnarSerializer, PickleSerializer)
+}
+
+
+def get_serializer(name=None):
+    """
+    Gets a serializer by its name, defaulting to `ALCHEMYDUMPS_SERIALIZER`
+    env var (or to the columnar serializer)
+    """
+    name = name or decouple.config("ALCHEMYDUMPS_SERIALIZER", default="columnar")
+    return SERIALIZERS[name]()
+
+
+def get_serializer_by_magic(contents):
+    """Gets the serializer that wrote a backup file, None for legacy files"""
+    for serializer in SERIALIZERS.values():
+        if contents.startswith(serializer.MAGIC):
+            return serializer()
+    return None
@@ -0,0 +1,46 @@
+"""
+Measures the retention computation of `autoclean` for hourly backups,
+against the previous implementation. Run with:
+python -m tests.benchmarks.autoclean
+"""
+from datetime import date, datetime, timedelta
+from time import perf_counter
+
+from flask_alchemydumps.autoclean import BackupAutoClean
+
+from ..unit.test_autoclean import LegacyAutoClean
+
+
+TODAY = date(2024, 6, 15)
+
+
+def get_date_ids(total):
+    last = datetime(TODAY.year, TODAY.month, TODAY.day)
+    return [
+        datetime.strftime(last - timedelta(hours=hours), "%Y%m%d%H%M%S")
+        for hours in range(total)
+    ]
+
+
+def measure(cls, date_ids):
+    start = perf_counter()
+    backup_list = cls(date_ids, TODAY)
+    return perf_counter() - start, backup_list
+
+
+def main():
+    print(f"{'ids':>9} {'legacy (s)':>11} {'single pass (s)':>16}")
+    for total in (10_000, 100_000, 1_000_000):
+        date_ids = get_date_ids(total)
+        elapsed, backup_list = measure(BackupAutoClean, date_ids)
+        legacy = "-"
+        if total <= 100_000:  # too slow for more ids
+            legacy, expected = measure(LegacyAutoClean, date_ids)
+            assert expected.white_list == backup_list.white_list
+            assert expected.black_list == backup_list.black_list
+            legacy = f"{legacy:.3f}"
+        print(f"{total:>9} {legacy:>11} {elapsed:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
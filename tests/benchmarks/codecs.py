@@ -0,0 +1,56 @@
+"""
+Measures throughput (MB/s) and compression ratio of each available codec
+on a columnar dump. Run with: python -m tests.benchmarks.codecs
+"""
+from io import BytesIO
+from time import perf_counter
+
+from flask_alchemydumps.compression import CODECS, get_codec
+from flask_alchemydumps.database import AlchemyDumpsDatabase
+
+from ..integration.app import Post, app, db
+
+
+ROWS = 200_000
+SPECS = ("gzip:9", "gzip:6", "gzip:1", "pgzip:6", "zstd:3", "lz4")
+
+
+def get_contents():
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(
+        Post,
+        (
+            {"title": f"Post {i}", "content": f"Lorem ipsum {i % 97} " * 8}
+            for i in range(ROWS)
+        ),
+    )
+    db.session.commit()
+    contents = b"".join(AlchemyDumpsDatabase().get_chunks(Post))
+    db.drop_all()
+    return contents
+
+
+def main():
+    with app.app_context():
+        contents = get_contents()
+
+    size = len(contents) / 2 ** 20
+    print(f"{size:.2f} MB of uncompressed dump")
+    print(f"{'codec':>8} {'MB/s':>8} {'ratio':>6}")
+    for spec in SPECS:
+        if spec.partition(":")[0] not in CODECS:
+            print(f"{spec:>8} {'(not installed)':>15}")
+            continue
+
+        output = BytesIO()
+        start = perf_counter()
+        with get_codec(spec).open(output, "wb") as handler:
+            handler.write(contents)
+        elapsed = perf_counter() - start
+        ratio = len(contents) / len(output.getvalue())
+        print(f"{spec:>8} {size / elapsed:>8.1f} {ratio:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compares `create` wall-clock time with 1, 4 and 8 jobs on a file-based
+SQLite database with several tables.
+Run with: python -m tests.benchmarks.create_jobs
+"""
+from os import environ
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from click.testing import CliRunner
+from flask import Flask
+from flask.cli import ScriptInfo
+from flask_sqlalchemy import SQLAlchemy
+
+from flask_alchemydumps import AlchemyDumps
+from flask_alchemydumps.cli import create
+
+
+TABLES = 16
+ROWS = 20_000
+JOBS = (1, 4, 8)
+
+
+def get_app(directory):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{directory / 'bench.db'}"
+    db = SQLAlchemy(app)
+    AlchemyDumps(app, db)
+
+    models = list()
+    for index in range(TABLES):
+        name = f"Table{index}"
+        columns = {
+            "id": db.Column(db.Integer, primary_key=True),
+            "title": db.Column(db.String(140)),
+            "content": db.Column(db.UnicodeText),
+        }
+        globals()[name] = type(name, (db.Model,), columns)  # pickle lookup
+        models.append(globals()[name])
+
+    with app.app_context():
+        db.create_all()
+        for model in models:
+            db.session.bulk_insert_mappings(
+                model,
+                (
+                    {"title": f"Row {i}", "content": "Lorem ipsum " * 8}
+                    for i in range(ROWS)
+                ),
+            )
+        db.session.commit()
+
+    return app
+
+
+def main():
+    with TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        app = get_app(directory)
+        obj = ScriptInfo(create_app=lambda *args: app)
+        print(f"{TABLES} tables with {ROWS} rows each")
+        print(f"{'jobs':>4} {'time (s)':>9}")
+        for jobs in JOBS:
+            environ["ALCHEMYDUMPS_DIR"] = str(directory / f"jobs-{jobs}")
+            start = perf_counter()
+            result = CliRunner().invoke(create, args=f"-j {jobs}", obj=obj)
+            elapsed = perf_counter() - start
+            assert result.exit_code == 0, result.output
+            print(f"{jobs:>4} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
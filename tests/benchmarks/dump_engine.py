@@ -0,0 +1,74 @@
+"""
+Compares the rows per second fetched and dumped through the ORM (instances
+or column queries) and through a streamed Core `select` of the table.
+Run with: python -m tests.benchmarks.dump_engine
+"""
+from time import perf_counter
+
+from flask_alchemydumps.database import AlchemyDumpsDatabase
+from flask_alchemydumps.serializer import ColumnarSerializer
+
+from ..integration.app import Post, app, db
+
+
+ROWS = 200_000
+CHUNK_SIZE = AlchemyDumpsDatabase.CHUNK_SIZE
+
+
+def feed():
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(
+        Post,
+        ({"title": f"Post {i}", "content": "Lorem ipsum " * 8} for i in range(ROWS)),
+    )
+    db.session.commit()
+    db.session.remove()
+
+
+def orm_instances():
+    return db.session.query(Post).yield_per(CHUNK_SIZE)
+
+
+def orm_columns():
+    table = Post.__table__
+    query = db.session.query(*table.columns).order_by(*table.primary_key.columns)
+    return query.yield_per(CHUNK_SIZE)
+
+
+def core():
+    return ColumnarSerializer.query(db.session, Post, CHUNK_SIZE)
+
+
+def measure(rows):
+    start = perf_counter()
+    count = sum(1 for _ in rows)
+    elapsed = perf_counter() - start
+    db.session.remove()
+    return count / elapsed
+
+
+def main():
+    with app.app_context():
+        feed()
+        print(f"{'':>22} {'rows/s':>10}")
+        for name, query in (
+            ("fetch ORM instances", orm_instances),
+            ("fetch ORM columns", orm_columns),
+            ("fetch Core select", core),
+        ):
+            print(f"{name:>22} {measure(query()):>10,.0f}")
+
+        for name in ("pickle", "columnar"):
+            chunks = AlchemyDumpsDatabase(serializer=name).get_chunks(Post)
+            start = perf_counter()
+            for _ in chunks:
+                pass
+            rows_per_second = ROWS / (perf_counter() - start)
+            print(f"{f'dump {name}':>22} {rows_per_second:>10,.0f}")
+            db.session.remove()
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
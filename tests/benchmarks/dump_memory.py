@@ -0,0 +1,61 @@
+"""
+Compares peak memory of the legacy `dumps(query.all())` dump against the
+streaming, chunked dump. Run with: python -m tests.benchmarks.dump_memory
+"""
+import tracemalloc
+from gzip import GzipFile
+from io import BytesIO
+
+from sqlalchemy.ext.serializer import dumps
+
+from flask_alchemydumps.database import AlchemyDumpsDatabase
+
+from ..integration.app import Post, app, db
+
+
+SIZES = (1_000, 5_000, 20_000)
+
+
+def feed(rows):
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(
+        Post,
+        ({"title": f"Post {i}", "content": "Lorem ipsum " * 8} for i in range(rows)),
+    )
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def legacy():
+    with GzipFile(fileobj=BytesIO(), mode="wb") as handler:
+        handler.write(dumps(db.session.query(Post).all()))
+
+
+def streaming():
+    alchemy = AlchemyDumpsDatabase()
+    with GzipFile(fileobj=BytesIO(), mode="wb") as handler:
+        for chunk in alchemy.get_chunks(Post):
+            handler.write(chunk)
+
+
+def peak(function):
+    db.session.expunge_all()
+    tracemalloc.start()
+    function()
+    _, value = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value / 2 ** 20
+
+
+def main():
+    with app.app_context():
+        print(f"{'rows':>8} {'legacy (MB)':>12} {'streaming (MB)':>15}")
+        for rows in SIZES:
+            feed(rows)
+            print(f"{rows:>8} {peak(legacy):>12.2f} {peak(streaming):>15.2f}")
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures grouping backup file names by timestamp (as `history` and
+`autoclean` do) with one pass over the names, against filtering all the
+names once per timestamp. Run with: python -m tests.benchmarks.grouping
+"""
+import re
+from os import environ
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from flask_alchemydumps.backup import Backup, CommonTools
+
+
+CLASSES = ("User", "Post", "SomeControl", "Comments")
+PATTERN = r"(.*)(-)(?P<timestamp>[\d]{14})(-)(?P<name>.*)(\.)(?P<extension>\w+)$"
+
+
+def get_names(total):
+    for index in range(total // len(CLASSES)):
+        timestamp = f"{19700101000000 + index:014d}"
+        for class_name in CLASSES:
+            yield f"db-bkp-{timestamp}-{class_name}.gz"
+
+
+def filter_by_timestamp(names):
+    """Previous implementation: all names are parsed once per timestamp"""
+    timestamps = set(re.search(PATTERN, name).group("timestamp") for name in names)
+    for timestamp in timestamps:
+        tuple(n for n in names if re.search(PATTERN, n).group("timestamp") == timestamp)
+
+
+def group(backup, names):
+    backup.files = names
+    for timestamp in backup.get_timestamps():
+        tuple(backup.by_timestamp(timestamp))
+
+
+def main():
+    with TemporaryDirectory() as tmp:
+        environ["ALCHEMYDUMPS_DIR"] = tmp
+        backup = Backup()
+
+        print(f"{'names':>8} {'filter (s)':>11} {'group (s)':>10} {'cached (s)':>11}")
+        for total in (1_000, 10_000, 100_000):
+            names = tuple(get_names(total))
+            filtered = "-"
+            if total <= 10_000:  # quadratic, too slow for more names
+                start = perf_counter()
+                filter_by_timestamp(names)
+                filtered = f"{perf_counter() - start:.3f}"
+
+            CommonTools.parse_name.cache_clear()
+            start = perf_counter()
+            group(backup, names)
+            grouped = perf_counter() - start
+
+            start = perf_counter()
+            group(backup, tuple(names))
+            cached = perf_counter() - start
+            print(f"{total:>8} {filtered:>11} {grouped:>10.3f} {cached:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compares listing backups on a (fake) FTP server from the files in the backup
+directory with listing them from the catalog. Run with:
+python -m tests.benchmarks.history
+"""
+from os import environ
+from time import perf_counter
+from unittest.mock import patch
+
+from flask_alchemydumps.backup import Backup
+
+from ..ftp import FakeFTP
+
+
+LATENCY = 0.02
+CLASSES = ("User", "Post", "SomeControl", "Comments")
+
+
+def get_server(backups):
+    files = dict()
+    for day in range(backups):
+        timestamp = f"{20000101 + day:08d}{day % 240000:06d}"
+        for class_name in CLASSES:
+            files[f"db-bkp-{timestamp}-{class_name}.gz"] = b""
+    return FakeFTP(files, latency=LATENCY)
+
+
+def history(backup):
+    """Same calls as the history command"""
+    for timestamp in backup.get_timestamps():
+        tuple(backup.by_timestamp(timestamp))
+
+
+def measure(server, listing=False):
+    with patch("flask_alchemydumps.backup.ftplib.FTP", return_value=server):
+        start = perf_counter()
+        backup = Backup()
+        if listing:
+            backup.files = tuple(backup.target.get_files())
+        history(backup)
+        return perf_counter() - start
+
+
+def main():
+    environ["ALCHEMYDUMPS_FTP_SERVER"] = "localhost"
+    environ["ALCHEMYDUMPS_FTP_USER"] = "user"
+    environ["ALCHEMYDUMPS_FTP_PATH"] = "/backups"
+
+    print(f"{'backups':>8} {'source':>8} {'seconds':>8}")
+    for backups in (1_000, 10_000):
+        server = get_server(backups)
+        if backups <= 1_000:  # listing is quadratic, too slow for more backups
+            print(f"{backups:>8} {'listing':>8} {measure(server, True):>8.3f}")
+        measure(server)  # creates the catalog
+        print(f"{backups:>8} {'catalog':>8} {measure(server):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compares `create` running its stages (querying, serializing, compressing and
+uploading) in sequence with running them in a pipeline of threads, on a
+file-based SQLite database and a (fake) FTP server with limited bandwidth.
+The time of each stage comes from the sequential run, where they add up to
+the total: pipelined, the total should approach the slowest stage. Then
+compares `restore` downloading each file when it is restored with
+downloading the next files ahead. Run with:
+python -m tests.benchmarks.pipeline [--rows 100000] [--bandwidth 2]
+    [--codec gzip:1] [--look-ahead 2]
+"""
+
+from argparse import ArgumentParser
+from io import BytesIO
+from os import environ
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest.mock import patch
+
+from flask_alchemydumps.backup import Backup
+from flask_alchemydumps.cli import create, restore
+
+from ..ftp import FakeFTP, FakeUpload
+from .suite import Suite
+
+
+class ThrottledUpload(FakeUpload):
+    """Upload sleeping as if sent at `server.bandwidth` MB/s"""
+
+    def write(self, data):
+        sleep(len(data) / (self.server.bandwidth * 2 ** 20))
+        return super().write(data)
+
+
+class ThrottledDownload(BytesIO):
+    """Download sleeping as if received at `bandwidth` MB/s"""
+
+    def __init__(self, contents, bandwidth):
+        super().__init__(contents)
+        self.bandwidth = bandwidth
+
+    def read(self, size=-1):
+        data = super().read(size)
+        sleep(len(data) / (self.bandwidth * 2 ** 20))
+        return data
+
+
+class ThrottledFTP(FakeFTP):
+    def __init__(self, files, bandwidth):
+        super().__init__(files)
+        self.bandwidth = bandwidth
+
+    def transfercmd(self, command):
+        connection = super().transfercmd(command)
+        if connection.command == "STOR":
+            handler = ThrottledUpload(self, connection.name)
+        else:
+            handler = ThrottledDownload(self.files[connection.name], self.bandwidth)
+        connection.makefile = lambda *args, **kwargs: handler
+        return connection
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tables", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--width", type=int, default=8, help="Columns per table")
+    parser.add_argument("--bandwidth", type=float, default=2, help="In MB/s")
+    parser.add_argument("--codec", default="gzip:1")
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--look-ahead", type=int, default=2)
+    args = parser.parse_args()
+
+    environ["ALCHEMYDUMPS_FTP_SERVER"] = "localhost"
+    environ["ALCHEMYDUMPS_FTP_USER"] = "user"
+    environ["ALCHEMYDUMPS_FTP_PATH"] = "/backups"
+    environ["ALCHEMYDUMPS_CODEC"] = args.codec
+    files = dict()
+    connect = patch(
+        "flask_alchemydumps.backup.ftplib.FTP",
+        side_effect=lambda *credentials: ThrottledFTP(files, args.bandwidth),
+    )
+
+    with TemporaryDirectory() as tmp, connect:
+        directory = Path(tmp)
+        environ["ALCHEMYDUMPS_DIR"] = str(directory / "backups")
+        suite = Suite(directory, args.tables, args.rows, args.width, 0)
+        sequential = suite.run(create, "-p 0 -q 0")
+        pipelined = suite.run(create, f"-p 0 -q {args.queue_size}")
+
+        restores = dict()
+        for look_ahead in (0, args.look_ahead):
+            with suite.app.app_context():
+                timestamp = Backup().get_timestamps()[-1]
+                suite.db.drop_all()
+                suite.db.create_all()
+            restore_args = f"-d {timestamp} -m bulk -l {look_ahead}"
+            restores[look_ahead] = suite.run(restore, restore_args)["seconds"]
+
+    stages = sequential["stages"]
+    print(" ".join(f"{stage} {seconds:.3f}s" for stage, seconds in stages.items()))
+    print(f"{'sum of stages':>16} {sum(stages.values()):>8.3f}s")
+    print(f"{'slowest stage':>16} {max(stages.values()):>8.3f}s")
+    print(f"{'sequential':>16} {sequential['seconds']:>8.3f}s")
+    print(f"{'pipelined':>16} {pipelined['seconds']:>8.3f}s")
+    for look_ahead, seconds in restores.items():
+        print(f"{f'restore (-l {look_ahead})':>16} {seconds:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
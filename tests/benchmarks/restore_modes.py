@@ -0,0 +1,50 @@
+"""
+Compares restoring a table with `merge` and `bulk` modes.
+Run with: python -m tests.benchmarks.restore_modes
+"""
+from time import perf_counter
+
+from flask_alchemydumps.database import AlchemyDumpsDatabase
+
+from ..integration.app import Post, app, db
+
+
+SIZES = (1_000, 10_000, 50_000)
+
+
+def dump(rows):
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(
+        Post,
+        ({"title": f"Post {i}", "content": "Lorem ipsum " * 8} for i in range(rows)),
+    )
+    db.session.commit()
+    contents = b"".join(AlchemyDumpsDatabase().get_chunks(Post))
+    db.session.remove()
+    return contents
+
+
+def timed(contents, mode):
+    db.drop_all()
+    db.create_all()
+    alchemy = AlchemyDumpsDatabase(mode=mode)
+    start = perf_counter()
+    alchemy.restore_rows(alchemy.iter_data(contents))
+    elapsed = perf_counter() - start
+    db.session.remove()
+    return elapsed
+
+
+def main():
+    with app.app_context():
+        print(f"{'rows':>8} {'merge (s)':>10} {'bulk (s)':>10}")
+        for rows in SIZES:
+            contents = dump(rows)
+            merge, bulk = timed(contents, "merge"), timed(contents, "bulk")
+            print(f"{rows:>8} {merge:>10.2f} {bulk:>10.2f}")
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
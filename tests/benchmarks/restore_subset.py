@@ -0,0 +1,55 @@
+"""
+Compares restoring a whole table with restoring 1,000 of its rows with a
+primary key range (`restore --where`).
+Run with: python -m tests.benchmarks.restore_subset
+"""
+from time import perf_counter
+
+from flask_alchemydumps.database import AlchemyDumpsDatabase
+from flask_alchemydumps.filters import RowFilter
+
+from ..integration.app import Post, app, db
+
+
+SIZES = (10_000, 100_000, 500_000)
+SUBSET = 1_000
+
+
+def dump(rows):
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(
+        Post,
+        ({"title": f"Post {i}", "content": "Lorem ipsum " * 8} for i in range(rows)),
+    )
+    db.session.commit()
+    contents = b"".join(AlchemyDumpsDatabase().get_chunks(Post))
+    db.session.remove()
+    return contents
+
+
+def timed(contents, row_filter=None):
+    db.drop_all()
+    db.create_all()
+    alchemy = AlchemyDumpsDatabase(mode="bulk")
+    start = perf_counter()
+    alchemy.restore_rows(alchemy.iter_data(contents, row_filter=row_filter))
+    elapsed = perf_counter() - start
+    db.session.remove()
+    return elapsed
+
+
+def main():
+    with app.app_context():
+        print(f"{'rows':>8} {'all (s)':>8} {f'{SUBSET} rows (s)':>15}")
+        for rows in SIZES:
+            contents = dump(rows)
+            middle = rows // 2
+            where = (f"id>{middle}", f"id<={middle + SUBSET}")
+            subset = timed(contents, RowFilter(where, (Post.__table__,)))
+            print(f"{rows:>8} {timed(contents):>8.2f} {subset:>15.2f}")
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares file size, dump time and load time of each serializer.
+Run with: python -m tests.benchmarks.serializers
+"""
+import gzip
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from flask_alchemydumps.database import AlchemyDumpsDatabase
+from flask_alchemydumps.serializer import SERIALIZERS
+
+from ..integration.app import Post, app, db
+
+
+ROWS = 50_000
+
+
+def feed():
+    db.drop_all()
+    db.create_all()
+    now = datetime.now()
+    db.session.bulk_insert_mappings(
+        Post,
+        (
+            {
+                "title": f"Post {i}",
+                "content": "Lorem ipsum " * 8,
+                "author_id": i % 100,
+                "created_on": now - timedelta(minutes=i),
+                "updated_on": now,
+            }
+            for i in range(ROWS)
+        ),
+    )
+    db.session.commit()
+    db.session.remove()
+
+
+def measure(name):
+    alchemy = AlchemyDumpsDatabase(serializer=name)
+
+    start = perf_counter()
+    contents = b"".join(alchemy.get_chunks(Post))
+    dumped = perf_counter() - start
+    size = len(gzip.compress(contents, compresslevel=6))
+    db.session.remove()
+
+    start = perf_counter()
+    for _ in alchemy.iter_data(contents):
+        pass
+    loaded = perf_counter() - start
+    db.session.remove()
+
+    return size / 2 ** 20, dumped, loaded
+
+
+def main():
+    with app.app_context():
+        feed()
+        print(f"{ROWS} rows")
+        print(f"{'serializer':>10} {'size (MB)':>10} {'dump (s)':>9} {'load (s)':>9}")
+        for name in SERIALIZERS:
+            size, dumped, loaded = measure(name)
+            print(f"{name:>10} {size:>10.2f} {dumped:>9.2f} {loaded:>9.2f}")
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
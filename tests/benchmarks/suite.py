@@ -0,0 +1,272 @@
+"""
+Times `create`, `restore`, `history` and `autoclean` end to end and per
+stage on a file-based SQLite database with synthetic tables, recording the
+peak RSS of the process after each command. Results are saved as JSON so
+two runs can be compared. Run with:
+python -m tests.benchmarks.suite [--rows 10000] [--width 8] [--ftp]
+    [--jobs 4] [--part-size 100000] [--queue-size 4] [--output results.json]
+    [--compare previous.json]
+"""
+
+import json
+import platform
+from argparse import ArgumentParser
+from collections import defaultdict
+from datetime import datetime, timedelta
+from os import environ
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from unittest.mock import patch
+
+from click.testing import CliRunner
+from flask import Flask
+from flask.cli import ScriptInfo
+from flask_sqlalchemy import SQLAlchemy
+
+from flask_alchemydumps import AlchemyDumps
+from flask_alchemydumps.autoclean import BackupAutoClean
+from flask_alchemydumps.backup import Backup
+from flask_alchemydumps.cli import autoclean, create, history, restore
+from flask_alchemydumps.database import AlchemyDumpsDatabase
+
+from ..ftp import FakeFTP
+
+try:
+    from resource import RUSAGE_SELF, getrusage
+except ImportError:  # pragma: no cover
+    getrusage = None
+
+
+def get_peak_rss():
+    """Peak resident set size of this process in MB (None on Windows)"""
+    if not getrusage:
+        return None
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if platform.system() == "Darwin" else peak / 2 ** 10
+
+
+class Suite:
+    """App with synthetic tables, and the commands to be timed on it"""
+
+    def __init__(
+        self,
+        directory,
+        tables,
+        rows,
+        width,
+        backups,
+        jobs=1,
+        part_size=0,
+        queue_size=AlchemyDumpsDatabase.QUEUE_SIZE,
+    ):
+        self.directory = directory
+        self.tables = tables
+        self.rows = rows
+        self.width = width
+        self.backups = backups
+        self.jobs = jobs
+        self.part_size = part_size
+        self.queue_size = queue_size
+        self.stages = defaultdict(float)
+        self.app = self.get_app()
+        self.obj = ScriptInfo(create_app=lambda *args: self.app)
+
+    def collect(self, class_name, metrics):
+        """Metrics callback adding up the timings of all tables"""
+        for key, value in metrics.items():
+            if isinstance(value, float):
+                self.stages[key] += value
+
+    def get_app(self):
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+        uri = f"sqlite:///{self.directory / 'bench.db'}"
+        app.config["SQLALCHEMY_DATABASE_URI"] = uri
+        db = SQLAlchemy(app)
+        AlchemyDumps(app, db, metrics=self.collect)
+
+        self.models = list()
+        for index in range(self.tables):
+            name = f"Table{index}"
+            columns = {"id": db.Column(db.Integer, primary_key=True)}
+            for column in range(self.width):
+                kind = db.Integer if column % 2 else db.String(64)
+                columns[f"column{column}"] = db.Column(kind)
+            globals()[name] = type(name, (db.Model,), columns)  # pickle lookup
+            self.models.append(globals()[name])
+
+        with app.app_context():
+            db.create_all()
+            for model in self.models:
+                db.session.bulk_insert_mappings(model, self.get_rows())
+            db.session.commit()
+
+        self.db = db
+        return app
+
+    def get_rows(self):
+        for row in range(self.rows):
+            yield {
+                f"column{column}": row if column % 2 else f"Row {row} column {column}"
+                for column in range(self.width)
+            }
+
+    def run(self, command, args=""):
+        self.stages.clear()
+        start = perf_counter()
+        result = CliRunner().invoke(command, args=args, obj=self.obj)
+        elapsed = perf_counter() - start
+        assert result.exit_code == 0, result.exception or result.output
+        return {
+            "seconds": elapsed,
+            "stages": dict(self.stages),
+            "peak_rss_mb": get_peak_rss(),
+        }
+
+    def create(self):
+        args = f"-j {self.jobs} -p {self.part_size} -q {self.queue_size}"
+        return self.run(create, args)
+
+    def restore(self):
+        with self.app.app_context():
+            timestamp = Backup().get_timestamps()[-1]
+            self.db.drop_all()
+            self.db.create_all()
+        return self.run(restore, f"-d {timestamp} -j {self.jobs}")
+
+    def feed_backups(self):
+        """Creates empty backup files for `history` and `autoclean`"""
+        with self.app.app_context():
+            backup = Backup()
+            for index in range(self.backups):
+                date = datetime(2000, 1, 1) + timedelta(hours=index * 13)
+                timestamp = date.strftime("%Y%m%d%H%M%S")
+                for model in self.models:
+                    name = backup.get_name(model.__name__, timestamp)
+                    backup.create_file(name, b"")
+            backup.save_catalog()
+            backup.close_ftp()
+
+    def history(self):
+        result = self.run(history)
+        with self.app.app_context():
+            start = perf_counter()
+            backup = Backup()
+            for timestamp in backup.get_timestamps():
+                tuple(backup.by_timestamp(timestamp))
+            result["stages"]["list"] = perf_counter() - start
+            backup.close_ftp()
+        return result
+
+    def autoclean(self):
+        with self.app.app_context():
+            backup = Backup()
+            start = perf_counter()
+            timestamps = backup.get_timestamps()
+            listing = perf_counter() - start
+
+            start = perf_counter()
+            BackupAutoClean(timestamps).black_list
+            retention = perf_counter() - start
+            backup.close_ftp()
+
+        result = self.run(autoclean, "-y")
+        result["stages"].update(list=listing, retention=retention)
+        delete = result["seconds"] - listing - retention  # roughly, the rest
+        result["stages"]["delete"] = delete
+        return result
+
+
+def compare(current, previous):
+    print(f"\n{'':>10} {'previous (s)':>13} {'current (s)':>12} {'ratio':>6}")
+    for command, result in current["results"].items():
+        before = previous["results"].get(command)
+        if not before:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        print(
+            f"{command:>10} {before['seconds']:>13.3f} "
+            f"{result['seconds']:>12.3f} {ratio:>6.2f}"
+        )
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tables", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--width", type=int, default=8, help="Columns per table")
+    parser.add_argument("--backups", type=int, default=200)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--part-size", type=int, default=0, help="0 to never split")
+    parser.add_argument("--queue-size", type=int, default=4, help="0 for no pipeline")
+    parser.add_argument("--ftp", action="store_true", help="Use an FTP stand-in")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path)
+    args = parser.parse_args()
+
+    files = dict()
+    connect = patch(
+        "flask_alchemydumps.backup.ftplib.FTP",
+        side_effect=lambda *credentials: FakeFTP(files, args.latency),
+    )
+    if args.ftp:
+        environ["ALCHEMYDUMPS_FTP_SERVER"] = "localhost"
+        environ["ALCHEMYDUMPS_FTP_USER"] = "user"
+        environ["ALCHEMYDUMPS_FTP_PATH"] = "/backups"
+        connect.start()
+
+    results = dict()
+    with TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        environ["ALCHEMYDUMPS_DIR"] = str(directory / "backups")
+        suite = Suite(
+            directory,
+            args.tables,
+            args.rows,
+            args.width,
+            args.backups,
+            args.jobs,
+            args.part_size,
+            args.queue_size,
+        )
+        results["create"] = suite.create()
+        results["restore"] = suite.restore()
+        suite.feed_backups()
+        results["history"] = suite.history()
+        results["autoclean"] = suite.autoclean()
+
+    if args.ftp:
+        connect.stop()
+
+    print(f"{'':>10} {'time (s)':>9} {'peak RSS (MB)':>14}  stages (s)")
+    for command, result in results.items():
+        stages = ", ".join(f"{k} {v:.3f}" for k, v in result["stages"].items())
+        rss = result["peak_rss_mb"] or 0
+        print(f"{command:>10} {result['seconds']:>9.3f} {rss:>14.1f}  {stages}")
+
+    config = (
+        "tables",
+        "rows",
+        "width",
+        "backups",
+        "jobs",
+        "part_size",
+        "queue_size",
+        "ftp",
+        "latency",
+    )
+    current = {
+        "config": {key: getattr(args, key) for key in config},
+        "python": platform.python_version(),
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2, sort_keys=True))
+    if args.compare:
+        compare(current, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from collections import deque
+from ftplib import error_perm, error_reply, error_temp
+from io import BytesIO
+from time import sleep
+
+
+class FakeUpload(BytesIO):
+    def __init__(self, server, name):
+        super().__init__()
+        self.server = server
+        self.name = name
+
+    def close(self):
+        if not self.closed:
+            self.server.files[self.name] = self.getvalue()
+        super().close()
+
+
+class FakeConnection:
+    def __init__(self, server, command):
+        self.server = server
+        self.command, self.name = command.split(" ", 1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def makefile(self, mode, buffering=None):
+        if self.command == "STOR":
+            return FakeUpload(self.server, self.name)
+        return BytesIO(self.server.files[self.name])
+
+    def close(self):
+        pass
+
+
+class FakeFTP:
+    """
+    In-memory stand-in for `ftplib.FTP` with optional latency (in seconds)
+    added to every command round trip. Replies are queued as in a control
+    connection, so a command reading a reply left pending by a previous one
+    (e.g. the end of a transfer) fails.
+    """
+
+    def __init__(self, files=None, latency=0, host="localhost", path="/backups"):
+        self.files = files if files is not None else dict()
+        self.latency = latency
+        self.host = host
+        self.path = path
+        self.dirs = set()
+        self.commands = list()
+        self.transfers = list()  # commands and transfer type (ASCII by default)
+        self.type = "A"
+        self.replies = deque()
+
+    def round_trip(self, command, reply="200 OK"):
+        self.commands.append(command)
+        if self.latency:
+            sleep(self.latency)
+        self.replies.append(reply)
+        return self.getresp()
+
+    def getresp(self):
+        reply = self.replies.popleft()
+        if self.replies:
+            raise error_reply(f"{reply} (read instead of {self.replies[-1]})")
+        if reply.startswith("4"):
+            raise error_temp(reply)
+        if reply.startswith("5"):
+            raise error_perm(reply)
+        return reply
+
+    def pwd(self):
+        self.round_trip("PWD")
+        return self.path
+
+    def cwd(self, path):
+        self.round_trip(f"CWD {path}")
+        self.path = path
+        return f"250 {path}"
+
+    def nlst(self, path=None):
+        if path is None:
+            self.round_trip("NLST")
+            files = (name for name in self.files if "/" not in name)
+            return list(files) + sorted(self.dirs)
+
+        self.round_trip(f"NLST {path}")
+        if path not in self.dirs:
+            raise error_perm(f"550 {path}: No such directory")
+        return [name for name in self.files if name.startswith(f"{path}/")]
+
+    def mkd(self, path):
+        self.round_trip(f"MKD {path}")
+        if path in self.dirs:
+            raise error_perm(f"550 {path}: Directory exists")
+        self.dirs.add(path)
+        return path
+
+    def voidcmd(self, command):
+        self.round_trip(command)
+        if command.startswith("TYPE "):
+            self.type = command[5:]
+        return "200 OK"
+
+    def transfercmd(self, command):
+        connection = FakeConnection(self, command)
+        reply = "150 Opening data connection"
+        if connection.command == "RETR" and connection.name not in self.files:
+            reply = f"550 {connection.name}: No such file"
+        self.round_trip(command, reply)
+        self.transfers.append((command, self.type))
+        self.replies.append("226 Transfer complete")
+        return connection
+
+    def voidresp(self):
+        return self.getresp()
+
+    def size(self, name):
+        self.round_trip(f"SIZE {name}")
+        if name not in self.files:
+            raise error_perm(f"550 {name}: No such file")
+        return len(self.files[name])
+
+    def delete(self, name):
+        self.round_trip(f"DELE {name}")
+        if name not in self.files:
+            raise error_perm(f"550 {name}: No such file")
+        del self.files[name]
+
+    def rename(self, name, new_name):
+        self.round_trip(f"RNFR {name}")
+        self.round_trip(f"RNTO {new_name}")
+        directory, _, _ = new_name.rpartition("/")
+        if name not in self.files or (directory and directory not in self.dirs):
+            raise error_perm(f"550 {new_name}: No such file or directory")
+        self.files[new_name] = self.files.pop(name)
+
+    def quit(self):
+        self.round_trip("QUIT")
+
+    def close(self):
+        pass
@@ -12,6 +12,13 @@ alchemydumps = AlchemyDumps(app, db)
 
 
 # create models
+likes = db.Table(
+    "likes",
+    db.Column("user_id", db.Integer, db.ForeignKey("user.id")),
+    db.Column("post_id", db.Integer, db.ForeignKey("post.id")),
+)
+
+
 class Base(db.Model):
     __abstract__ = True
     created_on = db.Column(db.DateTime, default=db.func.now())
@@ -22,6 +29,7 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(140), index=True, unique=True)
     posts = db.relationship("Post", backref="author", lazy="dynamic")
+    liked = db.relationship("Post", secondary=likes)
 
 
 class Post(Base):
@@ -1,14 +1,27 @@
+import json
+from itertools import chain
 from os import environ
 from tempfile import TemporaryDirectory
 from unittest import TestCase
+from unittest.mock import patch
 
 from click.testing import CliRunner
 from flask.cli import ScriptInfo
 
-from flask_alchemydumps.cli import create, restore, remove, autoclean
-from flask_alchemydumps.backup import Backup
+from flask_alchemydumps import AlchemyDumps
+from flask_alchemydumps.cli import (
+    autoclean,
+    create,
+    history,
+    purge,
+    remove,
+    restore,
+)
+from flask_alchemydumps.backup import Backup, CommonTools, LocalTools
+from flask_alchemydumps.database import AlchemyDumpsDatabase
 
-from .app import Comments, Post, SomeControl, User, db
+from ..ftp import FakeFTP
+from .app import Comments, Post, SomeControl, User, app, db, likes
 
 
 class TestCommands(TestCase):
@@ -32,6 +45,10 @@ class TestCommands(TestCase):
         # commit
         db.session.commit()
 
+        # feed association table
+        db.session.execute(likes.insert(), {"user_id": 1, "post_id": 2})
+        db.session.commit()
+
         # temp directory & envvar
         self.tmp = TemporaryDirectory()
         self.backup_alchemydumps_dir = environ.get("ALCHEMYDUMPS_DIR")
@@ -41,6 +58,7 @@ class TestCommands(TestCase):
         self.backup = Backup()
 
     def tearDown(self):
+        self.db.session.remove()
         self.db.drop_all()
         self.tmp.cleanup()
         del environ["ALCHEMYDUMPS_DIR"]
@@ -64,10 +82,10 @@ class TestCommands(TestCase):
         self.assertEqual(controls, 1)
         self.assertEqual(comments, 0)
 
-        # create and assert backup files
+        # create and assert backup files (one per table, and the metrics)
         self.runner(create)
         self.backup.files = tuple(self.backup.target.get_files())
-        self.assertEqual(len(self.backup.files), 4)
+        self.assertEqual(len(self.backup.files), 6)
 
         # clean up database
         self.db.drop_all()
@@ -103,6 +121,7 @@ class TestCommands(TestCase):
         self.assertEqual(post.author.email, "me@example.etc")
         self.assertEqual(post.title, "Post 1")
         self.assertEqual(post.content, "Lorem ipsum...")
+        self.assertEqual(["Post 2"], [p.title for p in post.author.liked])
 
         # remove backup
         self.runner(remove, f"-d {date_id} -y")
@@ -111,6 +130,331 @@ class TestCommands(TestCase):
         self.backup.files = tuple(self.backup.target.get_files())
         self.assertEqual(len(self.backup.files), 0)
 
+    def test_history(self):
+        result = self.runner(history)
+        self.assertIn("No backups found", result.output)
+
+        self.runner(create)
+        result = self.runner(history)
+        timestamp = self.backup.target.TIMESTAMP
+        self.assertIn(f"==> ID: {timestamp}", result.output)
+        name = self.backup.get_name("Post", timestamp)
+        self.assertIn(f"    {self.backup.target.path / name}\n", result.output)
+
+    def test_metrics(self):
+        reported = dict()
+        config = app.extensions["alchemydumps"]
+        config.metrics = reported.__setitem__
+        try:
+            self.runner(create)
+            keys = {"rows", "bytes", "size", "query", "serialize", "compress", "write"}
+            self.assertEqual(keys, set(reported["Post"]))
+            self.assertEqual(2, reported["Post"]["rows"])
+
+            # metrics are saved next to the backup files
+            name = self.backup.get_name(Backup.METRICS)
+            saved = json.loads(self.backup.target.read_file(name))
+            self.assertEqual(reported, saved["tables"])
+
+            reported.clear()
+            self.runner(restore, f"-d {self.backup.target.TIMESTAMP}")
+            keys = {"rows", "bytes", "read", "deserialize", "restore", "delete"}
+            self.assertEqual(keys, set(reported["Post"]))
+            self.assertEqual(2, reported["Post"]["rows"])
+        finally:
+            config.metrics = None
+
+    def test_create_with_jobs(self):
+        result = self.runner(create, "-j 4")
+        self.assertEqual(0, result.exit_code)
+        self.backup.files = tuple(self.backup.target.get_files())
+        self.assertEqual(len(self.backup.files), 6)
+        self.assertIn("2 rows from Post saved", result.output)
+        self.assertIn("1 rows from likes saved", result.output)
+
+    def test_create_restore_bulk(self):
+
+        # create backup files and clean up database
+        self.runner(create)
+        self.db.drop_all()
+        self.db.create_all()
+
+        # restore backup in bulk mode
+        self.backup.files = tuple(self.backup.target.get_files())
+        date_id, *_ = self.backup.get_timestamps()
+        result = self.runner(restore, f"-d {date_id} -m bulk")
+        self.assertEqual(0, result.exit_code)
+        self.assertNotIn("partially", result.output)
+
+        # assert data was restored
+        self.assertEqual(Post.query.count(), 2)
+        self.assertEqual(User.query.count(), 1)
+        self.assertEqual(SomeControl.query.count(), 1)
+        post, *_ = Post.query.all()
+        self.assertEqual(post.author.email, "me@example.etc")
+        self.assertTrue(post.created_on)
+
+    def test_restore_tables_and_rows(self):
+        self.runner(create)
+        self.db.drop_all()
+        self.db.create_all()
+
+        # restore only the second post (and no other table)
+        self.backup.files = tuple(self.backup.target.get_files())
+        date_id, *_ = self.backup.get_timestamps()
+        args = f"-d {date_id} -t Post -w id>=2 -m bulk"
+        result = self.runner(restore, args)
+        self.assertEqual(0, result.exit_code)
+        self.assertEqual(["Post 2"], [post.title for post in Post.query.all()])
+        self.assertEqual(0, User.query.count())
+        self.assertEqual(0, SomeControl.query.count())
+
+        # invalid tables or predicates restore nothing
+        for args in ("-t Player", "-t Post -w goals>1", "-w id>two"):
+            result = self.runner(restore, f"-d {date_id} {args}")
+            self.assertEqual(0, result.exit_code)
+            self.assertIn("==> ", result.output)
+        self.assertEqual(1, Post.query.count())
+
+    def test_create_restore_remove_parts(self):
+        with patch.object(CommonTools, "TIMESTAMP", "20200101000000"):
+            result = self.runner(create, "-p 1")
+        self.assertIn("2 rows from Post saved", result.output)
+        parts = self.backup.find_parts("Post", "20200101000000")
+        self.assertEqual(2, len(parts))
+        self.assertIsNone(self.backup.find("Post", "20200101000000"))
+        self.assertEqual(parts, self.backup.read_parts("Post", "20200101000000"))
+        self.assertEqual(8, len(tuple(self.backup.by_timestamp("20200101000000"))))
+
+        # parts are listed in a single line
+        result = self.runner(history)
+        name = self.backup.get_part_name("Post", "*", "20200101000000")
+        path = self.backup.target.get_path(name)
+        self.assertIn(f"    {path} (2 parts)\n", result.output)
+
+        # incremental backups are based on all parts
+        db.session.add(Post(title="Post 3", author_id=1))
+        db.session.commit()
+        with patch.object(CommonTools, "TIMESTAMP", "20200102000000"):
+            result = self.runner(create, "-i -p 1")
+        self.assertIn("1 changed and 0 deleted rows from Post", result.output)
+
+        for date_id, posts in (("20200101000000", 2), ("20200102000000", 3)):
+            self.db.drop_all()
+            self.db.create_all()
+            result = self.runner(restore, f"-d {date_id}")
+            self.assertEqual(0, result.exit_code)
+            self.assertEqual(posts, Post.query.count())
+            if date_id == "20200101000000":
+                self.assertIn(f"==> {name} totally restored.", result.output)
+
+        # all parts are removed
+        self.runner(remove, "-d 20200101000000 -y")
+        self.assertEqual(["20200102000000"], list(Backup().get_timestamps()))
+
+    @patch.object(AlchemyDumpsDatabase, "CHUNK_SIZE", 1)
+    def test_create_restore_max_file_size(self):
+        with patch.object(CommonTools, "TIMESTAMP", "20200101000000"):
+            result = self.runner(create, "-p 0 -s 1")
+        self.assertIn("2 rows from Post saved", result.output)
+
+        # files are split once they cross the maximum size, then listed
+        parts = self.backup.read_parts("Post", "20200101000000")
+        self.assertEqual(parts, self.backup.find_parts("Post", "20200101000000"))
+        self.assertEqual(2, len(parts))
+        self.assertIsNotNone(self.backup.find("User", "20200101000000"))
+        for part in parts:
+            details = self.backup.get_backups()["20200101000000"][part]
+            self.assertEqual({"bytes", "sha256", "size"}, set(details))
+
+        self.db.drop_all()
+        self.db.create_all()
+        result = self.runner(restore, "-d 20200101000000")
+        self.assertEqual(0, result.exit_code)
+        self.assertEqual(2, Post.query.count())
+        self.assertEqual(1, User.query.count())
+
+        result = self.runner(create, "-s 42X")
+        self.assertIn("Invalid maximum file size", result.output)
+
+    def test_create_restore_with_codec(self):
+        environ["ALCHEMYDUMPS_CODEC"] = "pgzip:1"
+        try:
+            self.runner(create)
+        finally:
+            del environ["ALCHEMYDUMPS_CODEC"]
+
+        self.db.drop_all()
+        self.db.create_all()
+
+        # restore backup (with default codec)
+        self.backup.files = tuple(self.backup.target.get_files())
+        date_id, *_ = self.backup.get_timestamps()
+        result = self.runner(restore, f"-d {date_id}")
+        self.assertEqual(0, result.exit_code)
+        self.assertEqual(Post.query.count(), 2)
+        self.assertEqual(User.query.count(), 1)
+
+    def test_create_restore_remote_with_look_ahead(self):
+        files, servers = dict(), list()
+
+        def connect(*args):
+            servers.append(FakeFTP(files))
+            return servers[-1]
+
+        environ.update(
+            ALCHEMYDUMPS_FTP_SERVER="localhost",
+            ALCHEMYDUMPS_FTP_USER="user",
+            ALCHEMYDUMPS_FTP_PATH="/backups",
+        )
+        try:
+            with patch("flask_alchemydumps.backup.ftplib.FTP", side_effect=connect):
+                with patch.object(CommonTools, "TIMESTAMP", "20200101000000"):
+                    self.runner(create)
+                self.db.drop_all()
+                self.db.create_all()
+                result = self.runner(restore, "-d 20200101000000 -l 3")
+        finally:
+            for key in ("SERVER", "USER", "PATH"):
+                del environ[f"ALCHEMYDUMPS_FTP_{key}"]
+
+        self.assertEqual(0, result.exit_code)
+        self.assertIn("db-bkp-20200101000000-Post.gz totally restored", result.output)
+        self.assertEqual(Post.query.count(), 2)
+        self.assertEqual(User.query.count(), 1)
+
+        # each file is downloaded once, prefetched or not
+        commands = chain.from_iterable(server.commands for server in servers)
+        downloads = [c for c in commands if c.startswith("RETR db-bkp-2020")]
+        self.assertEqual(5, len(downloads))
+        self.assertEqual(len(downloads), len(set(downloads)))
+
+    def test_create_restore_incremental(self):
+
+        # full backup, then changes: one new, one updated and one deleted row
+        with patch.object(LocalTools, "TIMESTAMP", "20200101000000"):
+            self.runner(create)
+        self.db.session.add(User(email="you@example.etc"))
+        Post.query.filter_by(id=1).update({"title": "Post 1 (edited)"})
+        Post.query.filter_by(id=2).delete()
+        self.db.session.commit()
+
+        # incremental backup with only the changes
+        with patch.object(LocalTools, "TIMESTAMP", "20200102000000"):
+            result = self.runner(create, "--incremental")
+        self.assertEqual(0, result.exit_code)
+        self.assertIn("1 changed and 0 deleted rows from User", result.output)
+        self.assertIn("1 changed and 1 deleted rows from Post", result.output)
+        self.assertIn("0 changed and 0 deleted rows from SomeControl", result.output)
+        self.backup.files = tuple(self.backup.target.get_files())
+        chain = self.backup.get_chain("Post", "20200102000000")
+        self.assertEqual(["20200101000000", "20200102000000"], chain)
+        manifest = self.backup.read_manifest("20200102000000")
+        self.assertEqual("20200101000000", manifest["parent"])
+
+        # restore the incremental backup in a clean database
+        self.db.drop_all()
+        self.db.create_all()
+        result = self.runner(restore, "-d 20200102000000")
+        self.assertEqual(0, result.exit_code)
+        self.assertNotIn("partially", result.output)
+        self.assertEqual(2, User.query.count())
+        self.assertEqual(["Post 1 (edited)"], [p.title for p in Post.query.all()])
+        self.assertEqual(1, SomeControl.query.count())
+
+    def test_create_incremental_without_previous_backup(self):
+        result = self.runner(create, "-i")
+        self.assertEqual(0, result.exit_code)
+        self.assertIn("No previous backup found", result.output)
+        self.assertIn("2 rows from Post saved", result.output)
+
+    def test_create_restore_remove_chunked(self):
+        environ["ALCHEMYDUMPS_STORE"] = "chunks"
+        try:
+            with patch.object(CommonTools, "TIMESTAMP", "20200101000000"):
+                self.runner(create)
+            with patch.object(CommonTools, "TIMESTAMP", "20200102000000"):
+                self.runner(create)
+            backup = Backup()
+        finally:
+            del environ["ALCHEMYDUMPS_STORE"]
+
+        # identical backups share their chunks (but not their metrics)
+        chunks = tuple(backup.target.target.path.glob("chunk-*"))
+        self.assertEqual(7, len(chunks))
+        self.assertEqual(12, len(tuple(backup.target.get_files())))
+
+        # restore from chunks
+        self.db.drop_all()
+        self.db.create_all()
+        environ["ALCHEMYDUMPS_STORE"] = "chunks"
+        try:
+            result = self.runner(restore, "-d 20200102000000")
+            self.assertEqual(0, result.exit_code)
+            self.assertEqual(2, Post.query.count())
+
+            # chunks are deleted once no backup uses them
+            self.runner(remove, "-d 20200101000000 -y")
+            self.assertEqual(13, len(tuple(self.backup.target.path.glob("*"))))
+            result = self.runner(remove, "-d 20200102000000 -y")
+            self.assertIn("6 unused chunks deleted", result.output)
+            files = [path.name for path in self.backup.target.path.glob("*")]
+            self.assertEqual([self.backup.catalog.name], files)
+        finally:
+            del environ["ALCHEMYDUMPS_STORE"]
+
+    def test_remove_to_trash_and_purge(self):
+        environ["ALCHEMYDUMPS_STORE"] = "chunks"
+        try:
+            self.runner(create)
+            backup = Backup()
+            chunks = tuple(backup.target.target.path.glob("chunk-*"))
+
+            # trashed backups are not listed, but their chunks are kept
+            result = self.runner(remove, f"-d {backup.target.TIMESTAMP} -y --trash")
+            self.assertIn("moved to the trash", result.output)
+            self.assertEqual((), Backup().get_timestamps())
+            self.assertEqual(6, len(Backup().target.get_trash()))
+            self.assertEqual(chunks, tuple(backup.target.target.path.glob("chunk-*")))
+
+            result = self.runner(purge, "-y")
+            self.assertIn("6 files deleted", result.output)
+            self.assertIn("6 unused chunks deleted", result.output)
+            self.assertEqual([], Backup().target.get_trash())
+            self.assertEqual((), tuple(backup.target.target.path.glob("chunk-*")))
+            self.assertIn("The trash is empty", self.runner(purge, "-y").output)
+        finally:
+            del environ["ALCHEMYDUMPS_STORE"]
+
+    def test_background_job(self):
+        with app.app_context():
+            job = AlchemyDumps.start_backup()
+            job.join()
+            self.assertIs(job, AlchemyDumps.get_job(job.id))
+            del app.extensions["alchemydumps"].jobs[job.id]
+
+        status = job.get_status()
+        self.assertEqual("done", status["status"])
+        self.assertEqual(5, status["rows"])
+        self.assertEqual(1.0, status["fraction"])
+        self.assertEqual(0.0, status["eta"])
+        self.assertEqual(6, len(tuple(Backup().by_timestamp(job.id))))
+
+    def test_background_job_cancelled(self):
+        def cancel(progress):
+            if progress.get_table() == "User":
+                progress.cancel()
+
+        with app.app_context():
+            job = AlchemyDumps.start_backup(callback=cancel)
+            job.join()
+            del app.extensions["alchemydumps"].jobs[job.id]
+
+        self.assertEqual("cancelled", job.get_status()["status"])
+        self.assertEqual((), Backup().get_timestamps())
+        files = [path.name for path in self.backup.target.path.glob("*")]
+        self.assertEqual([self.backup.catalog.name], files)
+
     def test_autoclean(self):
 
         # create fake backup dir
@@ -163,3 +507,23 @@ class TestCommands(TestCase):
         )
         self.assertEqual(len(self.backup.files), len(classes) * len(white_list))
         self.assertEqual(sorted(white_list), sorted(self.backup.get_timestamps()))
+
+    def test_autoclean_with_policy(self):
+        date_ids = ("20140425202739", "20130808133229", "20120419224811")
+        for date_id in date_ids:
+            name = self.backup.get_name("Post", date_id)
+            self.backup.target.create_file(name, b"42" * 1024)
+
+        environ["ALCHEMYDUMPS_RETENTION"] = "yearly=2"
+        try:
+            result = self.runner(autoclean, "--dry-run")
+            self.assertIn("1 backups will be deleted", result.output)
+            self.assertIn("bytes will be reclaimed", result.output)
+            self.backup.files = tuple(self.backup.target.get_files())
+            self.assertEqual(3, len(self.backup.files))
+
+            self.runner(autoclean, "-y")
+            self.backup.files = tuple(self.backup.target.get_files())
+            self.assertEqual(sorted(date_ids[:2]), sorted(self.backup.get_timestamps()))
+        finally:
+            del environ["ALCHEMYDUMPS_RETENTION"]
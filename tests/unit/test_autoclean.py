@@ -1,7 +1,74 @@
-from datetime import date
+from datetime import date, datetime, timedelta
+from itertools import chain
+from random import Random
 from unittest import TestCase
+from unittest.mock import patch
 
-from flask_alchemydumps.autoclean import BackupAutoClean
+from flask_alchemydumps.autoclean import BackupAutoClean, RetentionPolicy
+
+
+class LegacyAutoClean(BackupAutoClean):
+    """Previous implementation, parsing dates over and over"""
+
+    def filter_dates(self, dates, period):
+        reference = datetime.strftime(self.today, "%Y%m%d%H%M%S")
+        method_mapping = {
+            "week": lambda obj: getattr(obj, "isocalendar")()[1],
+            "month": lambda obj: getattr(obj, "month"),
+            "year": lambda obj: getattr(obj, "year"),
+        }
+        for as_string in dates:
+            as_date = datetime.strptime(as_string, "%Y%m%d%H%M%S")
+            comparison = method_mapping.get(period)(as_date)
+            reference_as_date = datetime.strptime(reference, "%Y%m%d%H%M%S")
+            if comparison != method_mapping.get(period)(reference_as_date):
+                reference = as_string
+                yield as_string
+
+    def run(self):
+        last_w = self.today - timedelta(days=7)
+        last_m = self.today - timedelta(days=self.get_last_month_length())
+        last_y = self.today - timedelta(days=self.get_last_year_length())
+
+        backups_week = list()
+        backups_month = list()
+        backups_year = list()
+        backups_older = list()
+        for timestamp in self.dates:
+            datetime_ = datetime.strptime(timestamp, "%Y%m%d%H%M%S")
+            date_ = date(datetime_.year, datetime_.month, datetime_.day)
+            if date_ >= last_w:
+                backups_week.append(timestamp)
+            elif date_ >= last_m:
+                backups_month.append(timestamp)
+            elif date_ >= last_y:
+                backups_year.append(timestamp)
+            else:
+                backups_older.append(timestamp)
+
+        self.white_list = tuple(
+            chain(
+                backups_week,
+                self.filter_dates(backups_month, "week"),
+                self.filter_dates(backups_year, "month"),
+                self.filter_dates(backups_older, "year"),
+            )
+        )
+
+        diff_as_tuple = tuple(set(self.dates) - set(self.white_list))
+        self.black_list = tuple(sorted(diff_as_tuple, reverse=True))
+
+
+def random_date_ids(random, today):
+    """Random date ids around `today`, some of them repeated or in the future"""
+    start = datetime(today.year, today.month, today.day) + timedelta(days=3)
+    span = random.choice((14, 60, 400, 3000)) * 24 * 3600
+    date_ids = [
+        start - timedelta(seconds=random.randrange(span))
+        for _ in range(random.randrange(200))
+    ]
+    date_ids.extend(random.sample(date_ids, len(date_ids) // 10))
+    return [datetime.strftime(date_id, "%Y%m%d%H%M%S") for date_id in date_ids]
 
 
 class TestAutocleanHelper(TestCase):
@@ -78,3 +145,73 @@ class TestAutocleanHelper(TestCase):
         self.assertEqual(len(backup_list.black_list), 9)
         self.assertEqual(backup_list.white_list, white_list)
         self.assertEqual(backup_list.black_list, black_list)
+
+    def test_run_matches_legacy_implementation(self):
+        random = Random(42)
+        for case in range(300):
+            today = date(2000, 1, 1) + timedelta(days=random.randrange(10000))
+            date_ids = random_date_ids(random, today)
+            with self.subTest(case=case, today=today):
+                expected = LegacyAutoClean(date_ids, today)
+                backup_list = BackupAutoClean(date_ids, today)
+                self.assertEqual(expected.white_list, backup_list.white_list)
+                self.assertEqual(expected.black_list, backup_list.black_list)
+
+
+class TestRetentionPolicy(TestCase):
+    DATES = (
+        "20140425202739",
+        "20140425103000",
+        "20140424202739",
+        "20140420120000",
+        "20140402120000",
+        "20140315120000",
+        "20130808133229",
+        "20120419224811",
+    )
+
+    @patch("flask_alchemydumps.autoclean.decouple.config")
+    def test_from_config(self, mock_config):
+        mock_config.side_effect = ("hourly=24, daily=14,yearly=5", "1.5G")
+        policy = RetentionPolicy.from_config()
+        self.assertEqual(24, policy.counts["hourly"])
+        self.assertEqual(14, policy.counts["daily"])
+        self.assertIsNone(policy.counts["weekly"])
+        self.assertEqual(5, policy.counts["yearly"])
+        self.assertEqual(3 * 2 ** 29, policy.max_size)
+
+        mock_config.side_effect = ("", "")
+        self.assertIsNone(RetentionPolicy.from_config())
+
+        mock_config.side_effect = ("fortnightly=2", "")
+        with self.assertRaises(ValueError):
+            RetentionPolicy.from_config()
+
+    def test_parse_size(self):
+        self.assertEqual(42, RetentionPolicy.parse_size("42"))
+        self.assertEqual(512 * 2 ** 20, RetentionPolicy.parse_size("512MB"))
+        self.assertEqual(2 ** 40, RetentionPolicy.parse_size("1t"))
+
+    def test_run_policy(self):
+        policy = RetentionPolicy(daily=2, monthly=3)
+        backup_list = BackupAutoClean(self.DATES, policy=policy)
+        white_list = (
+            "20140425202739",  # day and month
+            "20140424202739",  # day
+            "20140315120000",  # month
+            "20130808133229",  # month
+        )
+        self.assertEqual(white_list, backup_list.white_list)
+        self.assertEqual(4, len(backup_list.black_list))
+        self.assertEqual(self.DATES[1], backup_list.black_list[0])
+
+    def test_run_policy_with_max_size(self):
+        sizes = dict.fromkeys(self.DATES, 10)
+        policy = RetentionPolicy(yearly=3, max_size=25)
+        backup_list = BackupAutoClean(self.DATES, policy=policy, sizes=sizes)
+        self.assertEqual(("20140425202739", "20130808133229"), backup_list.white_list)
+
+        # the most recent backup is always kept
+        policy = RetentionPolicy(max_size=5)
+        backup_list = BackupAutoClean(self.DATES, policy=policy, sizes=sizes)
+        self.assertEqual(("20140425202739",), backup_list.white_list)
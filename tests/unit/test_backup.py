@@ -21,8 +21,18 @@ class TestBackup(TestCase):
         self.tmp = TemporaryDirectory()
 
         # Respectively: FTP server, FTP user, FTP password, FTP path, local
-        # directory for backups and file prefix
-        mock_config.side_effect = (None, None, None, None, self.tmp.name, "BRA")
+        # directory for backups, file prefix, codec, FTP connections and store
+        mock_config.side_effect = (
+            None,
+            None,
+            None,
+            None,
+            self.tmp.name,
+            "BRA",
+            "gzip",
+            4,
+            "files",
+        )
 
         # main objects
         self.backup = Backup()
@@ -50,6 +60,34 @@ class TestBackup(TestCase):
             tuple(self.backup.by_timestamp("19940717123000")),
         )
 
+    def test_find(self):
+        self.assertEqual(
+            "BRA-19940717123000-ITA.gz", self.backup.find("ITA", "19940717123000")
+        )
+        self.assertIsNone(self.backup.find("ITA", "19940704123000"))
+
+    def test_find_parts(self):
+        self.backup.files += tuple(
+            Path(self.tmp.name) / f"BRA-19940717123000-BRA.part{part}.gz"
+            for part in ("002", "010", "001")
+        )
+        expected = [
+            "BRA-19940717123000-BRA.part001.gz",
+            "BRA-19940717123000-BRA.part002.gz",
+            "BRA-19940717123000-BRA.part010.gz",
+        ]
+        self.assertIsNone(self.backup.find("BRA", "19940717123000"))
+        self.assertEqual(expected, self.backup.find_parts("BRA", "19940717123000"))
+        self.assertEqual(expected, self.backup.find_all("BRA", "19940717123000"))
+        self.assertEqual(
+            ["BRA-19940717123000-ITA.gz"],
+            self.backup.find_all("ITA", "19940717123000"),
+        )
+        self.assertEqual(
+            "BRA-19940717123000-BRA.part*.gz",
+            self.backup.get_part_name("BRA", "*", "19940717123000"),
+        )
+
     def test_valid(self):
         self.assertTrue(self.backup.valid("19940704123000"))
         self.assertFalse(self.backup.valid("19980712210000"))
@@ -59,14 +97,49 @@ class TestBackup(TestCase):
             f"BRA-{self.backup.target.TIMESTAMP}-GER.gz", self.backup.get_name("GER")
         )
 
+    def test_catalog(self):
+        for name in self.FILES:
+            self.backup.target.create_file(name, b"")
+
+        # catalog is created from the files in the backup directory
+        self.backup.files = None
+        self.assertEqual(4, len(self.backup.get_timestamps()))
+        self.assertTrue((Path(self.tmp.name) / "BRA-catalog.gz").exists())
+
+        # and kept up to date
+        self.backup.create_file("BRA-19940717123000-BRA.gz", b"42", rows=1)
+        self.backup.delete_file("BRA-19940704123000-USA.gz")
+        self.backup.save_catalog()
+
+        self.backup.catalog.load()
+        self.assertEqual(3, len(self.backup.get_timestamps()))
+        details = self.backup.catalog.backups["19940717123000"]
+        self.assertEqual(dict(), details["BRA-19940717123000-ITA.gz"])
+        self.assertEqual(1, details["BRA-19940717123000-BRA.gz"]["rows"])
+        self.assertEqual(2, details["BRA-19940717123000-BRA.gz"]["bytes"])
+        self.assertEqual(
+            ["BRA-19940717123000-BRA.gz", "BRA-19940717123000-ITA.gz"],
+            sorted(self.backup.by_timestamp("19940717123000")),
+        )
+
 
 class TestBackupFTPAttemps(TestCase):
     def setUp(self):
         self.tmp = TemporaryDirectory()
 
         # Respectively: FTP server, FTP user, FTP password, FTP path, local
-        # directory for backups and file prefix
-        self.config = ("server", "user", None, "foobar", self.tmp.name, "bkp")
+        # directory for backups, file prefix, codec, FTP connections and store
+        self.config = (
+            "server",
+            "user",
+            None,
+            "foobar",
+            self.tmp.name,
+            "bkp",
+            "gzip",
+            4,
+            "files",
+        )
 
     def tearDown(self):
         self.tmp.cleanup()
@@ -80,7 +153,7 @@ class TestBackupFTPAttemps(TestCase):
 
         backup = Backup()
 
-        self.assertEqual(6, mock_config.call_count)
+        self.assertEqual(9, mock_config.call_count)
         mock_ftp.assert_called_once_with("server", "user", None)
         mock_ftp.return_value.cwd.assert_called_once_with("foobar")
         self.assertTrue(backup.ftp)
@@ -93,7 +166,7 @@ class TestBackupFTPAttemps(TestCase):
 
         backup = Backup()
 
-        self.assertEqual(6, mock_config.call_count)
+        self.assertEqual(9, mock_config.call_count)
         mock_ftp.assert_called_once_with("server", "user", None)
         self.assertFalse(mock_ftp.return_value.cwd.called)
         self.assertFalse(backup.ftp)
@@ -107,7 +180,7 @@ class TestBackupFTPAttemps(TestCase):
 
         backup = Backup()
 
-        self.assertEqual(6, mock_config.call_count)
+        self.assertEqual(9, mock_config.call_count)
         mock_ftp.assert_called_once_with("server", "user", None)
         mock_ftp.return_value.cwd.assert_called_once_with("foobar")
         self.assertFalse(backup.ftp)
@@ -122,6 +195,6 @@ class TestBackupFTPAttemps(TestCase):
         backup = Backup()
         backup.close_ftp()
 
-        self.assertEqual(6, mock_config.call_count)
+        self.assertEqual(9, mock_config.call_count)
         mock_ftp.assert_called_once_with("server", "user", None)
         mock_ftp.return_value.quit.called_once_with()
@@ -0,0 +1,75 @@
+from random import Random
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from flask_alchemydumps.backup import ChunkedTools, LocalTools, RemoteTools
+
+from ..ftp import FakeFTP
+
+
+class TestChunkedTools(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.backup = ChunkedTools(LocalTools(self.tmp.name))
+        self.data = Random(42).getrandbits(2 ** 23).to_bytes(2 ** 20, "big")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def chunk_files(self):
+        return sorted(self.backup.target.path.glob(f"{ChunkedTools.PREFIX}*"))
+
+    def test_split_is_content_defined(self):
+        chunks = tuple(self.backup.split(self.data))
+        self.assertEqual(self.data, b"".join(chunks))
+        self.assertTrue(all(len(c) <= ChunkedTools.MAX_SIZE for c in chunks))
+
+        # inserting data only changes the chunks around it
+        shifted = tuple(self.backup.split((b"42", self.data)))
+        self.assertLessEqual(len(set(shifted) - set(chunks)), 1)
+
+    def test_create_and_read_file(self):
+        name = "BRA-19940704123000-USA.gz"
+        self.backup.create_file(name, (self.data[:1000], self.data[1000:]))
+        self.assertEqual(self.data, self.backup.read_file(name))
+
+        # identical contents are not stored again
+        chunks = self.chunk_files()
+        self.backup.create_file("BRA-19940709163000-USA.gz", self.data)
+        self.assertEqual(chunks, self.chunk_files())
+        self.assertEqual(2, len(tuple(self.backup.get_files())))
+
+    def test_read_file_without_chunks(self):
+        name = "BRA-19940704123000-USA.gz"
+        self.backup.target.create_file(name, b"42")
+        self.assertEqual(b"42", self.backup.read_file(name))
+
+    def test_collect(self):
+        self.backup.create_file("BRA-19940704123000-USA.gz", self.data)
+        half = self.data[: 2 ** 19]
+        self.backup.create_file("BRA-19940709163000-NED.gz", half)
+        chunks = self.chunk_files()
+
+        # chunks still used by another backup are kept
+        self.backup.delete_file("BRA-19940704123000-USA.gz")
+        deleted = self.backup.collect()
+        self.assertEqual(len(chunks) - len(self.chunk_files()), len(deleted))
+        self.assertTrue(self.chunk_files())
+        self.assertEqual(half, self.backup.read_file("BRA-19940709163000-NED.gz"))
+
+        self.backup.delete_file("BRA-19940709163000-NED.gz")
+        self.backup.collect()
+        self.assertEqual([], self.chunk_files())
+
+    def test_remote(self):
+        ftp = FakeFTP()
+        backup = ChunkedTools(RemoteTools(ftp))
+        backup.create_file("BRA-19940704123000-USA.gz", self.data)
+        self.assertEqual(self.data, backup.read_file("BRA-19940704123000-USA.gz"))
+        self.assertEqual(("BRA-19940704123000-USA.gz",), tuple(backup.get_files()))
+        self.assertGreater(len(ftp.files), 1)
+
+    def test_split_streams_between_pieces(self):
+        pieces = [self.data[:5000]] * 10
+        chunks = tuple(self.backup.split(pieces))
+        self.assertEqual([10000, 10000, 10000, 10000, 10000], [len(c) for c in chunks])
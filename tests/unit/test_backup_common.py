@@ -10,6 +10,31 @@ class TestBackup(TestCase):
     def test_get_timestamp(self):
         name = "BRA-19940717123000-ITA.gz"
         self.assertEqual("19940717123000", self.backup.get_timestamp(name))
+        name = "BRA-19940717123000-ITA.zst"
+        self.assertEqual("19940717123000", self.backup.get_timestamp(name))
+        self.assertFalse(self.backup.get_timestamp("BRA-1994071712-ITA.gz"))
+
+    def test_get_class_name(self):
+        name = "BRA-19940717123000-ITA.lz4"
+        self.assertEqual("ITA", self.backup.get_class_name(name))
+
+    def test_get_part(self):
+        name = "BRA-19940717123000-ITA.part012.gz"
+        self.assertEqual("19940717123000", self.backup.get_timestamp(name))
+        self.assertEqual(("ITA", 12), self.backup.get_part(name))
+        name = "BRA-19940717123000-ITA.index.gz"
+        self.assertEqual(("ITA.index", None), self.backup.get_part(name))
+        self.assertEqual((False, None), self.backup.get_part("BRA-catalog.gz"))
+
+    def test_parse_name(self):
+        name = "BRA-20140713160000-19940717123000-ITA.Post.gz"
+        expected = ("19940717123000", "ITA.Post")
+        self.assertEqual(expected, self.backup.parse_name(name))
+        self.assertEqual((False, False), self.backup.parse_name("BRA-catalog.gz"))
+
+        hits = self.backup.parse_name.cache_info().hits
+        self.backup.get_class_name(name)
+        self.assertEqual(hits + 1, self.backup.parse_name.cache_info().hits)
 
     def test_parse_timestamp(self):
         timestamp = "19940717123000"
@@ -1,4 +1,7 @@
+import gzip
+from os import urandom
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 from unittest.mock import patch
 
@@ -31,13 +34,13 @@ class TestLocalTools(TestCase):
 
     @patch.object(Path, "mkdir")
     @patch.object(Path, "exists")
-    @patch("flask_alchemydumps.backup.gzip.open")
+    @patch("flask_alchemydumps.compression.gzip.open")
     def test_create_file(self, mock_open, mock_exists, _mock_mkdir):
         mock_exists.return_value = False
         path = self.backup_path / "foobar.gz"
         backup = LocalTools(self.backup_dir)
         created = backup.create_file("foobar.gz", b"42")
-        mock_open.assert_called_once_with(path, "wb")
+        mock_open.assert_called_once_with(path, "wb", compresslevel=9)
         mock_open.return_value.__enter__.return_value.write.assert_called_once_with(
             b"42"
         )
@@ -45,7 +48,18 @@ class TestLocalTools(TestCase):
 
     @patch.object(Path, "mkdir")
     @patch.object(Path, "exists")
-    @patch("flask_alchemydumps.backup.gzip.open")
+    @patch("flask_alchemydumps.compression.gzip.open")
+    def test_create_file_from_chunks(self, mock_open, mock_exists, _mock_mkdir):
+        mock_exists.return_value = False
+        backup = LocalTools(self.backup_dir)
+        backup.create_file("foobar.gz", (chunk for chunk in (b"4", b"2")))
+        handler = mock_open.return_value.__enter__.return_value
+        self.assertEqual(2, handler.write.call_count)
+        handler.write.assert_called_with(b"2")
+
+    @patch.object(Path, "mkdir")
+    @patch.object(Path, "exists")
+    @patch("flask_alchemydumps.compression.gzip.open")
     def test_read_file(self, mock_open, mock_exists, _mock_mkdir):
         mock_exists.return_value = False
         path = self.backup_path / "foobar.gz"
@@ -62,3 +76,56 @@ class TestLocalTools(TestCase):
         backup = LocalTools(self.backup_dir)
         backup.delete_file("foobar.gz")
         mock_unlink.assert_called_once_with()
+
+    def test_delete_files(self):
+        with TemporaryDirectory() as tmp:
+            backup = LocalTools(tmp)
+            for name in (
+                "BRA-19940717123000-foo.gz",
+                "BRA-19940717123000-bar.gz",
+                "BRA-19940717123000-baz.gz",
+            ):
+                backup.create_file(name, b"42")
+
+            failures = backup.delete_files(
+                ("BRA-19940717123000-foo.gz", "BRA-19940717123000-qux.gz")
+            )
+            self.assertEqual(
+                ["BRA-19940717123000-qux.gz"], [name for name, _ in failures]
+            )
+            self.assertIsInstance(failures[0][1], FileNotFoundError)
+
+            self.assertEqual([], backup.get_trash())
+            self.assertEqual(
+                [], backup.delete_files(("BRA-19940717123000-bar.gz",), trash=True)
+            )
+            self.assertEqual(["trash/BRA-19940717123000-bar.gz"], backup.get_trash())
+            self.assertEqual(
+                ["BRA-19940717123000-baz.gz"], [p.name for p in backup.get_files()]
+            )
+
+    def test_create_parts(self):
+        chunks = tuple(urandom(2 ** 16) for _ in range(5))
+        with TemporaryDirectory() as tmp:
+            backup = LocalTools(tmp)
+            parts = backup.create_parts(
+                lambda number: f"BRA-19940717123000-foo.part{number:03d}.gz",
+                (b"42",) + chunks,
+                2 ** 17,
+            )
+
+            # each part starts with the first chunk and has whole chunks
+            contents = [backup.read_file(part["name"]) for part in parts]
+            self.assertGreater(len(parts), 1)
+            self.assertTrue(all(c.startswith(b"42") for c in contents))
+            self.assertEqual(b"".join(chunks), b"".join(c[2:] for c in contents))
+            for part, content in zip(parts[:-1], contents):
+                self.assertEqual(len(content), part["bytes"])
+                size = (backup.path / part["name"]).stat().st_size
+                self.assertGreaterEqual(size, 2 ** 17)
+
+            # a single part when contents fit
+            parts = backup.create_parts(lambda number: "bar.gz", b"42", 2 ** 17)
+            self.assertEqual(["bar.gz"], [part["name"] for part in parts])
+            contents = (backup.path / "bar.gz").read_bytes()
+            self.assertEqual(b"42", gzip.decompress(contents))
@@ -1,7 +1,15 @@
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from os import urandom
+from pathlib import Path
+from time import perf_counter
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
-from flask_alchemydumps.backup import RemoteTools
+from flask_alchemydumps.backup import FTPPool, RemoteTools
+from flask_alchemydumps.progress import Cancelled
+
+from ..ftp import FakeFTP, FakeUpload
 
 
 class TestRemoteTools(TestCase):
@@ -34,34 +42,170 @@ class TestRemoteTools(TestCase):
         self.assertTrue(backup.ftp.nlst.called)
         self.assertEqual(expected, files)
 
-    @patch("flask_alchemydumps.backup.gzip.open")
-    def test_create_file(self, mock_open):
-        self.mock_ftp.host = "f.oo"
-        self.mock_ftp.pwd.return_value = "/bar"
-        mock_handler = mock_open.return_value.__enter__.return_value
-        contents = "42".encode()
-
-        backup = RemoteTools(self.mock_ftp)
-        created = backup.create_file("foobar.gz", contents)
-        storbinary_args = backup.ftp.storbinary.call_args[0][0]
+    def test_create_file(self):
+        ftp = FakeFTP(host="f.oo", path="/bar")
+        backup = RemoteTools(ftp)
+        created = backup.create_file("foobar.gz", (b"4", b"2"))
 
-        self.assertTrue(mock_open.called)
-        mock_handler.write.assert_called_once_with(contents)
-        self.assertTrue(storbinary_args.startswith("STOR foobar.gz"))
+        self.assertEqual(["TYPE I", "STOR foobar.gz"], ftp.commands[-2:])
+        self.assertEqual(b"42", gzip.decompress(ftp.files["foobar.gz"]))
         self.assertEqual(backup.path + "foobar.gz", created)
 
-    @patch("flask_alchemydumps.backup.gzip.open")
-    def test_read_file(self, mock_open):
-        mock_handler = mock_open.return_value.__enter__.return_value
+    def test_read_file(self):
+        ftp = FakeFTP({"foobar.gz": gzip.compress(b"42")})
+        backup = RemoteTools(ftp)
+        self.assertEqual(b"42", backup.read_file("foobar.gz"))
+        self.assertIn("RETR foobar.gz", ftp.commands)
 
-        backup = RemoteTools(self.mock_ftp)
-        backup.read_file("foobar.gz")
+    def test_transfers_in_binary_mode(self):
+        ftp = FakeFTP()
+        backup = RemoteTools(ftp)
+        backup.create_file("foobar.gz", (b"\r\n",))
+        self.assertEqual(b"\r\n", backup.read_file("foobar.gz"))
+
+        expected = [("STOR foobar.gz", "I"), ("RETR foobar.gz", "I")]
+        self.assertEqual(expected, ftp.transfers)
 
-        self.assertTrue(backup.ftp.retrbinary.called)
-        self.assertTrue(mock_open.called)
-        self.assertTrue(mock_handler.read.called)
+    @patch("flask_alchemydumps.compression.gzip.open")
+    def test_no_local_files(self, mock_open):
+        mock_open.return_value.__enter__.return_value.read.return_value = b"42"
+        backup = RemoteTools(FakeFTP({"foobar.gz": b""}))
+        backup.create_file("foobar.gz", b"42")
+        backup.read_file("foobar.gz")
+        for (target, _), _ in mock_open.call_args_list:
+            self.assertNotIsInstance(target, (str, Path))
 
     def test_delete_file(self):
         backup = RemoteTools(self.mock_ftp)
         backup.delete_file("foobar.gz")
         backup.ftp.delete.assert_called_once_with("foobar.gz")
+
+
+class DroppedFTP(FakeFTP):
+    """Connection dropped by the server before a transfer starts"""
+
+    def transfercmd(self, command):
+        raise EOFError
+
+
+class BrokenUpload(FakeUpload):
+    def close(self):
+        raise BrokenPipeError
+
+
+class BrokenFTP(FakeFTP):
+    """Connection dropped by the server in the middle of an upload"""
+
+    def transfercmd(self, command):
+        connection = super().transfercmd(command)
+        connection.makefile = lambda *args, **kwargs: BrokenUpload(self, "broken")
+        return connection
+
+
+class TestFTPPool(TestCase):
+    def setUp(self):
+        self.files = dict()
+        self.latency = 0.05
+
+    def connect(self):
+        return FakeFTP(self.files, self.latency)
+
+    def test_concurrent_transfers(self):
+        names = tuple(f"BRA-19940717123000-{n}.gz" for n in range(8))
+        pool = FTPPool(self.connect, 4)
+        backup = RemoteTools(FakeFTP(self.files), pool=pool)
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            tuple(executor.map(lambda name: backup.create_file(name, b"42"), names))
+            contents = tuple(executor.map(backup.read_file, names))
+        elapsed = perf_counter() - start
+
+        self.assertEqual(set(names), set(self.files))
+        self.assertEqual((b"42",) * 8, contents)
+        self.assertEqual(4, pool.open)
+        self.assertLess(elapsed, len(names) * 2 * self.latency)
+
+    def test_reconnect_when_dropped(self):
+        pool = FTPPool(self.connect, 1, (DroppedFTP(self.files),))
+        backup = RemoteTools(FakeFTP(self.files), pool=pool)
+        backup.create_file("foobar.gz", (chunk for chunk in (b"4", b"2")))
+        self.assertEqual(b"42", gzip.decompress(self.files["foobar.gz"]))
+        self.assertEqual(1, pool.open)
+
+    def test_retry_upload(self):
+        pool = FTPPool(self.connect, 1, (BrokenFTP(self.files),))
+        backup = RemoteTools(FakeFTP(self.files), pool=pool)
+        backup.create_file("foobar.gz", b"42")
+        self.assertEqual(b"42", gzip.decompress(self.files["foobar.gz"]))
+
+    def test_no_retry_after_stream_is_consumed(self):
+        pool = FTPPool(self.connect, 1, (BrokenFTP(self.files),))
+        backup = RemoteTools(FakeFTP(self.files), pool=pool)
+        with self.assertRaises(BrokenPipeError):
+            backup.create_file("foobar.gz", (chunk for chunk in (b"4", b"2")))
+
+    def test_create_parts_concurrently(self):
+        chunks = tuple(urandom(2 ** 16) for _ in range(8))
+        pool = FTPPool(self.connect, 4)
+        backup = RemoteTools(FakeFTP(self.files), pool=pool)
+
+        start = perf_counter()
+        parts = backup.create_parts(
+            lambda number: f"BRA-19940717123000-foo.part{number:03d}.gz",
+            (b"42",) + chunks,
+            2 ** 16,
+        )
+        elapsed = perf_counter() - start
+
+        names = [part["name"] for part in parts]
+        self.assertEqual(4, len(names))  # gzip output lags behind a chunk
+        self.assertEqual(set(names), set(self.files))
+        contents = b"".join(gzip.decompress(self.files[name])[2:] for name in names)
+        self.assertEqual(b"".join(chunks), contents)
+        self.assertLess(elapsed, len(names) * 2 * self.latency)
+
+    def test_reply_read_after_interrupted_transfer(self):
+        ftp = FakeFTP(self.files)
+        backup = RemoteTools(ftp)
+
+        def contents():
+            yield b"4"
+            raise Cancelled
+
+        with self.assertRaises(Cancelled):
+            backup.create_file("foo.gz", contents())
+        self.assertEqual(0, len(ftp.replies))
+
+        # the connection is back in the pool, in sync with the server
+        backup.create_file("bar.gz", b"42")
+        self.assertEqual(b"42", backup.read_file("bar.gz"))
+
+    def test_give_up_without_connect(self):
+        backup = RemoteTools(DroppedFTP(self.files))
+        with self.assertRaises(EOFError):
+            backup.read_file("foobar.gz")
+
+    def test_concurrent_deletes(self):
+        names = tuple(f"BRA-19940717123000-{n}.gz" for n in range(8))
+        self.files.update((name, b"") for name in names)
+        backup = RemoteTools(FakeFTP(self.files), pool=FTPPool(self.connect, 4))
+
+        start = perf_counter()
+        failures = backup.delete_files(names + ("BRA-19940717123000-9.gz",))
+        elapsed = perf_counter() - start
+
+        self.assertEqual(dict(), self.files)
+        self.assertEqual(["BRA-19940717123000-9.gz"], [name for name, _ in failures])
+        self.assertLess(elapsed, len(names) * self.latency)
+
+    def test_trash(self):
+        self.files.update({"foo.gz": b"4", "bar.gz": b"2"})
+        ftp = FakeFTP(self.files)
+        backup = RemoteTools(ftp, pool=FTPPool(lambda: ftp, 1))
+        self.assertEqual([], backup.get_trash())
+
+        self.assertEqual([], backup.delete_files(("foo.gz", "bar.gz"), trash=True))
+        self.assertEqual(["trash/bar.gz", "trash/foo.gz"], sorted(backup.get_trash()))
+        self.assertEqual(["trash"], ftp.nlst())
+        self.assertEqual(1, ftp.commands.count("MKD trash"))
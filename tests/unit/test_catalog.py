@@ -0,0 +1,50 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from flask_alchemydumps.backup import LocalTools, RemoteTools
+from flask_alchemydumps.catalog import Catalog
+
+from ..ftp import FakeFTP
+
+
+class TestCatalog(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.target = LocalTools(self.tmp.name)
+        self.catalog = Catalog(self.target, "BRA-catalog.gz")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_load_without_catalog(self):
+        self.assertFalse(self.catalog.load())
+        self.assertIsNone(self.catalog.backups)
+
+    def test_add_remove_and_save(self):
+        self.catalog.rebuild((("19940704123000", "BRA-19940704123000-USA.gz"),))
+        self.catalog.add("19940709163000", "BRA-19940709163000-NED.gz", rows=42)
+        self.catalog.add("19940709163000", "BRA-19940709163000-NED.gz", bytes=2)
+        self.catalog.remove("19940704123000", "BRA-19940704123000-USA.gz")
+        self.catalog.save()
+
+        catalog = Catalog(self.target, "BRA-catalog.gz")
+        self.assertTrue(catalog.load())
+        expected = {
+            "19940709163000": {"BRA-19940709163000-NED.gz": {"rows": 42, "bytes": 2}}
+        }
+        self.assertEqual(expected, catalog.backups)
+        self.assertEqual(["BRA-catalog.gz"], list(self.target.get_names()))
+
+    def test_remote(self):
+        ftp = FakeFTP({"BRA-catalog.gz": b""})
+        catalog = Catalog(RemoteTools(ftp), "BRA-catalog.gz")
+        catalog.rebuild((("19940704123000", "BRA-19940704123000-USA.gz"),))
+        catalog.save()
+
+        self.assertIn("RNTO BRA-catalog.gz", ftp.commands)
+        self.assertEqual(["BRA-catalog.gz"], list(ftp.files))
+        self.assertTrue(catalog.load())
+        self.assertEqual(
+            {"19940704123000": {"BRA-19940704123000-USA.gz": dict()}}, catalog.backups
+        )
+        self.assertFalse(Catalog(RemoteTools(ftp), "BRA-missing.gz").load())
@@ -0,0 +1,69 @@
+import gzip
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+
+from flask_alchemydumps.compression import (
+    CODECS,
+    GzipCodec,
+    ParallelGzipCodec,
+    get_codec,
+    get_codec_by_extension,
+)
+
+
+class TestCodecs(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.contents = b"Lorem ipsum dolor sit amet " * 4096
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def round_trip(self, codec):
+        path = Path(self.tmp.name) / f"foobar.{codec.EXTENSION}"
+        with codec.open(path, "wb") as handler:
+            handler.write(self.contents[:42])
+            handler.write(self.contents[42:])
+        with get_codec_by_extension(path.name).open(path, "rb") as handler:
+            self.assertEqual(self.contents, handler.read())
+        return path
+
+    def test_gzip(self):
+        self.round_trip(GzipCodec(1))
+
+    def test_parallel_gzip(self):
+        codec = ParallelGzipCodec()
+        codec.BLOCK_SIZE = 1024  # many gzip members
+        path = self.round_trip(codec)
+        with gzip.open(path, "rb") as handler:  # still a valid gzip file
+            self.assertEqual(self.contents, handler.read())
+
+    def test_parallel_gzip_empty(self):
+        path = Path(self.tmp.name) / "empty.gz"
+        with ParallelGzipCodec().open(path, "wb"):
+            pass
+        with gzip.open(path, "rb") as handler:
+            self.assertEqual(b"", handler.read())
+
+    @skipUnless("zstd" in CODECS, "zstandard is not installed")
+    def test_zstd(self):
+        self.round_trip(get_codec("zstd"))
+
+    @skipUnless("lz4" in CODECS, "lz4 is not installed")
+    def test_lz4(self):
+        self.round_trip(get_codec("lz4"))
+
+
+class TestGetCodec(TestCase):
+    def test_get_codec(self):
+        self.assertEqual(9, get_codec().level)
+        self.assertEqual(6, get_codec("gzip:6").level)
+        self.assertIsInstance(get_codec("pgzip"), ParallelGzipCodec)
+        with self.assertRaises(ValueError):
+            get_codec("foobar")
+
+    def test_get_codec_by_extension(self):
+        self.assertIsInstance(get_codec_by_extension("foo-bar.gz"), GzipCodec)
+        with self.assertRaises(ValueError):
+            get_codec_by_extension("foo-bar.rar")
@@ -1,8 +1,17 @@
+from tempfile import TemporaryDirectory
 from unittest import TestCase
+from unittest.mock import MagicMock, patch
 
-from flask_alchemydumps.database import AlchemyDumpsDatabase
+from sqlalchemy import Column, ForeignKey, Integer, create_engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.serializer import dumps
+from sqlalchemy.orm import Session, declarative_base
 
-from ..integration.app import Post, SomeControl, User, app, db
+from flask_alchemydumps.database import AlchemyDumpsDatabase, PlainTable, TableRow
+from flask_alchemydumps.filters import RowFilter
+from flask_alchemydumps.serializer import ColumnarSerializer
+
+from ..integration.app import Comments, Post, SomeControl, User, app, db, likes
 
 
 class TestSQLAlchemyHelper(TestCase):
@@ -23,7 +32,49 @@ class TestSQLAlchemyHelper(TestCase):
             self.assertIn(User, classes)
             self.assertIn(Post, classes)
             self.assertIn(SomeControl, classes)
-            self.assertEqual(len(classes), 4)
+            self.assertEqual(len(classes), 5)
+
+            # association tables are dumped as plain tables
+            (plain,) = (c for c in classes if isinstance(c, PlainTable))
+            self.assertIs(likes, plain.__table__)
+            self.assertEqual("likes", plain.__name__)
+
+    def test_class_hierarchies_are_not_standalone(self):
+        Model = declarative_base()
+
+        class Player(Model):
+            __tablename__ = "player"
+            id = Column(Integer, primary_key=True)
+
+        class Goalkeeper(Player):
+            __tablename__ = "goalkeeper"
+            id = Column(Integer, ForeignKey("player.id"), primary_key=True)
+
+        class Coach(Model):
+            __tablename__ = "coach"
+            id = Column(Integer, primary_key=True)
+
+        self.assertTrue(AlchemyDumpsDatabase.is_standalone(Coach))
+        self.assertFalse(AlchemyDumpsDatabase.is_standalone(Player))
+        self.assertFalse(AlchemyDumpsDatabase.is_standalone(Goalkeeper))
+
+    def test_get_and_restore_plain_table(self):
+        with app.app_context():
+            self.db.session.add(User(email="me@example.etc"))
+            self.db.session.add(Post(title="Post 1", author_id=1))
+            self.db.session.execute(likes.insert(), {"user_id": 1, "post_id": 1})
+            self.db.session.commit()
+
+            alchemy = AlchemyDumpsDatabase()
+            model = alchemy.get_model("likes")
+            rows = alchemy.parse_data(b"".join(alchemy.get_chunks(model)))
+            self.assertEqual([TableRow(likes, {"user_id": 1, "post_id": 1})], rows)
+
+            # merging replaces identical rows, bulk inserts them
+            self.assertEqual([], alchemy.restore_rows(rows))
+            self.assertEqual(1, self.db.session.query(likes).count())
+            self.assertEqual([], AlchemyDumpsDatabase(mode="bulk").restore_rows(rows))
+            self.assertEqual(2, self.db.session.query(likes).count())
 
     def test_get_and_parse_data(self):
         with app.app_context():
@@ -70,3 +121,257 @@ class TestSQLAlchemyHelper(TestCase):
             self.assertTrue(parsed_posts[1].created_on)
             self.assertTrue(parsed_posts[1].updated_on)
             self.assertEqual(control.uuid, parsed_control[0].uuid)
+
+    def test_get_chunks(self):
+        with app.app_context():
+            self.db.session.add(User(email=u"me@example.etc"))
+            self.db.session.add(Post(title=u"Post 1", author_id=1))
+            self.db.session.add(Post(title=u"Post 2", author_id=1))
+            self.db.session.add(Post(title=u"Post 3", author_id=1))
+            self.db.session.commit()
+
+            alchemy = AlchemyDumpsDatabase(chunk_size=2)
+            chunks = tuple(alchemy.get_chunks(Post))
+            self.assertEqual(chunks[0], alchemy.serializer.MAGIC)
+            self.assertEqual(len(chunks), 3)  # magic + 2 chunks
+            self.assertEqual(alchemy.rows["Post"], 3)
+
+            parsed = alchemy.parse_data(b"".join(chunks))
+            self.assertEqual([p.title for p in parsed], ["Post 1", "Post 2", "Post 3"])
+
+    def test_get_ranges(self):
+        with app.app_context():
+            self.db.session.add(User(email="me@example.etc"))
+            for title in ("Post 1", "Post 2", "Post 3", "Post 4", "Post 5"):
+                self.db.session.add(Post(title=title, author_id=1))
+            self.db.session.commit()
+
+            alchemy = AlchemyDumpsDatabase(part_size=2)
+            self.assertEqual([(1, 2), (3, 4), (5, 5)], alchemy.get_ranges(Post))
+            self.assertEqual([], alchemy.get_ranges(User))  # too few rows
+            self.assertEqual([], AlchemyDumpsDatabase(part_size=0).get_ranges(Post))
+
+            model = alchemy.get_model("likes")
+            self.assertEqual([], alchemy.get_ranges(model))  # no primary key
+
+            parts = tuple(alchemy.map_ranges(Post, alchemy.get_ranges(Post), 2))
+            self.assertEqual([2, 2, 1], [rows for _, rows, _ in parts])
+            posts = alchemy.parse_data(parts[1][0])
+            self.assertEqual(["Post 3", "Post 4"], [post.title for post in posts])
+
+    def test_map_ranges_in_processes(self):
+        with TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{tmp}/test.db")
+            Post.__table__.create(engine)
+            with engine.begin() as connection:
+                rows = [{"title": f"Post {n}"} for n in range(1, 6)]
+                connection.execute(Post.__table__.insert(), rows)
+
+            alchemy = AlchemyDumpsDatabase()
+            with patch.object(AlchemyDumpsDatabase, "db") as mock_db:
+                mock_db.return_value.engine = engine
+                parts = tuple(alchemy.map_ranges(Post, ((1, 2), (3, 5)), jobs=2))
+            engine.dispose()
+
+        serializer = ColumnarSerializer()
+        start = len(serializer.MAGIC) + serializer.LENGTH.size
+        self.assertEqual([2, 3], [rows for _, rows, _ in parts])
+        for (contents, _, _), key_range in zip(parts, ((1, 2), (3, 5))):
+            header = serializer.read_header(contents[start:])
+            self.assertEqual(["id", *key_range], header["keys"])
+
+    def test_get_pipelined_chunks(self):
+        with TemporaryDirectory() as tmp, app.app_context():
+            engine = create_engine(f"sqlite:///{tmp}/test.db")
+            Post.__table__.create(engine)
+            with engine.begin() as connection:
+                rows = [{"title": f"Post {n}"} for n in range(1, 6)]
+                connection.execute(Post.__table__.insert(), rows)
+
+            alchemy = AlchemyDumpsDatabase(chunk_size=2, queue_size=1)
+            with patch.object(AlchemyDumpsDatabase, "db") as mock_db:
+                mock_db.return_value.engine = engine
+                chunks = tuple(alchemy.get_pipelined_chunks(Post))
+            with Session(bind=engine) as session:
+                sequential = AlchemyDumpsDatabase(chunk_size=2)
+                expected = tuple(sequential.get_chunks(Post, session))
+            engine.dispose()
+
+        self.assertEqual(expected, chunks)  # magic + 3 chunks
+        self.assertEqual(4, len(chunks))
+        self.assertEqual(5, alchemy.rows["Post"])
+        self.assertEqual({"query", "serialize"}, set(alchemy.timings["Post"]))
+
+    def test_iter_data_with_filter(self):
+        with app.app_context():
+            self.db.session.add(User(email="me@example.etc"))
+            for title in ("Post 1", "Post 2", "Post 3", "Post 4"):
+                self.db.session.add(Post(title=title, author_id=1))
+            self.db.session.commit()
+
+            alchemy = AlchemyDumpsDatabase(chunk_size=2)
+            contents = b"".join(alchemy.get_chunks(Post))
+            row_filter = RowFilter(("id>2", "title!=Post 4"), (Post.__table__,))
+            loads = ColumnarSerializer.loads
+            with patch.object(ColumnarSerializer, "loads", autospec=True) as mock:
+                mock.side_effect = loads
+                rows = tuple(alchemy.iter_data(contents, row_filter=row_filter))
+
+            self.assertEqual(["Post 3"], [row.title for row in rows])
+            mock.assert_called_once()  # the first chunk is skipped
+
+    def test_select_classes(self):
+        with app.app_context():
+            alchemy = AlchemyDumpsDatabase()
+            self.assertEqual([User, Post], alchemy.select_classes(("Post", "user")))
+            self.assertEqual({Post: {User}, User: set()}, alchemy.get_dependencies())
+            with self.assertRaises(ValueError):
+                AlchemyDumpsDatabase().select_classes(("Post", "Player"))
+
+    def test_get_changed_chunks(self):
+        with app.app_context():
+            for email in ("me@example.etc", "you@example.etc", "them@example.etc"):
+                self.db.session.add(User(email=email))
+            self.db.session.commit()
+
+            alchemy = AlchemyDumpsDatabase()
+            index = alchemy.get_index(User, User.query.all())
+            User.query.filter_by(id=2).update({"email": "us@example.etc"})
+            User.query.filter_by(id=3).delete()
+            self.db.session.add(User(id=4, email="all@example.etc"))
+            self.db.session.commit()
+
+            chunks = b"".join(alchemy.get_chunks(User, index=index))
+            parsed = alchemy.parse_data(chunks)
+            self.assertEqual([2, 4], [user.id for user in parsed])
+            self.assertEqual([(3,)], alchemy.deleted["User"])
+            self.assertEqual([(1,), (2,), (4,)], sorted(alchemy.indexes["User"]))
+
+            contents = b"".join(alchemy.get_index_chunks(User))
+            self.assertEqual(alchemy.indexes["User"], alchemy.read_index(contents))
+            contents = b"".join(alchemy.get_deleted_chunks(User))
+            self.assertEqual([(3,)], alchemy.read_keys(contents))
+
+    def test_get_content_defined_chunks(self):
+        with app.app_context():
+            for uuid in range(64):
+                self.db.session.add(SomeControl(uuid=str(uuid)))
+            self.db.session.commit()
+
+            alchemy = AlchemyDumpsDatabase(chunk_size=16, content_defined=True)
+            chunks = tuple(alchemy.get_chunks(SomeControl))
+            SomeControl.query.filter_by(id=32).delete()
+            self.db.session.commit()
+
+            # only the chunk with the deleted row (and the next one, if the row
+            # was the end of its chunk) changes
+            changed = tuple(alchemy.get_chunks(SomeControl))
+            self.assertGreater(len(chunks), 4)
+            self.assertEqual(1, len(set(changed) - set(chunks)))
+            self.assertLessEqual(len(set(chunks) - set(changed)), 2)
+
+    def test_delete_rows(self):
+        with app.app_context():
+            for uuid in ("1", "2", "3"):
+                self.db.session.add(SomeControl(uuid=uuid))
+            self.db.session.commit()
+
+            AlchemyDumpsDatabase().delete_rows(SomeControl, [(1,), (3,)])
+            self.assertEqual(["2"], [c.uuid for c in SomeControl.query.all()])
+
+    def test_parse_legacy_data(self):
+        with app.app_context():
+            self.db.session.add(SomeControl(uuid="42"))
+            self.db.session.commit()
+
+            contents = dumps(self.db.session.query(SomeControl).all())
+            parsed = AlchemyDumpsDatabase().parse_data(contents)
+            self.assertEqual(len(parsed), 1)
+            self.assertEqual(parsed[0].uuid, "42")
+
+    def test_restore_rows_isolates_failures(self):
+        with app.app_context():
+            rows = [
+                User(id=1, email=u"me@example.etc"),
+                User(id=2, email=u"me@example.etc"),  # violates unique email
+                User(id=3, email=u"you@example.etc"),
+                User(id=4, email=u"them@example.etc"),
+            ]
+            alchemy = AlchemyDumpsDatabase(batch_size=3)
+            fails = alchemy.restore_rows(rows)
+            self.assertEqual([2], [row.id for row in fails])
+            self.assertEqual(3, User.query.count())
+
+    def test_restore_rows_in_bulk(self):
+        with app.app_context():
+            rows = [
+                User(id=1, email=u"me@example.etc"),
+                User(id=2, email=u"me@example.etc"),  # violates unique email
+                User(id=3, email=u"you@example.etc"),
+            ]
+            alchemy = AlchemyDumpsDatabase(mode="bulk")
+            fails = alchemy.restore_rows(rows)
+            self.assertEqual([2], [row.id for row in fails])
+            self.assertEqual(2, User.query.count())
+
+    def test_sorted_classes(self):
+        with app.app_context():
+            classes = AlchemyDumpsDatabase().get_sorted_classes()
+            self.assertLess(classes.index(User), classes.index(Post))
+            self.assertLess(classes.index(Post), classes.index(Comments))
+
+    @patch.object(AlchemyDumpsDatabase, "db")
+    def test_get_jobs(self, mock_db):
+        urls = (
+            ("sqlite://", 1),
+            ("sqlite:///:memory:", 1),
+            ("sqlite:///app.db", 4),
+            ("postgresql://user@localhost/app", 4),
+        )
+        for url, expected in urls:
+            with self.subTest():
+                mock_db.return_value = MagicMock()
+                mock_db.return_value.engine.url = make_url(url)
+                self.assertEqual(expected, AlchemyDumpsDatabase().get_jobs(4), url)
+
+    @patch.object(AlchemyDumpsDatabase, "db")
+    def test_get_jobs_writing(self, mock_db):
+        mock_db.return_value = MagicMock()
+        mock_db.return_value.engine.url = make_url("sqlite:///app.db")
+        self.assertEqual(1, AlchemyDumpsDatabase().get_jobs(4, writes=True))
+
+    def test_get_dependencies(self):
+        with app.app_context():
+            dependencies = AlchemyDumpsDatabase().get_dependencies()
+            self.assertEqual(set(), dependencies[User])
+            self.assertEqual({User}, dependencies[Post])
+            self.assertEqual({Post}, dependencies[Comments])
+            self.assertEqual(set(), dependencies[SomeControl])
+
+    def test_run_by_dependency(self):
+        with app.app_context():
+            started, done = list(), list()
+
+            def function(model, session=None):
+                started.append((model, tuple(done)))
+                return model.__name__
+
+            alchemy = AlchemyDumpsDatabase()
+            for model, result in alchemy.run_by_dependency(function, jobs=3):
+                self.assertEqual(model.__name__, result)
+                done.append(model)
+
+            dependencies = alchemy.get_dependencies()
+            self.assertEqual(5, len(started))
+            for model, finished in started:
+                self.assertTrue(dependencies[model] <= set(finished), model)
+
+    def test_get_and_parse_pickled_chunks(self):
+        with app.app_context():
+            self.db.session.add(SomeControl(uuid="42"))
+            self.db.session.commit()
+
+            alchemy = AlchemyDumpsDatabase(serializer="pickle")
+            parsed = alchemy.parse_data(b"".join(alchemy.get_chunks(SomeControl)))
+            self.assertEqual(len(parsed), 1)
+            self.assertEqual(parsed[0].uuid, "42")
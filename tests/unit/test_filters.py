@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+from sqlalchemy import Boolean, Column, Integer, MetaData, String, Table
+
+from flask_alchemydumps.filters import Predicate, RowFilter
+
+
+class TestRowFilter(TestCase):
+    def setUp(self):
+        self.table = Table(
+            "player",
+            MetaData(),
+            Column("id", Integer, primary_key=True),
+            Column("name", String(140)),
+            Column("captain", Boolean),
+        )
+
+    def test_parse(self):
+        predicate = Predicate.parse(" id >= 42 ")
+        self.assertEqual(
+            ("id", ">=", "42"), (predicate.column, predicate.operator, predicate.value)
+        )
+        self.assertEqual("Romário", Predicate.parse("name=Romário").value)
+        with self.assertRaises(ValueError):
+            Predicate.parse("id")
+        with self.assertRaises(ValueError):
+            RowFilter(("goals>1",), (self.table,))
+        with self.assertRaises(ValueError):
+            RowFilter(("id>Romário",), (self.table,))
+
+    def test_matches(self):
+        row_filter = RowFilter(("id>=2", "id<11", "captain=true"), (self.table,))
+        self.assertTrue(row_filter.matches(self.table, {"id": 2, "captain": True}))
+        self.assertFalse(row_filter.matches(self.table, {"id": 11, "captain": True}))
+        self.assertFalse(row_filter.matches(self.table, {"id": 3, "captain": False}))
+        self.assertFalse(row_filter.matches(self.table, {"id": 3, "captain": None}))
+        self.assertTrue(row_filter.matches_key(self.table, (10,)))
+        self.assertFalse(row_filter.matches_key(self.table, (1,)))
+        self.assertFalse(RowFilter())
+
+    def test_may_match(self):
+        row_filter = RowFilter(("id>=1000", "id<2000"))
+        self.assertTrue(row_filter.may_match(self.table, None))
+        self.assertTrue(row_filter.may_match(self.table, ["id", 1, 1000]))
+        self.assertTrue(row_filter.may_match(self.table, ["id", 1999, 3000]))
+        self.assertFalse(row_filter.may_match(self.table, ["id", 1, 999]))
+        self.assertFalse(row_filter.may_match(self.table, ["id", 2000, 3000]))
+        self.assertTrue(row_filter.may_match(self.table, ["name", "A", "Z"]))
+
+        row_filter = RowFilter(("name=Bebeto",))
+        self.assertTrue(row_filter.may_match(self.table, ["name", "Aldair", "Dunga"]))
+        self.assertFalse(
+            row_filter.may_match(self.table, ["name", "Dunga", "Taffarel"])
+        )
@@ -0,0 +1,31 @@
+from io import BytesIO
+from unittest import TestCase
+from unittest.mock import patch
+
+from flask_alchemydumps.metrics import Metrics, TimedWriter, timed
+
+
+class TestMetrics(TestCase):
+    @patch("flask_alchemydumps.metrics.perf_counter")
+    def test_timed(self, mock_perf_counter):
+        mock_perf_counter.side_effect = (0, 1, 1, 3, 3, 6)
+        timings = {"query": 0.5}
+        items = tuple(timed("42", timings, "query", count="rows"))
+        self.assertEqual(("4", "2"), items)
+        self.assertEqual({"query": 6.5, "rows": 2}, timings)
+
+    def test_timed_writer(self):
+        timings = dict()
+        handler = BytesIO()
+        writer = TimedWriter(handler, timings)
+        self.assertEqual(2, writer.write(b"42"))
+        self.assertEqual(b"42", writer.getvalue())
+        self.assertGreater(timings["write"], 0)
+
+    def test_report(self):
+        reported = list()
+        metrics = Metrics(lambda *args: reported.append(args))
+        metrics.report("User", rows=42, query=0.5)
+        self.assertEqual([("User", {"rows": 42, "query": 0.5})], reported)
+        expected = b'{"tables": {"User": {"query": 0.5, "rows": 42}}}'
+        self.assertEqual(expected, metrics.to_json())
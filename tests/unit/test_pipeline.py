@@ -0,0 +1,125 @@
+from io import BytesIO
+from threading import Event
+from time import sleep
+from unittest import TestCase
+
+from flask_alchemydumps.pipeline import Prefetcher, QueuedWriter, Stage
+
+
+class SlowWriter(BytesIO):
+    def write(self, data):
+        sleep(0.01)
+        return super().write(data)
+
+
+class BrokenWriter(BytesIO):
+    def write(self, data):
+        raise BrokenPipeError
+
+
+class TestStage(TestCase):
+    def test_items_in_order(self):
+        stage = Stage(lambda: range(42), 2)
+        self.assertEqual(list(range(42)), list(stage))
+        self.assertFalse(stage.is_alive())
+
+    def test_backpressure(self):
+        produced = list()
+
+        def items():
+            for item in range(10):
+                produced.append(item)
+                yield item
+
+        iterator = iter(Stage(items, 2))
+        self.assertEqual(0, next(iterator))
+        sleep(0.1)
+        self.assertLessEqual(len(produced), 4)  # queued, taken and blocked
+        self.assertEqual(list(range(1, 10)), list(iterator))
+
+    def test_error_is_raised_when_consuming(self):
+        def items():
+            yield 1
+            raise ValueError("42")
+
+        with self.assertRaises(ValueError):
+            list(Stage(items, 2))
+
+    def test_stop_when_not_consumed(self):
+        closed = Event()
+
+        def items():
+            try:
+                while True:
+                    yield 42
+            finally:
+                closed.set()
+
+        stage = Stage(items, 2)
+        for item in stage:
+            break
+        self.assertTrue(closed.is_set())
+        self.assertFalse(stage.is_alive())
+
+
+class TestQueuedWriter(TestCase):
+    def test_write(self):
+        handler = SlowWriter()
+        writer = QueuedWriter(handler, 2)
+        for data in (b"4", bytearray(b"2"), memoryview(b"!")):
+            self.assertEqual(1, writer.write(data))
+        writer.flush()
+        self.assertEqual(b"42!", handler.getvalue())
+        writer.close()
+        writer.close()
+        self.assertFalse(handler.closed)
+
+    def test_error_is_raised_by_next_call(self):
+        writer = QueuedWriter(BrokenWriter(), 2)
+        writer.write(b"42")
+        with self.assertRaises(BrokenPipeError):
+            writer.close()
+        with self.assertRaises(BrokenPipeError):
+            writer.write(b"42")
+
+
+class TestPrefetcher(TestCase):
+    def test_get_in_order_and_out_of_order(self):
+        calls = list()
+
+        def function(key):
+            calls.append(key)
+            return key * 2
+
+        prefetcher = Prefetcher(function, (1, 2, 3, 4), 2)
+        self.assertEqual(2, prefetcher.get(1))
+        self.assertEqual(8, prefetcher.get(4))  # not started yet
+        self.assertEqual(4, prefetcher.get(2))
+        self.assertEqual(6, prefetcher.get(3))
+        self.assertEqual(42, prefetcher.get(21))  # not expected at all
+        prefetcher.close()
+        self.assertEqual([1, 2, 3, 4, 21], sorted(calls))
+
+    def test_buffer_is_bounded(self):
+        started = list()
+
+        def function(key):
+            started.append(key)
+            return key
+
+        prefetcher = Prefetcher(function, range(10), 3)
+        sleep(0.1)
+        self.assertEqual([0, 1, 2], sorted(started))
+        self.assertEqual(0, prefetcher.get(0))
+        sleep(0.1)
+        self.assertEqual([0, 1, 2, 3], sorted(started))
+        prefetcher.close()
+
+    def test_error_is_raised_by_get(self):
+        def function(key):
+            raise OSError(key)
+
+        prefetcher = Prefetcher(function, ("foo.gz",), 1)
+        with self.assertRaises(OSError):
+            prefetcher.get("foo.gz")
+        prefetcher.close()
@@ -0,0 +1,53 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from flask_alchemydumps.progress import Cancelled, Progress
+
+
+class TestProgress(TestCase):
+    def setUp(self):
+        self.updates = list()
+        self.progress = Progress(lambda progress: self.updates.append(progress))
+        self.progress.start("19940717123000", {"User": 40, "Post": 60})
+
+    def test_track(self):
+        rows = {"User": 0}
+
+        def chunks():
+            for chunk in (b"4", b"2"):
+                yield chunk
+                rows["User"] += 20
+
+        tracked = self.progress.track("User", chunks(), rows)
+        self.assertEqual(b"4", next(tracked))
+        self.assertEqual("User", self.progress.get_table())
+        self.assertEqual(b"2", next(tracked))
+
+        status = self.progress.get_status()
+        self.assertEqual("running", status["status"])
+        self.assertEqual(20, status["rows"])
+        self.assertEqual(2, status["bytes"])
+        self.assertEqual(0.2, status["fraction"])
+        self.assertEqual(4, len(self.updates))
+
+    def test_fraction_counts_tables_done(self):
+        self.progress.update("User", rows=2, status="done")
+        self.progress.update("Post", rows=90, status="running")
+        self.assertEqual(1.0, self.progress.get_fraction())
+
+    def test_eta(self):
+        self.assertIsNone(self.progress.get_eta())
+        self.progress.update("User", rows=40, status="done")
+        with patch.object(self.progress, "get_elapsed", return_value=10):
+            self.assertEqual(15, self.progress.get_eta())
+
+        self.progress.stop("done")
+        self.assertEqual(0, self.progress.get_eta())
+        self.assertIsNone(self.progress.get_table())
+
+    def test_cancel(self):
+        tracked = self.progress.track("User", (b"4", b"2"), dict())
+        next(tracked)
+        self.progress.cancel()
+        with self.assertRaises(Cancelled):
+            next(tracked)
@@ -0,0 +1,114 @@
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy import Column, Integer, MetaData, Table
+
+from flask_alchemydumps.serializer import (
+    ColumnarSerializer,
+    PickleSerializer,
+    get_serializer,
+    get_serializer_by_magic,
+)
+
+
+class TestColumnarSerializer(TestCase):
+    def setUp(self):
+        self.serializer = ColumnarSerializer()
+        self.columns = (
+            "integer",
+            "big",
+            "real",
+            "flag",
+            "text",
+            "blob",
+            "numeric",
+            "timestamp",
+            "day",
+            "hour",
+            "duration",
+            "aware",
+            "mixed",
+            "empty",
+        )
+        self.table = Table(
+            "everything",
+            MetaData(),
+            *(
+                Column(name, Integer, primary_key=name == "integer")
+                for name in self.columns
+            ),
+        )
+
+    def test_round_trip(self):
+        rows = [
+            (
+                42,
+                2**70,
+                3.14,
+                True,
+                "Olá",
+                b"\x00\xff",
+                Decimal("1.10"),
+                datetime(1994, 7, 17, 12, 30, 0, 42),
+                date(1994, 7, 17),
+                time(12, 30, 1, 42),
+                timedelta(days=2, microseconds=1),
+                datetime(1994, 7, 17, tzinfo=timezone.utc),
+                {"a": 1},
+                None,
+            ),
+            (
+                -1,
+                None,
+                None,
+                False,
+                "",
+                None,
+                Decimal("-1E+2"),
+                datetime(1899, 12, 31),
+                None,
+                None,
+                timedelta(seconds=-1),
+                None,
+                "string",
+                None,
+            ),
+        ]
+        payload = self.serializer.dumps(self.table, rows)
+        table_name, loaded = self.serializer.loads(payload)
+        self.assertEqual("everything", table_name)
+        self.assertEqual([dict(zip(self.columns, row)) for row in rows], loaded)
+
+    def test_no_rows(self):
+        payload = self.serializer.dumps(self.table, [])
+        self.assertEqual(("everything", []), self.serializer.loads(payload))
+
+    def test_read_header(self):
+        rows = [(n,) + (None,) * (len(self.columns) - 1) for n in (42, 7, 13)]
+        header = self.serializer.read_header(self.serializer.dumps(self.table, rows))
+        self.assertEqual("everything", header["table"])
+        self.assertEqual(3, header["rows"])
+        self.assertEqual(["integer", 7, 42], header["keys"])
+
+    def test_encodings(self):
+        self.assertEqual("int", self.serializer.get_encoding([1, None, 2]))
+        self.assertEqual("object", self.serializer.get_encoding([2**64]))
+        self.assertEqual("object", self.serializer.get_encoding([1, "1"]))
+        self.assertEqual("null", self.serializer.get_encoding([None, None]))
+
+
+class TestGetSerializer(TestCase):
+    @patch("flask_alchemydumps.serializer.decouple.config")
+    def test_default(self, mock_config):
+        mock_config.return_value = "columnar"
+        self.assertIsInstance(get_serializer(), ColumnarSerializer)
+        self.assertIsInstance(get_serializer("pickle"), PickleSerializer)
+
+    def test_by_magic(self):
+        contents = ColumnarSerializer.MAGIC + b"42"
+        self.assertIsInstance(get_serializer_by_magic(contents), ColumnarSerializer)
+        contents = PickleSerializer.MAGIC + b"42"
+        self.assertIsInstance(get_serializer_by_magic(contents), PickleSerializer)
+        self.assertIsNone(get_serializer_by_magic(b"\x80\x04legacy"))